@@ -0,0 +1,323 @@
+import random
+import time
+from collections import OrderedDict
+
+from engine_2048 import (Down, Left, Right, Up, addTile, countEmpty,
+                         emptyCells, loadTables, move, transpose)
+
+# 2048的提示和自动玩：期望最大化搜索（expectimax）。我方的一步取四个方向里
+# 最好的，新数字的一步按概率取平均。根上的四个方向分给四个进程同时搜，
+# 每个进程在时间用完之前一层一层加深，相同的棋盘查置换表
+
+# 估值的权重：空格、可以合并的相邻格子、单调性、数字大小
+LostPenalty = 200000.0
+EmptyWeight = 270.0
+MergesWeight = 700.0
+MonotonicityPower = 4.0
+MonotonicityWeight = 47.0
+SumPower = 3.5
+SumWeight = 11.0
+
+_heuristicTable = None
+
+
+def heuristicTable():
+    # 每一行的估值，第一次用到时算好
+    global _heuristicTable
+    if _heuristicTable is not None:
+        return _heuristicTable
+
+    table = [0.0] * 65536
+    for row in range(65536):
+        ranks = [row & 0xF, row >> 4 & 0xF, row >> 8 & 0xF, row >> 12]
+        total = sum(rank ** SumPower for rank in ranks)
+        empty = ranks.count(0)
+
+        merges = 0
+        prev = 0
+        counter = 0
+        for rank in ranks:
+            if not rank:
+                continue
+            if rank == prev:
+                counter += 1
+            elif counter:
+                merges += 1 + counter
+                counter = 0
+            prev = rank
+        if counter:
+            merges += 1 + counter
+
+        left = 0.0
+        right = 0.0
+        for i in range(1, 4):
+            a = ranks[i - 1] ** MonotonicityPower
+            b = ranks[i] ** MonotonicityPower
+            if ranks[i - 1] > ranks[i]:
+                left += a - b
+            else:
+                right += b - a
+
+        table[row] = LostPenalty + EmptyWeight * empty + \
+            MergesWeight * merges - MonotonicityWeight * min(left, right) - \
+            SumWeight * total
+    _heuristicTable = table
+    return table
+
+
+def warmUp():
+    # 进程池启动时先把表算好，第一步搜索不用等
+    loadTables()
+    heuristicTable()
+
+
+def evaluate(board):
+    # 行和列的估值加起来
+    table = _heuristicTable or heuristicTable()
+    cols = transpose(board)
+    return table[board & 0xFFFF] + table[board >> 16 & 0xFFFF] + \
+        table[board >> 32 & 0xFFFF] + table[board >> 48] + \
+        table[cols & 0xFFFF] + table[cols >> 16 & 0xFFFF] + \
+        table[cols >> 32 & 0xFFFF] + table[cols >> 48]
+
+
+class TranspositionTable(object):
+    # 棋盘 -> (搜索深度, 值)，超过容量时丢掉最久没用过的
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+
+    def get(self, board, depth):
+        self.lookups += 1
+        entry = self.entries.get(board)
+        # 比要求浅的结果不能用
+        if entry is None or entry[0] < depth:
+            return None
+        self.entries.move_to_end(board)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, board, depth, value):
+        self.entries[board] = (depth, value)
+        self.entries.move_to_end(board)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+class Timeout(Exception):
+    pass
+
+
+class Search(object):
+    # 一次搜索，超过deadline时抛出Timeout，这一层的结果作废
+
+    def __init__(self, table, minProb, fourChance, deadline):
+        self.table = table
+        self.minProb = minProb
+        self.fourChance = fourChance
+        self.deadline = deadline
+        self.nodes = 0
+
+    def maxNode(self, board, depth, prob):
+        # 走不动的棋盘值为0
+        best = 0.0
+        for direct in (Left, Right, Up, Down):
+            result, score, flags = move(board, direct)
+            if flags:
+                value = self.chanceNode(result, depth, prob)
+                if value > best:
+                    best = value
+        return best
+
+    def chanceNode(self, board, depth, prob):
+        self.nodes += 1
+        if not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise Timeout()
+        # 深度用完或者走到这里的概率太小就不再往下搜
+        if depth == 0 or prob < self.minProb:
+            return evaluate(board)
+
+        value = self.table.get(board, depth)
+        if value is not None:
+            return value
+
+        count = countEmpty(board)
+        if not count:
+            return evaluate(board)
+        four = self.fourChance
+        prob /= count
+        total = 0.0
+        for shift in emptyCells(board):
+            total += (1 - four) * self.maxNode(board | 1 << shift, depth - 1,
+                                               prob * (1 - four))
+            if four:
+                total += four * self.maxNode(board | 2 << shift, depth - 1,
+                                             prob * four)
+        value = total / count
+        self.table.put(board, depth, value)
+        return value
+
+
+# 每个进程自己的置换表，连续几步之间可以复用
+_table = None
+
+
+def searchRoot(task):
+    # 在一个进程里搜根上的一个方向，时间用完之前一层一层加深。
+    # 返回 (方向, 每一层的值, 节点数, 命中数, 查表数)，第0层是直接估值，
+    # 一定有。deadline是time.time()，进程之间也能比较，排在后面的方向
+    # 不会多用时间
+    global _table
+    board, direct, deadline, minProb, fourChance, cacheSize, maxDepth = task
+    deadline = time.perf_counter() + deadline - time.time()
+    if _table is None or _table.capacity != cacheSize:
+        _table = TranspositionTable(cacheSize)
+    hits = _table.hits
+    lookups = _table.lookups
+
+    values = []
+    result, score, flags = move(board, direct)
+    search = Search(_table, minProb, fourChance, deadline)
+    if flags:
+        values.append(evaluate(result))
+        for depth in range(1, maxDepth + 1):
+            try:
+                values.append(search.chanceNode(result, depth, 1.0))
+            except Timeout:
+                break
+    return (direct, values, search.nodes, _table.hits - hits,
+            _table.lookups - lookups)
+
+
+class Solver(object):
+    # budget是每一步最多用的秒数；processes为0时在当前进程里依次搜
+    MaxDepth = 8
+
+    def __init__(self, budget=0.1, processes=4, cacheSize=200000,
+                 minProb=0.001, fourChance=0.0):
+        self.budget = budget
+        self.cacheSize = cacheSize
+        self.minProb = minProb
+        # 新数字是4的概率，Board.newNumber只会放2
+        self.fourChance = fourChance
+        # 估值表在进程启动时就算，不会卡住界面，也不占第一步的时间
+        if processes:
+            from multiprocessing import Pool
+            self.pool = Pool(processes, warmUp)
+        else:
+            self.pool = None
+            warmUp()
+        self.pending = None
+        self.results = None
+
+        self.searches = 0
+        self.nodes = 0
+        self.hits = 0
+        self.lookups = 0
+        self.elapsed = 0.0
+        self.depth = 0
+
+    def searchAsync(self, board):
+        # 开始搜索，用ready()查看是否搜完，result()取结果
+        deadline = time.time() + self.budget
+        tasks = [(board, direct, deadline, self.minProb, self.fourChance,
+                  self.cacheSize, Solver.MaxDepth)
+                 for direct in (Left, Right, Up, Down)]
+        self.begin = time.perf_counter()
+        if self.pool is None:
+            self.pending = None
+            self.results = [searchRoot(task) for task in tasks]
+        else:
+            self.pending = self.pool.map_async(searchRoot, tasks)
+            self.results = None
+
+    def ready(self):
+        return self.pending is None or self.pending.ready()
+
+    def result(self):
+        # 等搜索结束，返回最好的方向，走不动时返回None
+        if self.pending is not None:
+            self.results = self.pending.get()
+            self.pending = None
+        self.elapsed += time.perf_counter() - self.begin
+        self.searches += 1
+
+        # 不同方向搜到的深度不一样，在都搜完了的那一层比较，
+        # 第一层也没搜完时按直接估值
+        results = [result for result in self.results if result[1]]
+        for direct, values, nodes, hits, lookups in self.results:
+            self.nodes += nodes
+            self.hits += hits
+            self.lookups += lookups
+        if not results:
+            return None
+        depth = min(len(result[1]) for result in results) - 1
+        self.depth = depth
+        return max(results, key=lambda result: result[1][depth])[0]
+
+    def bestMove(self, board):
+        self.searchAsync(board)
+        return self.result()
+
+    def stats(self):
+        return {
+            'searches': self.searches,
+            'depth': self.depth,
+            'nodes': self.nodes,
+            'nodesPerSec': self.nodes / self.elapsed if self.elapsed else 0.0,
+            'hitRate': self.hits / self.lookups if self.lookups else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return 'depth=%d nodes=%d (%.0f nodes/sec) cache hit=%.1f%%' % (
+            stats['depth'], stats['nodes'], stats['nodesPerSec'],
+            100 * stats['hitRate'])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+def play(solver, seed=None, maxMoves=0):
+    # 不显示，让solver一直玩到走不动，返回 (棋盘, 得分, 步数)
+    rng = random.Random(seed)
+    board = addTile(0, rng)
+    score = 0
+    moves = 0
+    while not maxMoves or moves < maxMoves:
+        direct = solver.bestMove(board)
+        if direct is None:
+            break
+        board, gained, flags = move(board, direct)
+        score += gained
+        moves += 1
+        board = addTile(board, rng) or board
+    return board, score, moves
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='2048 expectimax solver')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-b', '--budget', type=float, default=0.1,
+                        help='seconds per move')
+    parser.add_argument('-j', '--processes', type=int, default=4)
+    parser.add_argument('--max-moves', type=int, default=0)
+    args = parser.parse_args()
+
+    solver = Solver(args.budget, args.processes)
+    begin = time.perf_counter()
+    board, score, moves = play(solver, args.seed, args.max_moves)
+    elapsed = time.perf_counter() - begin
+    solver.close()
+
+    best = max(board >> shift & 0xF for shift in range(0, 64, 4))
+    print('moves:  %d in %.1fs' % (moves, elapsed))
+    print('score:  %d, max tile %d' % (score, 1 << best))
+    print('search: %s' % solver.report())
@@ -0,0 +1,187 @@
+import time
+
+import numpy as np
+
+import engine_2048
+from engine_2048 import Down, Left, Right, Up
+
+# 同时玩很多局2048，统计最大数字和得分的分布。棋盘是 (局数, 4, 4) 的数组，
+# 存数字的log2；每一行的移动用engine_2048的表一次查完，规则和Shape一样
+
+_tables = None
+
+
+def tables():
+    # engine_2048的六张表转成NumPy数组，第一次用到时转换
+    global _tables
+    if _tables is None:
+        engine_2048.loadTables()
+        _tables = tuple(np.array(table, dtype=dtype) for table, dtype in (
+            (engine_2048.leftTable, np.uint16),
+            (engine_2048.rightTable, np.uint16),
+            (engine_2048.scoreTable, np.int64),
+            (engine_2048.rightScoreTable, np.int64),
+            (engine_2048.flagTable, np.uint8),
+            (engine_2048.rightFlagTable, np.uint8),
+        ))
+    return _tables
+
+
+def pack(rows):
+    # (..., 4) 的一行行数字打包成16位的表下标
+    rows = rows.astype(np.uint16)
+    return rows[..., 0] | rows[..., 1] << 4 | rows[..., 2] << 8 | \
+        rows[..., 3] << 12
+
+
+def unpack(keys):
+    return np.stack([keys >> shift & 0xF for shift in (0, 4, 8, 12)],
+                    axis=-1).astype(np.uint8)
+
+
+def moveAll(boards):
+    # 每一局都试四个方向，返回 (结果, 得分, 标记)，形状是 (4, 局数, ...)，
+    # 第一维按Left、Right、Up、Down排列
+    left, right, scores, rightScores, flags, rightFlags = tables()
+    rows = pack(boards)
+    cols = pack(boards.transpose(0, 2, 1))
+
+    results = np.empty((4,) + boards.shape, dtype=np.uint8)
+    results[Left] = unpack(left[rows])
+    results[Right] = unpack(right[rows])
+    results[Up] = unpack(left[cols]).transpose(0, 2, 1)
+    results[Down] = unpack(right[cols]).transpose(0, 2, 1)
+
+    gained = np.stack([scores[rows].sum(axis=1),
+                       rightScores[rows].sum(axis=1),
+                       scores[cols].sum(axis=1),
+                       rightScores[cols].sum(axis=1)])
+    moved = np.stack([np.bitwise_or.reduce(flags[rows], axis=1),
+                      np.bitwise_or.reduce(rightFlags[rows], axis=1),
+                      np.bitwise_or.reduce(flags[cols], axis=1),
+                      np.bitwise_or.reduce(rightFlags[cols], axis=1)])
+    return results, gained, moved
+
+
+def spawn(boards, rng, fourChance):
+    # 每一局在随机一个空格子里放2，按fourChance的概率放4；
+    # 调用时每一局都至少有一个空格子
+    cells = boards.reshape(len(boards), 16)
+    keys = rng.random(cells.shape)
+    keys[cells != 0] = -1
+    index = keys.argmax(axis=1)
+    ranks = np.where(rng.random(len(boards)) < fourChance, 2, 1)
+    cells[np.arange(len(boards)), index] = ranks
+
+
+# 策略：valid是 (4, 局数) 的能否走，返回每一局走的方向。
+# 走不动的方向都设成-1，argmax一定落在能走的方向上
+
+def randomPolicy(gained, valid, rng):
+    return np.where(valid, rng.random(valid.shape), -1).argmax(axis=0)
+
+
+# 依次尝试左、上、右、下，把大数字压在左上角
+CornerOrder = np.array([4, 2, 3, 1])[:, None]
+
+
+def cornerPolicy(gained, valid, rng):
+    return np.where(valid, CornerOrder, -1).argmax(axis=0)
+
+
+def greedyPolicy(gained, valid, rng):
+    # 这一步得分最多的方向，一样多时随机
+    return np.where(valid, gained + rng.random(valid.shape) * 0.5,
+                    -1).argmax(axis=0)
+
+
+Policies = {
+    'random': randomPolicy,
+    'corner': cornerPolicy,
+    'greedy': greedyPolicy,
+}
+
+
+def simulate(games, policy, seed=None, fourChance=0.0):
+    # 同时玩games局直到全部结束，结束的局不再参与计算。
+    # 返回每一局的 (得分, 最大数字的log2, 步数)
+    rng = np.random.default_rng(seed)
+    boards = np.zeros((games, 4, 4), dtype=np.uint8)
+    # 和Board.start一样，开局只有一个数字
+    spawn(boards, rng, fourChance)
+    ids = np.arange(games)
+    score = np.zeros(games, dtype=np.int64)
+    moves = np.zeros(games, dtype=np.int64)
+
+    finalScores = np.zeros(games, dtype=np.int64)
+    finalRanks = np.zeros(games, dtype=np.uint8)
+    finalMoves = np.zeros(games, dtype=np.int64)
+
+    while len(ids):
+        results, gained, flags = moveAll(boards)
+        valid = flags != 0
+        # 四个方向都走不动就结束了
+        over = ~valid.any(axis=0)
+        if over.any():
+            done = ids[over]
+            finalScores[done] = score[over]
+            finalRanks[done] = boards[over].reshape(-1, 16).max(axis=1)
+            finalMoves[done] = moves[over]
+            alive = ~over
+            ids = ids[alive]
+            score = score[alive]
+            moves = moves[alive]
+            results = results[:, alive]
+            gained = gained[:, alive]
+            valid = valid[:, alive]
+
+        index = np.arange(len(ids))
+        directs = policy(gained, valid, rng)
+        boards = results[directs, index]
+        score += gained[directs, index]
+        moves += 1
+        spawn(boards, rng, fourChance)
+
+    return finalScores, finalRanks, finalMoves
+
+
+def report(name, scores, ranks, moves, elapsed):
+    games = len(scores)
+    print('%s: %d games in %.1fs (%.0f games/sec, %.0f moves/sec)' % (
+        name, games, elapsed, games / elapsed, moves.sum() / elapsed))
+    print('  score  mean %.0f  median %.0f  p90 %.0f  p99 %.0f  max %d' % (
+        scores.mean(), np.median(scores), np.percentile(scores, 90),
+        np.percentile(scores, 99), scores.max()))
+    print('  moves  mean %.1f  max %d' % (moves.mean(), moves.max()))
+    counts = np.bincount(ranks, minlength=16)
+    for rank in range(1, 16):
+        if counts[rank]:
+            print('  max tile %6d: %8d (%5.2f%%)' % (
+                1 << rank, counts[rank], 100.0 * counts[rank] / games))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Batched 2048 statistics')
+    parser.add_argument('-n', '--games', type=int, default=100000)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-p', '--policy', default='all',
+                        choices=sorted(Policies) + ['all'])
+    parser.add_argument('--batch', type=int, default=100000,
+                        help='games played at the same time')
+    parser.add_argument('--four', type=float, default=0.0,
+                        help='chance that a new tile is 4 (Board spawns 2)')
+    args = parser.parse_args()
+
+    names = sorted(Policies) if args.policy == 'all' else [args.policy]
+    for name in names:
+        begin = time.perf_counter()
+        parts = []
+        for i, start in enumerate(range(0, args.games, args.batch)):
+            count = min(args.batch, args.games - start)
+            parts.append(simulate(count, Policies[name], (args.seed, i),
+                                  args.four))
+        elapsed = time.perf_counter() - begin
+        scores, ranks, moves = (np.concatenate(part) for part in zip(*parts))
+        report(name, scores, ranks, moves, elapsed)
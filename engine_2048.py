@@ -0,0 +1,567 @@
+import random
+import time
+
+# 2048的规则，不依赖Qt。整个4x4棋盘是一个64位整数，每格4位，存数字的log2，
+# 0表示空格。第i行第j列在第 16 * i + 4 * j 位，一行正好16位，
+# 所以每一行的移动结果可以事先算好查表。
+
+Left = 0
+Right = 1
+Up = 2
+Down = 3
+
+# flagTable里的标记，和Shape的merged、moveable一样
+Merged = 1
+Moveable = 2
+
+RowMask = 0xFFFF
+# 一格最大是2**15，两个32768不再合并
+MaxRank = 15
+
+
+def _moveRow(cells, maxRank=MaxRank):
+    # 按Shape.clearZero、mergeLeft、clearZero的顺序向左移动一行，
+    # 返回 (移动后的格子, 得分, 标记)；maxRank为None时数字没有上限
+    flags = 0
+    row = [c for c in cells if c] + [0] * cells.count(0)
+    if row != cells:
+        flags |= Moveable
+
+    score = 0
+    i = 0
+    while i < len(row) - 1:
+        if not row[i]:
+            break
+        if row[i] == row[i + 1] and (maxRank is None or row[i] < maxRank):
+            flags |= Merged
+            row[i] += 1
+            score += 1 << row[i]
+            row[i + 1] = 0
+            i += 2
+        else:
+            i += 1
+
+    merged = [c for c in row if c] + [0] * row.count(0)
+    if merged != row:
+        flags |= Moveable
+    return merged, score, flags
+
+
+def _buildTables():
+    left = [0] * 65536
+    right = [0] * 65536
+    scores = [0] * 65536
+    rightScores = [0] * 65536
+    flags = [0] * 65536
+    rightFlags = [0] * 65536
+    for row in range(65536):
+        cells = [row & 0xF, row >> 4 & 0xF, row >> 8 & 0xF, row >> 12]
+        result, score, flag = _moveRow(cells)
+        left[row] = result[0] | result[1] << 4 | result[2] << 8 | \
+            result[3] << 12
+        scores[row] = score
+        flags[row] = flag
+
+        # 向右移动就是把一行反过来向左移动再反回来
+        result, score, flag = _moveRow(cells[::-1])
+        right[row] = result[3] | result[2] << 4 | result[1] << 8 | \
+            result[0] << 12
+        rightScores[row] = score
+        rightFlags[row] = flag
+    return left, right, scores, rightScores, flags, rightFlags
+
+
+def _traceRow(cells, maxRank=MaxRank):
+    # 和_moveRow一样向左移动一行，返回每个数字从第几格移到了第几格，
+    # 以及合并出新数字的格子
+    tiles = [(i, rank) for i, rank in enumerate(cells) if rank]
+    moves = []
+    merges = []
+    k = 0
+    while k < len(tiles):
+        i, rank = tiles[k]
+        target = len(moves) - len(merges)
+        moves.append((i, target))
+        if k + 1 < len(tiles) and tiles[k + 1][1] == rank and \
+                (maxRank is None or rank < maxRank):
+            moves.append((tiles[k + 1][0], target))
+            merges.append(target)
+            k += 2
+        else:
+            k += 1
+    return moves, merges
+
+
+def tileMoves(ranks, direct, maxRank=MaxRank):
+    # ranks是每格数字log2的二维列表，返回向direct移动时每个数字的
+    # (原来的行, 列, 移到的行, 列)，以及合并出新数字的 (行, 列)，动画用
+    height = len(ranks)
+    width = len(ranks[0])
+    if direct in (Left, Right):
+        lines = [[(i, j) for j in range(width)] for i in range(height)]
+    else:
+        lines = [[(i, j) for i in range(height)] for j in range(width)]
+    if direct in (Right, Down):
+        lines = [line[::-1] for line in lines]
+
+    moves = []
+    merges = []
+    for line in lines:
+        traced, merged = _traceRow([ranks[i][j] for i, j in line], maxRank)
+        moves.extend(line[a] + line[b] for a, b in traced)
+        merges.extend(line[b] for b in merged)
+    return moves, merges
+
+
+# 65536行的移动结果、得分和标记。算一次要半秒，第一次移动时才算，
+# 只用规则的程序导入时不用等
+leftTable = rightTable = scoreTable = rightScoreTable = flagTable = \
+    rightFlagTable = None
+
+
+def loadTables():
+    global leftTable, rightTable, scoreTable, rightScoreTable, flagTable, \
+        rightFlagTable
+    if leftTable is None:
+        leftTable, rightTable, scoreTable, rightScoreTable, flagTable, \
+            rightFlagTable = _buildTables()
+
+
+def transpose(board):
+    # 4x4的4位矩阵转置，先交换2x2小块里的格子，再交换2x2的小块
+    a = board & 0xF0F00F0FF0F00F0F | \
+        (board & 0x0000F0F00000F0F0) << 12 | \
+        (board & 0x0F0F00000F0F0000) >> 12
+    return a & 0xFF00FF0000FF00FF | \
+        (a & 0x00FF00FF00000000) >> 24 | \
+        (a & 0x00000000FF00FF00) << 24
+
+
+def moveRows(board, table, scores, flagsTable):
+    result = 0
+    score = 0
+    flags = 0
+    for shift in (0, 16, 32, 48):
+        row = board >> shift & RowMask
+        result |= table[row] << shift
+        score += scores[row]
+        flags |= flagsTable[row]
+    return result, score, flags
+
+
+def move(board, direct):
+    # 返回 (移动后的棋盘, 得分, 标记)，上下移动先转置成左右
+    if leftTable is None:
+        loadTables()
+    if direct == Left:
+        return moveRows(board, leftTable, scoreTable, flagTable)
+    if direct == Right:
+        return moveRows(board, rightTable, rightScoreTable, rightFlagTable)
+
+    if direct == Up:
+        result, score, flags = moveRows(transpose(board), leftTable,
+                                        scoreTable, flagTable)
+    else:
+        result, score, flags = moveRows(transpose(board), rightTable,
+                                        rightScoreTable, rightFlagTable)
+    return transpose(result), score, flags
+
+
+def emptyMask(board):
+    # 空格子对应的4位里最低位是1，其余都是0
+    board |= board >> 2 & 0x3333333333333333
+    board |= board >> 1 & 0x1111111111111111
+    return ~board & 0x1111111111111111
+
+
+def countEmpty(board):
+    return bin(emptyMask(board)).count('1')
+
+
+def emptyCells(board):
+    # 每个空格子在棋盘里的位移，依次是0、4、8……
+    mask = emptyMask(board)
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def addTile(board, random, rank=1):
+    # 在随机一个空格子里放上 2**rank，没有空格子时返回None
+    count = countEmpty(board)
+    if not count:
+        return None
+    mask = emptyMask(board)
+    for i in range(random.randrange(count)):
+        mask &= mask - 1
+    shift = (mask & -mask).bit_length() - 1
+    return board | rank << shift
+
+
+def toRanks(board):
+    return [[board >> 16 * i + 4 * j & 0xF for j in range(4)]
+            for i in range(4)]
+
+
+def fromCoords(coords):
+    # Shape.coords那样的二维列表转成棋盘
+    board = 0
+    for i, row in enumerate(coords):
+        for j, value in enumerate(row):
+            if value:
+                board |= (value.bit_length() - 1) << (16 * i + 4 * j)
+    return board
+
+
+def toCoords(board):
+    # 棋盘转成Shape.coords那样的二维列表
+    return [[1 << rank if rank else 0
+             for rank in (board >> 16 * i + 4 * j & 0xF for j in range(4))]
+            for i in range(4)]
+
+
+class Shape(object):
+    # 用二维列表的旧版本，BitShape和GridShape的结果和它一样，测速时对比用
+
+    def __init__(self, width=4, height=4):
+        # i行j列，记录每个位置的数字
+        self.coords = [[0 for j in range(width)] for i in range(height)]
+        self.moveable = False
+        self.merged = False
+        self.score = 0
+
+    def moveLeft(self):
+        for i in range(len(self.coords)):
+            self.clearZero(i)
+            self.mergeLeft(i)
+            self.clearZero(i)
+
+    # 去除空的，后面加上零
+    def clearZero(self, x):
+        newList = [i for i in self.coords[x] if i != 0]
+        newList += [0 for i in range(len(self.coords[x]) - len(newList))]
+        if self.coords[x] != newList:
+            self.moveable = True  # 如果新的列表跟旧的不一样，那就是移动了
+        self.coords[x] = newList
+
+    def moveRight(self):
+        for i in range(len(self.coords)):
+            self.coords[i].reverse()
+            self.clearZero(i)
+            self.mergeLeft(i)
+            self.clearZero(i)  # 合并后会出现空元素，删除
+            self.coords[i].reverse()
+
+    def moveUp(self):
+        self.rotate()
+        for i in range(len(self.coords)):
+            self.clearZero(i)
+            self.mergeLeft(i)
+            self.clearZero(i)
+        self.rotate()
+
+    def moveDown(self):
+        self.rotate()
+        self.moveRight()
+        self.rotate()
+
+    def rotate(self):
+        # 反转矩阵
+        self.coords = [[self.coords[j][i] for j in range(
+            len(self.coords))] for i in range(len(self.coords[0]))]
+
+    def mergeLeft(self, x):
+        i = 0
+        j = 1
+        while i < len(self.coords[x]) and j < len(self.coords[x]):
+            if self.coords[x][i] != self.coords[x][j]:
+                i += 1
+                j += 1
+            elif not self.coords[x][i]:
+                break  # 等于零了就退出，不用合并了
+            else:
+                self.merged = True  # 有合并就标记，不生成新元素
+                self.coords[x][i] = self.coords[x][j] * 2
+                self.score += self.coords[x][i]
+                self.coords[x][j] = 0
+                i += 2
+                j += 2
+
+
+class BitShape(object):
+    # 和Shape一样的接口：moveLeft等方法设置merged、moveable，
+    # 累加score；coords每次访问时从整数转换出来
+
+    def __init__(self, board=0):
+        self.board = board
+        self.moveable = False
+        self.merged = False
+        self.score = 0
+        # 上一次放新数字的 (行, 列)
+        self.lastSpawn = None
+
+    @property
+    def coords(self):
+        return toCoords(self.board)
+
+    def isCapped(self):
+        # 有没有数字到了MaxRank，再合并就超出4位了
+        board = self.board
+        return bool(board & board >> 1 & board >> 2 & board >> 3 &
+                    0x1111111111111111)
+
+    def toGrid(self):
+        # 转成数字没有上限的GridShape，状态不变
+        grid = GridShape()
+        grid.coords = self.coords
+        grid.moveable = self.moveable
+        grid.merged = self.merged
+        grid.score = self.score
+        grid.lastSpawn = self.lastSpawn
+        return grid
+
+    def slide(self, direct):
+        # 移动并返回每个数字的移动，见tileMoves
+        trace = tileMoves(toRanks(self.board), direct)
+        self.move(direct)
+        return trace
+
+    def move(self, direct):
+        self.board, score, flags = move(self.board, direct)
+        self.score += score
+        if flags & Merged:
+            self.merged = True
+        if flags & Moveable:
+            self.moveable = True
+
+    def moveLeft(self):
+        self.move(Left)
+
+    def moveRight(self):
+        self.move(Right)
+
+    def moveUp(self):
+        self.move(Up)
+
+    def moveDown(self):
+        self.move(Down)
+
+    def newNumber(self, random):
+        # 在随机的空格子里放一个2，没有空格子返回False
+        board = addTile(self.board, random)
+        if board is None:
+            return False
+        cell = ((board ^ self.board).bit_length() - 1) // 4
+        self.lastSpawn = (cell // 4, cell % 4)
+        self.board = board
+        return True
+
+    def isFull(self):
+        return not emptyMask(self.board)
+
+    def isGameOver(self):
+        # 棋盘满了时只有相邻的格子相同才能走，左右看一次、上下看一次就够了
+        return not emptyMask(self.board) and \
+            not move(self.board, Left)[2] and not move(self.board, Up)[2]
+
+
+class GridShape(object):
+    # 任意宽高的棋盘，和BitShape的接口一样。每一行是数字log2的元组，数字
+    # 没有上限；每种行向左移动的结果第一次算出来后存在rowTable里，所有棋盘
+    # 共用。empty记录空格子的数量，放新数字和判断结束时不用数；lineEmpty
+    # 是上一次移动的每一行（上下移动时是每一列）的空格数，放新数字时不用
+    # 扫整个棋盘
+    CacheSize = 1 << 18
+    rowTable = {}
+
+    def __init__(self, width=4, height=4):
+        self.width = width
+        self.height = height
+        self.rows = [(0,) * width for i in range(height)]
+        self.empty = width * height
+        self.lineEmpty = [width] * height
+        self.byColumn = False
+        self.moveable = False
+        self.merged = False
+        self.score = 0
+        self.lastSpawn = None
+
+    @property
+    def coords(self):
+        return [[1 << rank if rank else 0 for rank in row]
+                for row in self.rows]
+
+    @coords.setter
+    def coords(self, coords):
+        self.rows = [tuple(value.bit_length() - 1 if value else 0
+                           for value in row) for row in coords]
+        self.height = len(self.rows)
+        self.width = len(self.rows[0])
+        self.lineEmpty = [row.count(0) for row in self.rows]
+        self.byColumn = False
+        self.empty = sum(self.lineEmpty)
+
+    @staticmethod
+    def moveRow(row):
+        # 返回 (移动后的行, 得分, 标记, 移动后的空格数)
+        table = GridShape.rowTable
+        entry = table.get(row)
+        if entry is None:
+            result, score, flags = _moveRow(list(row), None)
+            entry = (tuple(result), score, flags, result.count(0))
+            if len(table) >= GridShape.CacheSize:
+                table.clear()
+            table[row] = entry
+        return entry
+
+    def move(self, direct):
+        # 上下移动先转置，向右移动把每一行反过来
+        rows = self.rows if direct in (Left, Right) else zip(*self.rows)
+        reverse = direct in (Right, Down)
+        moveRow = GridShape.moveRow
+        result = []
+        lineEmpty = []
+        flags = 0
+        for row in rows:
+            if reverse:
+                moved, score, flag, empty = moveRow(row[::-1])
+                moved = moved[::-1]
+            else:
+                moved, score, flag, empty = moveRow(row)
+            result.append(moved)
+            lineEmpty.append(empty)
+            self.score += score
+            flags |= flag
+        self.byColumn = direct in (Up, Down)
+        self.rows = list(zip(*result)) if self.byColumn else result
+        self.lineEmpty = lineEmpty
+        self.empty = sum(lineEmpty)
+        if flags & Merged:
+            self.merged = True
+        if flags & Moveable:
+            self.moveable = True
+
+    def slide(self, direct):
+        trace = tileMoves(self.rows, direct, None)
+        self.move(direct)
+        return trace
+
+    def moveLeft(self):
+        self.move(Left)
+
+    def moveRight(self):
+        self.move(Right)
+
+    def moveUp(self):
+        self.move(Up)
+
+    def moveDown(self):
+        self.move(Down)
+
+    def newNumber(self, random, rank=1):
+        # 随机取第几个空格子，按lineEmpty跳过整行或者整列，
+        # 没有空格子返回False
+        if not self.empty:
+            return False
+        n = random.randrange(self.empty)
+        for line, count in enumerate(self.lineEmpty):
+            if n < count:
+                break
+            n -= count
+        if self.byColumn:
+            j = line
+            i = [i for i, row in enumerate(self.rows) if not row[j]][n]
+        else:
+            i = line
+            j = [j for j, value in enumerate(self.rows[i]) if not value][n]
+        row = self.rows[i]
+        self.rows[i] = row[:j] + (rank,) + row[j + 1:]
+        self.lineEmpty[line] -= 1
+        self.empty -= 1
+        self.lastSpawn = (i, j)
+        return True
+
+    def isFull(self):
+        return not self.empty
+
+    def isGameOver(self):
+        if self.empty:
+            return False
+        for rows in (self.rows, zip(*self.rows)):
+            for row in rows:
+                if any(a == b for a, b in zip(row, row[1:])):
+                    return False
+        return True
+
+
+def benchmark(shapes, directs):
+    # 每个Shape按给定的方向走一步，返回每秒的步数
+    begin = time.perf_counter()
+    for shape, direct in zip(shapes, directs):
+        (shape.moveLeft, shape.moveRight, shape.moveUp, shape.moveDown)[
+            direct]()
+    return len(shapes) / (time.perf_counter() - begin)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='2048 bitboard vs list benchmark')
+    parser.add_argument('-n', '--moves', type=int, default=200000)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=4)
+    parser.add_argument('--height', type=int, default=4)
+    args = parser.parse_args()
+
+    # 用随机游戏里出现过的棋盘测速，这样数字的分布和真实游戏接近
+    rng = random.Random(args.seed)
+    grids = []
+    grid = GridShape(args.width, args.height)
+    grid.newNumber(rng)
+    while len(grids) < args.moves:
+        grids.append(list(grid.rows))
+        grid.moveable = grid.merged = False
+        grid.move(rng.randrange(4))
+        if grid.moveable or grid.merged:
+            grid.newNumber(rng)
+        if grid.isGameOver():
+            grid = GridShape(args.width, args.height)
+            grid.newNumber(rng)
+    directs = [rng.randrange(4) for rows in grids]
+    coords = [[[1 << rank if rank else 0 for rank in row] for row in rows]
+              for rows in grids]
+
+    shapes = []
+    for cells in coords:
+        shape = Shape(args.width, args.height)
+        shape.coords = [list(row) for row in cells]
+        shapes.append(shape)
+    lists = benchmark(shapes, directs)
+    shapes = []
+    for rows in grids:
+        shape = GridShape(args.width, args.height)
+        shape.coords = [[1 << rank if rank else 0 for rank in row]
+                        for row in rows]
+        shapes.append(shape)
+    grid = benchmark(shapes, directs)
+
+    print('board:            %dx%d' % (args.width, args.height))
+    print('list Shape:       %10.0f moves/sec' % lists)
+    print('GridShape:        %10.0f moves/sec (%.1fx)' % (grid, grid / lists))
+
+    # 64位整数只能表示4x4
+    if (args.width, args.height) == (4, 4):
+        boards = [fromCoords(cells) for cells in coords]
+        # 查表的表不算在测速里
+        loadTables()
+        begin = time.perf_counter()
+        for board, direct in zip(boards, directs):
+            move(board, direct)
+        raw = len(boards) / (time.perf_counter() - begin)
+        bits = benchmark([BitShape(board) for board in boards], directs)
+        print('BitShape:         %10.0f moves/sec (%.1fx)' % (
+            bits, bits / lists))
+        print('move() on ints:   %10.0f moves/sec (%.1fx)' % (
+            raw, raw / lists))
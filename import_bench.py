@@ -0,0 +1,72 @@
+import argparse
+import compileall
+import os
+import subprocess
+import sys
+
+# 导入每个模块要多久，有没有顺带导入PyQt5。每次都在新的进程里导入，
+# 取几次里最快的一次。先编译好字节码，和平时运行时一样
+
+Here = os.path.dirname(os.path.abspath(__file__))
+
+# 每个游戏的规则，不能依赖Qt
+Rules = ['tetris_engine', 'snake_engine', 'engine_2048', 'minesweeper_engine']
+# 批量对弈、AI和生成局面的工具，也不能依赖Qt
+Tools = ['tetris_ai', 'snake_ai', 'snake_arena', 'snake_batch', 'ai_2048',
+         'batch_2048', 'minesweeper_ai', 'minesweeper_gen',
+         'minesweeper_endless', 'replay']
+# 界面，对比用
+Widgets = ['tetris', 'snake', 'pyqt_2048', 'minesweeper']
+
+Probe = ('import sys, time\n'
+         'begin = time.perf_counter()\n'
+         'import %s\n'
+         'print(time.perf_counter() - begin, "PyQt5" in sys.modules)')
+
+
+def measure(module, repeat):
+    # 返回 (最快的秒数, 是否导入了PyQt5)
+    best = None
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, '-c', Probe % module],
+                                cwd=Here, check=True, capture_output=True,
+                                universal_newlines=True).stdout.split()
+        seconds = float(output[0])
+        best = seconds if best is None else min(best, seconds)
+    return best, output[1] == 'True'
+
+
+def report(groups, repeat):
+    lines = []
+    failed = []
+    for title, modules, allowQt in groups:
+        lines.append(title)
+        for module in modules:
+            seconds, qt = measure(module, repeat)
+            lines.append('  %-22s %8.1f ms  %s' % (
+                module, 1000 * seconds, 'PyQt5' if qt else '-'))
+            if qt and not allowQt:
+                failed.append(module)
+    return '\n'.join(lines), failed
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Import time report')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--no-widgets', action='store_true',
+                        help='skip the PyQt5 modules')
+    args = parser.parse_args()
+
+    compileall.compile_dir(Here, maxlevels=0, quiet=1)
+    groups = [('rules (no Qt):', Rules, False),
+              ('headless tools (no Qt):', Tools, False)]
+    if not args.no_widgets:
+        groups.append(('widgets:', Widgets, True))
+    text, failed = report(groups, args.repeat)
+    print('python %s, best of %d fresh processes' % (
+        sys.version.split()[0], args.repeat))
+    print(text)
+    if failed:
+        print('imported PyQt5: %s' % ', '.join(failed))
+        sys.exit(1)
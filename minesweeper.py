@@ -1,9 +1,17 @@
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QPainter, QPen
-from PyQt5.QtWidgets import QSplitter,QApplication, QFrame, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QPushButton
+from PyQt5.QtCore import QBasicTimer, QRect, Qt
+from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import QSplitter,QApplication, QFrame, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLabel, QCheckBox
+import argparse
+import os
 import sys
 
+import sprites
+from minesweeper_engine import Field, Levels, MaxSize
+from minesweeper_endless import EndlessField
+
 class Minesweeper(QMainWindow):
+    # 预先生成的无猜局面存在这里
+    BoardFile = os.path.join('boards', 'minesweeper.json')
 
     def __init__(self):
         super(Minesweeper, self).__init__()
@@ -11,15 +19,19 @@ class Minesweeper(QMainWindow):
     
     def initUI(self):
         
+        # 三种难度的无猜局面在后台进程里一直准备着
+        from minesweeper_gen import BoardPool
+        self.boards = BoardPool(Minesweeper.BoardFile,
+                                sizes=Levels.values())
         self.setWindowTitle('扫雷')
         self.resize(600, 400)
         self.level = Level(self)
         self.setCentralWidget(self.level)
         self.show()
     
-    def setUI(self):
+    def setUI(self, endless=False):
         self.centralWidget = QWidget(self)
-        self.board = Board(self)
+        self.board = EndlessBoard(self) if endless else Board(self)
         self.aside = Aside(self)
         self.hbox = QHBoxLayout(self.centralWidget)
         # self.hbox = QSplitter(Qt.Horizontal)
@@ -33,6 +45,18 @@ class Minesweeper(QMainWindow):
 
         self.board.start()
 
+    def showStatus(self):
+        self.aside.showStatus(self.board.field, self.board.solver)
+
+    def closeEvent(self, event):
+        self.boards.close()
+        board = getattr(self, 'board', None)
+        if board is not None and board.isEndless:
+            board.field.close()
+        # 关窗口时输出贴图缓存的命中次数，看缓存有没有起作用
+        print(sprites.cache.report())
+        super(Minesweeper, self).closeEvent(event)
+
 
 class Level(QFrame):
 
@@ -44,14 +68,16 @@ class Level(QFrame):
     def buttonClicked(self):
         sender = self.sender()
         if sender == self.lowBtn:
-            Board.BoardWidth = 8
-            Board.BoardHeight = 8
+            level = 'beginner'
         elif sender == self.midBtn:
-            Board.BoardWidth = 16
-            Board.BoardHeight = 16
-        elif sender == self.highBtn:
-            Board.BoardWidth = 30
-            Board.BoardHeight = 16
+            level = 'intermediate'
+        elif sender == self.endlessBtn:
+            self.parent.setUI(endless=True)
+            self.close()
+            return
+        else:
+            level = 'expert'
+        Board.BoardWidth, Board.BoardHeight, Board.NumMines = Levels[level]
         self.parent.setUI()
         self.close()
 
@@ -61,12 +87,15 @@ class Level(QFrame):
         self.lowBtn = QPushButton('8  *  8')
         self.midBtn = QPushButton('16  *  16')
         self.highBtn = QPushButton('30  *  16')
+        self.endlessBtn = QPushButton('无尽')
         self.lowBtn.clicked.connect(self.buttonClicked)
         self.midBtn.clicked.connect(self.buttonClicked)
         self.highBtn.clicked.connect(self.buttonClicked)
+        self.endlessBtn.clicked.connect(self.buttonClicked)
         hbox.addWidget(self.lowBtn)
         hbox.addWidget(self.midBtn)
         hbox.addWidget(self.highBtn)
+        hbox.addWidget(self.endlessBtn)
         hbox.addStretch()
         vbox = QVBoxLayout()
         vbox.addStretch()
@@ -79,46 +108,720 @@ class Board(QFrame):
 
     BoardWidth = 8
     BoardHeight = 8
+    NumMines = 10
+    # 数字1到8的颜色
+    numberColors = [None, 0x0000FF, 0x008000, 0xFF0000, 0x000080,
+                    0x800000, 0x008080, 0x000000, 0x808080]
+    RevealedColor = 0xDDDDDD
+    ExplodedColor = 0xFF4444
+    # 自动玩每一步的间隔（毫秒）
+    AutoInterval = 50
+    # 格子边长（像素）的范围，小于GridSize不画格线，小于TextSize不画数字
+    MinCell = 2
+    MaxCell = 64
+    GridSize = 6
+    TextSize = 10
+    ZoomStep = 1.25
+    # 方向键一次移动的格子数；按下后移动超过DragDistance像素算拖动
+    PanStep = 5
+    DragDistance = 4
+    isEndless = False
 
     def __init__(self, parent):
         super(Board, self).__init__(parent)
+        self.game = parent
         self.initBoard()
 
     def initBoard(self):
         self.setStyleSheet('QFrame{background-color: agb(22,66,77)}')
+        # 规则在minesweeper_engine里，这里只负责显示和鼠标
+        self.field = Field(Board.BoardWidth, Board.BoardHeight,
+                           Board.NumMines)
+        self.isNoGuess = False
+        # 提示和自动玩用的solver，需要时才创建，之后每次翻开增量更新
+        self.solver = None
+        self.showProbs = False
+        self.isAutoPlay = False
+        self.timer = QBasicTimer()
+        # 格子的边长和格子 (0, 0) 左上角的位置，可以缩放和拖动
+        self.cell = 20
+        self.originX = 0
+        self.originY = 0
+        self.isZoomed = False
+        self.pressPos = None
+        self.isDragging = False
+        # 缓存的格线贴图
+        self.grid = None
+        self.gridKey = None
+        self.setFocusPolicy(Qt.StrongFocus)
     
     def start(self):
-        self.resize(20 * Board.BoardWidth, 20 * Board.BoardHeight)
-        # self.parent.resize(self.)
-    
+        self.field = Field(Board.BoardWidth, Board.BoardHeight,
+                           Board.NumMines)
+        # 有准备好的无猜局面就用它，直接翻开起点；没有就用随机的局面，
+        # 不等后台生成。自定义大小也交给后台，下一局再用
+        layout = self.game.boards.take(
+            (Board.BoardWidth, Board.BoardHeight, Board.NumMines))
+        self.isNoGuess = layout is not None
+        if layout is not None:
+            first, mines = layout
+            self.field.setMines(mines)
+            self.field.reveal(first)
+        self.solver = None
+        self.setAutoPlay(False)
+        if self.showProbs:
+            self.getSolver()
+        self.isZoomed = False
+        self.fit()
+        self.game.showStatus()
+
+    def getSolver(self):
+        if self.solver is None:
+            import minesweeper_ai
+            self.solver = minesweeper_ai.Solver(self.field)
+        return self.solver
+
+    def setShowProbs(self, show):
+        self.showProbs = show
+        if show:
+            self.getSolver()
+        self.update()
+        self.game.showStatus()
+
+    def setAutoPlay(self, auto):
+        self.isAutoPlay = auto
+        if auto and not self.field.isOver:
+            self.getSolver()
+            self.timer.start(Board.AutoInterval, self)
+        else:
+            self.isAutoPlay = False
+            self.timer.stop()
+
+    def timerEvent(self, event):
+        if event.timerId() != self.timer.timerId():
+            super(Board, self).timerEvent(event)
+            return
+        changed = self.solver.step()
+        self.cellsChanged(changed, True)
+        if self.field.isOver:
+            self.setAutoPlay(False)
+            self.game.showStatus()
+
+    def cellAt(self, pos):
+        cell = self.cell
+        x = (pos.x() - self.originX) // cell
+        y = (pos.y() - self.originY) // cell
+        if 0 <= x < Board.BoardWidth and 0 <= y < Board.BoardHeight:
+            return y * Board.BoardWidth + x
+        return None
+
+    def fit(self):
+        # 放得下时格子放大到刚好放下整个棋盘，放不下时用最小的格子，可以拖动
+        rect = self.contentsRect()
+        cell = min(rect.width() // Board.BoardWidth,
+                   rect.height() // Board.BoardHeight)
+        self.setCell(max(Board.MinCell, min(Board.MaxCell, cell)))
+        self.originX = 0
+        self.originY = 0
+        self.clampOrigin()
+        self.update()
+
+    def setCell(self, cell):
+        if cell != self.cell:
+            self.cell = cell
+            sprites.cache.invalidate('minesweeper')
+
+    def clampOrigin(self):
+        # 棋盘比窗口小时居中，比窗口大时不能拖到露出棋盘外面
+        rect = self.contentsRect()
+        size = Board.BoardWidth * self.cell
+        if size <= rect.width():
+            self.originX = (rect.width() - size) // 2
+        else:
+            self.originX = min(0, max(rect.width() - size, self.originX))
+        size = Board.BoardHeight * self.cell
+        if size <= rect.height():
+            self.originY = (rect.height() - size) // 2
+        else:
+            self.originY = min(0, max(rect.height() - size, self.originY))
+
+    def pan(self, dx, dy):
+        self.originX -= dx
+        self.originY -= dy
+        self.clampOrigin()
+        self.update()
+
+    def zoom(self, zoomIn, x, y):
+        # 以 (x, y) 为中心缩放，鼠标下面的格子不动
+        if zoomIn:
+            cell = max(self.cell + 1, int(self.cell * Board.ZoomStep))
+        else:
+            cell = int(self.cell / Board.ZoomStep)
+        cell = max(Board.MinCell, min(Board.MaxCell, cell))
+        if cell == self.cell:
+            return
+        self.originX = x - (x - self.originX) * cell // self.cell
+        self.originY = y - (y - self.originY) * cell // self.cell
+        self.isZoomed = True
+        self.setCell(cell)
+        self.clampOrigin()
+        self.update()
+
+    def resizeEvent(self, event):
+        if self.isZoomed:
+            self.clampOrigin()
+        else:
+            self.fit()
+        super(Board, self).resizeEvent(event)
+
+    def wheelEvent(self, event):
+        pos = event.pos()
+        self.zoom(event.angleDelta().y() > 0, pos.x(), pos.y())
+
+    def keyPressEvent(self, event):
+        # 方向键移动，+和-缩放，Home回到整个棋盘
+        step = Board.PanStep * self.cell
+        rect = self.contentsRect()
+        key = event.key()
+        if key == Qt.Key_Left:
+            self.pan(-step, 0)
+        elif key == Qt.Key_Right:
+            self.pan(step, 0)
+        elif key == Qt.Key_Up:
+            self.pan(0, -step)
+        elif key == Qt.Key_Down:
+            self.pan(0, step)
+        elif key in (Qt.Key_Plus, Qt.Key_Equal):
+            self.zoom(True, rect.width() // 2, rect.height() // 2)
+        elif key == Qt.Key_Minus:
+            self.zoom(False, rect.width() // 2, rect.height() // 2)
+        elif key == Qt.Key_Home:
+            self.isZoomed = False
+            self.fit()
+        else:
+            super(Board, self).keyPressEvent(event)
+
+    def mousePressEvent(self, event):
+        self.pressPos = event.pos()
+        self.lastPos = event.pos()
+        self.isDragging = False
+
+    def mouseMoveEvent(self, event):
+        if self.pressPos is None:
+            return
+        if not self.isDragging:
+            moved = event.pos() - self.pressPos
+            if moved.manhattanLength() < Board.DragDistance:
+                return
+            self.isDragging = True
+        delta = event.pos() - self.lastPos
+        self.lastPos = event.pos()
+        self.pan(-delta.x(), -delta.y())
+
+    def mouseReleaseEvent(self, event):
+        # 拖动是移动棋盘；没有拖动才算点击：左键翻开，右键插旗，
+        # 中键或者点已经翻开的数字时翻开周围
+        isClick = self.pressPos is not None and not self.isDragging
+        self.pressPos = None
+        cell = self.cellAt(event.pos())
+        if not isClick or cell is None:
+            return
+        field = self.field
+        if event.button() == Qt.RightButton:
+            self.cellsChanged(field.toggleFlag(cell), False)
+        elif event.button() == Qt.MiddleButton or field.revealed[cell]:
+            self.cellsChanged(field.chord(cell), True)
+        else:
+            self.cellsChanged(field.reveal(cell), True)
+
+    def cellsChanged(self, changed, revealed):
+        # revealed为True时changed是新翻开的格子，否则是插旗、拔旗的格子
+        if not changed:
+            return
+        if revealed and self.solver is not None:
+            self.solver.update(changed)
+
+        if self.field.isOver and not self.field.isWon or \
+                revealed and self.showProbs:
+            # 输了要显示所有的雷；显示概率时整个边界的概率都会变
+            self.update()
+        else:
+            self.updateCells(changed)
+        self.game.showStatus()
+
+    def updateCells(self, cells):
+        # 只重画包住这些格子的矩形
+        width = Board.BoardWidth
+        xs = [cell % width for cell in cells]
+        ys = [cell // width for cell in cells]
+        size = self.cell
+        left = self.originX + min(xs) * size
+        top = self.originY + min(ys) * size
+        self.update(QRect(left, top, (max(xs) - min(xs) + 1) * size + 1,
+                          (max(ys) - min(ys) + 1) * size + 1))
+
     def paintEvent(self, event):
         painter = QPainter(self)
-        pen = QPen(Qt.black, 2, Qt.SolidLine)
-        painter.setPen(pen)
-        for i in range(Board.BoardHeight):
-            painter.drawLine(0, i * self.squareHeight(),
-                             self.contentsRect().width(), i * self.squareHeight())
-        
-        for i in range(Board.BoardWidth):
-            painter.drawLine(i * self.squareWidth(),0,
-                             i * self.squareWidth(),self.contentsRect().height())
-    
-    def squareWidth(self):
-        return self.contentsRect().width() / Board.BoardWidth
-    
-    def squareHeight(self):
-        return self.contentsRect().height() / Board.BoardHeight
+        field = self.field
+        width = Board.BoardWidth
+        size = self.cell
+        ox = self.originX
+        oy = self.originY
+        # 只画要重画的区域里的格子
+        rect = event.rect()
+        x0 = max(0, (rect.left() - ox) // size)
+        x1 = min(width, (rect.right() - ox) // size + 1)
+        y0 = max(0, (rect.top() - oy) // size)
+        y1 = min(Board.BoardHeight, (rect.bottom() - oy) // size + 1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        lost = field.isOver and not field.isWon
+        revealed = field.revealed
+        flagged = field.flagged
+        mines = field.mines
+        counts = field.counts
+        showText = size >= Board.TextSize
+
+        # 翻开的格子每行取出连续的几段，所有的段一次画完；
+        # 数字、旗子和雷用贴图，格子太小时旗子和雷也只画成方块，一次画完
+        runs = []
+        glyphs = []
+        marks = {'flag': [], 'cross': [], 'mine': []}
+        for y in range(y0, y1):
+            start = y * width
+            end = start + x1
+            top = oy + y * size
+            i = revealed.find(1, start + x0, end)
+            while i >= 0:
+                j = revealed.find(0, i, end)
+                if j < 0:
+                    j = end
+                runs.append(QRect(ox + (i - start) * size, top,
+                                  (j - i) * size, size))
+                if showText:
+                    for cell in range(i, j):
+                        if counts[cell] and not mines[cell]:
+                            glyphs.append((cell, counts[cell]))
+                i = revealed.find(1, j, end)
+
+            i = flagged.find(1, start + x0, end)
+            while i >= 0:
+                # 输了以后插错的旗子画成叉
+                glyphs.append((i, 'cross' if lost and not mines[i]
+                               else 'flag'))
+                i = flagged.find(1, i + 1, end)
+            if lost:
+                i = mines.find(1, start + x0, end)
+                while i >= 0:
+                    if not flagged[i]:
+                        glyphs.append((i, 'mine'))
+                    i = mines.find(1, i + 1, end)
+        if not showText:
+            for cell, kind in glyphs:
+                marks[kind].append(QRect(ox + cell % width * size,
+                                         oy + cell // width * size,
+                                         size, size))
+            glyphs = []
+
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(Board.RevealedColor))
+        painter.drawRects(runs)
+        for kind, color in (('flag', 0xFF0000), ('cross', 0xFF8800),
+                            ('mine', 0x000000)):
+            if marks[kind]:
+                painter.setBrush(QColor(color))
+                painter.drawRects(marks[kind])
+        painter.setBrush(Qt.NoBrush)
+        if field.exploded is not None:
+            cell = field.exploded
+            painter.fillRect(ox + cell % width * size, oy + cell // width * size,
+                             size, size, QColor(Board.ExplodedColor))
+        for cell, kind in glyphs:
+            painter.drawPixmap(ox + cell % width * size,
+                               oy + cell // width * size, self.glyph(kind))
+
+        if self.showProbs and not field.isOver:
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    cell = y * width + x
+                    if not revealed[cell] and not flagged[cell]:
+                        self.drawProb(painter, QRect(ox + x * size,
+                                                     oy + y * size,
+                                                     size, size), cell)
+
+        # 格线是缓存的贴图，只在大小改变或者缩放时重画，拖动时只是平移
+        if size >= Board.GridSize:
+            painter.setClipRect(rect.intersected(QRect(
+                ox, oy, width * size + 1, Board.BoardHeight * size + 1)))
+            painter.drawPixmap(ox % size - size, oy % size - size,
+                               self.gridPixmap())
+
+    def gridPixmap(self):
+        size = self.cell
+        rect = self.contentsRect()
+        key = (size, rect.width(), rect.height())
+        if self.gridKey != key:
+            ratio = self.devicePixelRatioF()
+            width = rect.width() + size + 1
+            height = rect.height() + size + 1
+            pixmap = QPixmap(int(width * ratio), int(height * ratio))
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            painter.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+            for x in range(0, width, size):
+                painter.drawLine(x, 0, x, height)
+            for y in range(0, height, size):
+                painter.drawLine(0, y, width, y)
+            painter.end()
+            self.grid = pixmap
+            self.gridKey = key
+        return self.grid
+
+    def glyph(self, kind):
+        # 同样大小的数字、旗子和雷只画一次
+        return sprites.cache.get('minesweeper', kind, self.cell, self.cell,
+                                 self.devicePixelRatioF(),
+                                 lambda painter, width, height:
+                                 self.renderGlyph(painter, kind, width, height))
+
+    def renderGlyph(self, painter, kind, width, height):
+        rect = QRect(0, 0, width, height)
+        if kind == 'mine':
+            self.drawMine(painter, rect)
+            return
+        font = painter.font()
+        font.setPixelSize(max(6, height * 3 // 5))
+        painter.setFont(font)
+        if kind == 'flag':
+            painter.setPen(QColor(0xFF0000))
+            painter.drawText(rect, Qt.AlignCenter, '⚑')
+        elif kind == 'cross':
+            painter.setPen(QColor(0xFF0000))
+            painter.drawText(rect, Qt.AlignCenter, '✕')
+        else:
+            painter.setPen(QColor(Board.numberColors[kind]))
+            painter.drawText(rect, Qt.AlignCenter, str(kind))
+
+    def drawProb(self, painter, rect, cell):
+        # 一定安全的画绿色，其他的按是雷的概率画深浅不同的红色
+        solver = self.solver
+        known = solver.known.get(cell)
+        if known is None:
+            probs, other = solver.probabilities()
+            prob = probs.get(cell, other)
+        else:
+            prob = float(known)
+        if prob == 0.0:
+            painter.fillRect(rect, QColor(0, 200, 0, 90))
+        else:
+            painter.fillRect(rect, QColor(255, 0, 0, int(30 + 150 * prob)))
+        if rect.width() >= 24:
+            painter.setPen(Qt.black)
+            painter.drawText(rect, Qt.AlignCenter, '%d' % round(100 * prob))
+
+    def drawMine(self, painter, rect):
+        size = min(rect.width(), rect.height()) // 2
+        painter.setBrush(Qt.black)
+        painter.setPen(Qt.NoPen)
+        painter.drawEllipse(rect.center(), size // 2, size // 2)
+        painter.setBrush(Qt.NoBrush)
+
+class EndlessBoard(QFrame):
+    # 无尽模式。拖动或者方向键移动视野，只画看得见的区块，
+    # 区块在minesweeper_endless里按需生成
+    CellSize = 20
+    # 方向键一次移动的格子数
+    PanStep = 5
+    # 按下后移动超过这么多像素算拖动，不算点击
+    DragDistance = 4
+    isEndless = True
+    isNoGuess = False
+    solver = None
+    isAutoPlay = False
+
+    def __init__(self, parent):
+        super(EndlessBoard, self).__init__(parent)
+        self.game = parent
+        self.field = None
+        # 连锁翻开一次翻不完时，每一帧接着翻一批
+        self.timer = QBasicTimer()
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setMinimumSize(200, 200)
+
+    def start(self):
+        if self.field is not None:
+            self.field.close()
+        self.field = EndlessField()
+        # 视野中心的世界坐标（像素），一开始对着起点 (0, 0)
+        size = EndlessBoard.CellSize
+        self.cameraX = size // 2
+        self.cameraY = size // 2
+        self.pressPos = None
+        self.isDragging = False
+        self.timer.stop()
+        self.cellsChanged(self.field.reveal(0, 0))
+        self.update()
+        self.game.showStatus()
+
+    def setShowProbs(self, show):
+        pass
+
+    def setAutoPlay(self, auto):
+        pass
+
+    def origin(self):
+        # 格子 (0, 0) 左上角在窗口里的位置
+        rect = self.contentsRect()
+        return (rect.width() // 2 - self.cameraX,
+                rect.height() // 2 - self.cameraY)
+
+    def cellAt(self, pos):
+        size = EndlessBoard.CellSize
+        ox, oy = self.origin()
+        return (pos.x() - ox) // size, (pos.y() - oy) // size
+
+    def pan(self, dx, dy):
+        self.cameraX += dx
+        self.cameraY += dy
+        self.update()
+
+    def keyPressEvent(self, event):
+        step = EndlessBoard.PanStep * EndlessBoard.CellSize
+        key = event.key()
+        if key == Qt.Key_Left:
+            self.pan(-step, 0)
+        elif key == Qt.Key_Right:
+            self.pan(step, 0)
+        elif key == Qt.Key_Up:
+            self.pan(0, -step)
+        elif key == Qt.Key_Down:
+            self.pan(0, step)
+        elif key == Qt.Key_Home:
+            self.pan(EndlessBoard.CellSize // 2 - self.cameraX,
+                     EndlessBoard.CellSize // 2 - self.cameraY)
+        else:
+            super(EndlessBoard, self).keyPressEvent(event)
+
+    def mousePressEvent(self, event):
+        self.pressPos = event.pos()
+        self.lastPos = event.pos()
+        self.isDragging = False
+
+    def mouseMoveEvent(self, event):
+        if self.pressPos is None:
+            return
+        if not self.isDragging:
+            moved = event.pos() - self.pressPos
+            if moved.manhattanLength() < EndlessBoard.DragDistance:
+                return
+            self.isDragging = True
+        delta = event.pos() - self.lastPos
+        self.lastPos = event.pos()
+        self.pan(-delta.x(), -delta.y())
+
+    def mouseReleaseEvent(self, event):
+        # 没有拖动才算点击：左键翻开，右键插旗，中键或者点数字翻开周围
+        if self.pressPos is None or self.isDragging:
+            self.pressPos = None
+            return
+        self.pressPos = None
+        x, y = self.cellAt(event.pos())
+        field = self.field
+        chunk, i = field.locate(x, y)
+        if event.button() == Qt.RightButton:
+            self.cellsChanged(field.toggleFlag(x, y))
+        elif event.button() == Qt.MiddleButton or chunk.revealed[i]:
+            self.cellsChanged(field.chord(x, y))
+        else:
+            self.cellsChanged(field.reveal(x, y))
+
+    def timerEvent(self, event):
+        if event.timerId() != self.timer.timerId():
+            super(EndlessBoard, self).timerEvent(event)
+            return
+        self.cellsChanged(self.field.spread())
+
+    def cellsChanged(self, changed):
+        if self.field.pending:
+            if not self.timer.isActive():
+                self.timer.start(0, self)
+        else:
+            self.timer.stop()
+        if not changed:
+            return
+        if self.field.isOver:
+            self.update()
+        else:
+            # 只重画包住这些格子的矩形
+            size = EndlessBoard.CellSize
+            ox, oy = self.origin()
+            xs = [x for x, y in changed]
+            ys = [y for x, y in changed]
+            left = ox + min(xs) * size
+            top = oy + min(ys) * size
+            self.update(QRect(left, top,
+                              (max(xs) - min(xs) + 1) * size + 1,
+                              (max(ys) - min(ys) + 1) * size + 1))
+        self.game.showStatus()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        field = self.field
+        size = EndlessBoard.CellSize
+        chunkSize = EndlessField.ChunkSize
+        ox, oy = self.origin()
+        rect = event.rect()
+        x0 = (rect.left() - ox) // size
+        x1 = (rect.right() - ox) // size + 1
+        y0 = (rect.top() - oy) // size
+        y1 = (rect.bottom() - oy) // size + 1
+        painter.fillRect(rect, QColor(0xAAAAAA))
+        # 一个区块一个区块地画，不用每格都去找区块
+        for cy in range(y0 // chunkSize, (y1 - 1) // chunkSize + 1):
+            for cx in range(x0 // chunkSize, (x1 - 1) // chunkSize + 1):
+                chunk = field.chunk(cx, cy)
+                for y in range(max(y0, cy * chunkSize),
+                               min(y1, (cy + 1) * chunkSize)):
+                    row = (y - cy * chunkSize) * chunkSize - cx * chunkSize
+                    for x in range(max(x0, cx * chunkSize),
+                                   min(x1, (cx + 1) * chunkSize)):
+                        self.drawCell(painter, chunk, row + x,
+                                      QRect(ox + x * size, oy + y * size,
+                                            size, size), (x, y))
+
+        painter.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+        for y in range(y0, y1 + 1):
+            painter.drawLine(rect.left(), oy + y * size,
+                             rect.right(), oy + y * size)
+        for x in range(x0, x1 + 1):
+            painter.drawLine(ox + x * size, rect.top(),
+                             ox + x * size, rect.bottom())
+
+    def drawCell(self, painter, chunk, i, rect, cell):
+        field = self.field
+        if chunk.revealed[i]:
+            color = Board.ExplodedColor if cell == field.exploded else \
+                Board.RevealedColor
+            painter.fillRect(rect, QColor(color))
+            if chunk.mines[i]:
+                self.drawMine(painter, rect)
+            elif chunk.counts[i]:
+                painter.setPen(QColor(Board.numberColors[chunk.counts[i]]))
+                painter.drawText(rect, Qt.AlignCenter, str(chunk.counts[i]))
+        elif chunk.flagged[i]:
+            painter.setPen(QColor(0xFF0000))
+            painter.drawText(rect, Qt.AlignCenter,
+                             '✕' if field.isOver and not chunk.mines[i]
+                             else '⚑')
+        elif field.isOver and chunk.mines[i]:
+            self.drawMine(painter, rect)
+
+    def drawMine(self, painter, rect):
+        Board.drawMine(self, painter, rect)
 
 class Aside(QWidget):
 
     def __init__(self, parent):
         super(Aside, self).__init__(parent)
+        self.game = parent
         self.initAside()
 
     def initAside(self):
-        pass
+        # 剩下的雷数、状态和重新开始的按钮；下面是概率提示和自动玩
+        self.minesLabel = QLabel(self)
+        self.statusLabel = QLabel(self)
+        self.restartBtn = QPushButton('重新开始', self)
+        self.restartBtn.clicked.connect(lambda: self.game.board.start())
+        self.probsBox = QCheckBox('显示概率', self)
+        self.probsBox.toggled.connect(
+            lambda checked: self.game.board.setShowProbs(checked))
+        self.autoBtn = QPushButton('自动', self)
+        self.autoBtn.setCheckable(True)
+        self.autoBtn.toggled.connect(
+            lambda checked: self.game.board.setAutoPlay(checked))
+        self.hintLabel = QLabel(self)
+        self.hintLabel.setWordWrap(True)
+        vbox = QVBoxLayout(self)
+        vbox.addWidget(self.minesLabel)
+        vbox.addWidget(self.statusLabel)
+        vbox.addWidget(self.restartBtn)
+        vbox.addWidget(self.probsBox)
+        vbox.addWidget(self.autoBtn)
+        vbox.addWidget(self.hintLabel)
+        vbox.addStretch()
+
+    def showStatus(self, field, solver=None):
+        board = self.game.board
+        if board.isEndless:
+            self.showEndless(field)
+            return
+        self.minesLabel.setText('剩余雷数: %d' % field.minesLeft())
+        if field.isWon:
+            status = '赢了'
+        elif field.isOver:
+            status = '踩到雷了'
+        else:
+            status = '进行中'
+        kind = '无猜局面' if board.isNoGuess else '随机局面'
+        self.statusLabel.setText('状态: %s（%s）' % (status, kind))
+        self.autoBtn.setChecked(self.game.board.isAutoPlay)
+
+        if solver is None or field.isOver or not field.isPlaced:
+            self.hintLabel.setText('')
+            return
+        # 推出来的格子，推不出来时是雷的概率最小的格子
+        text = '一定安全: %d  推出的雷: %d' % (len(solver.safe),
+                                        sum(solver.known.values()))
+        if not solver.safe:
+            probs, other = solver.probabilities()
+            prob = min(min(probs.values(), default=1.0), other)
+            text += '\n要猜了，最小的概率: %.1f%%' % (100 * prob)
+        self.hintLabel.setText(text)
+
+    def showEndless(self, field):
+        # 无尽模式没有雷数和提示，显示分数和内存里的区块
+        self.probsBox.hide()
+        self.autoBtn.hide()
+        self.minesLabel.setText('翻开: %d  插旗: %d' % (field.numRevealed,
+                                                    field.numFlags))
+        self.statusLabel.setText('状态: %s（无尽）' % (
+            '踩到雷了' if field.isOver else '进行中'))
+        stats = field.stats()
+        self.hintLabel.setText(
+            '拖动或者方向键移动，Home回到起点\n'
+            '内存里的区块: %d  存盘: %d\n内存: %.1f KB' % (
+                stats['loaded'], stats['spilled'], stats['memory'] / 1024.0))
 
 if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Minesweeper')
+    parser.add_argument('--width', type=int, default=0,
+                        help='custom board, skips the level buttons')
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=40)
+    parser.add_argument('--endless', action='store_true',
+                        help='endless board, skips the level buttons')
+    args = parser.parse_args()
+    # 自定义大小开窗口前先检查，和Field的限制一样
+    if args.width:
+        if not 1 <= args.width <= MaxSize or not 1 <= args.height <= MaxSize:
+            parser.error('width and height must be in [1, %d]' % MaxSize)
+        if args.width * args.height < 10:
+            parser.error('a custom board needs at least 10 cells')
+        if not 0 < args.mines <= args.width * args.height - 9:
+            parser.error('--mines must be in [1, %d] for a %dx%d board' % (
+                args.width * args.height - 9, args.width, args.height))
+
     app = QApplication(sys.argv)
     ninesweeper = Minesweeper()
+    if args.endless:
+        ninesweeper.level.close()
+        ninesweeper.setUI(endless=True)
+    elif args.width:
+        Board.BoardWidth = args.width
+        Board.BoardHeight = args.height
+        Board.NumMines = args.mines
+        ninesweeper.level.close()
+        ninesweeper.setUI()
     sys.exit(app.exec_())
@@ -0,0 +1,396 @@
+import random
+import time
+
+from minesweeper_engine import Field, Levels
+
+# 扫雷的提示和自动玩。只看翻开的数字，不看雷在哪。
+# 每个翻开的数字是一个约束：它周围还不知道的格子里有几个雷。先用单个约束和
+# 子集关系推出一定安全、一定是雷的格子；推不出时把边界上的格子按约束分成
+# 互不相关的几块，每块单独枚举，算出每一格是雷的概率。
+# 每次翻开以后只更新受影响的约束，不从头再算
+
+
+def choose(n, k):
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in range(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+class Solver(object):
+    # 记住的分块枚举结果的个数，超过就清空
+    CacheSize = 4096
+
+    def __init__(self, field):
+        self.field = field
+        # 约束：数字格子 -> 周围还不知道的格子，以及其中还剩几个雷
+        self.cells = {}
+        self.remaining = {}
+        # 还不知道的格子 -> 包含它的约束
+        self.owners = {}
+        # 推出来的格子：格子 -> 1是雷，0是安全；safe是还没翻开的安全格子
+        self.known = {}
+        self.safe = set()
+        self.dirty = set()
+        self.cache = {}
+        self.probs = None
+
+        self.deductions = 0
+        self.guesses = 0
+        self.enumerations = 0
+        self.cacheHits = 0
+        self.update(i for i in range(field.size) if field.revealed[i])
+
+    def isUnknown(self, cell):
+        return not self.field.revealed[cell] and cell not in self.known
+
+    def update(self, changed):
+        # 翻开了changed里的格子以后调用
+        field = self.field
+        self.probs = None
+        for cell in changed:
+            if field.mines[cell] and field.revealed[cell]:
+                # 踩到雷了，游戏已经结束
+                continue
+            self.known.pop(cell, None)
+            self.safe.discard(cell)
+            for owner in self.owners.pop(cell, ()):
+                self.cells[owner].discard(cell)
+                self.dirty.add(owner)
+
+            if not field.counts[cell]:
+                continue
+            around = []
+            mines = 0
+            for n in field.neighbors(cell):
+                if self.known.get(n) == 1:
+                    mines += 1
+                elif self.isUnknown(n):
+                    around.append(n)
+            if around:
+                self.cells[cell] = set(around)
+                self.remaining[cell] = field.counts[cell] - mines
+                for n in around:
+                    self.owners.setdefault(n, set()).add(cell)
+                self.dirty.add(cell)
+        self.propagate()
+
+    def setKnown(self, cell, value):
+        if cell in self.known:
+            return
+        self.deductions += 1
+        self.known[cell] = value
+        if not value:
+            self.safe.add(cell)
+        for owner in self.owners.pop(cell, ()):
+            self.cells[owner].discard(cell)
+            self.remaining[owner] -= value
+            self.dirty.add(owner)
+
+    def propagate(self):
+        # 反复用两条规则，直到推不出新的格子
+        cells = self.cells
+        remaining = self.remaining
+        while self.dirty:
+            a = self.dirty.pop()
+            if a not in cells:
+                continue
+            if not cells[a]:
+                del cells[a]
+                del remaining[a]
+                continue
+
+            # 单个约束：剩0个雷都安全，剩下的格子数等于雷数都是雷
+            if remaining[a] == 0 or remaining[a] == len(cells[a]):
+                value = 1 if remaining[a] else 0
+                for cell in list(cells[a]):
+                    self.setKnown(cell, value)
+                continue
+
+            # 子集：a的格子都在b里，b多出来的格子里的雷数是两者之差
+            others = set()
+            for cell in cells[a]:
+                others.update(self.owners.get(cell, ()))
+            others.discard(a)
+            for b in others:
+                if b not in cells or a not in cells:
+                    continue
+                for small, big in ((a, b), (b, a)):
+                    if cells[small] <= cells[big]:
+                        diff = cells[big] - cells[small]
+                        mines = remaining[big] - remaining[small]
+                        if diff and (mines == 0 or mines == len(diff)):
+                            for cell in list(diff):
+                                self.setKnown(cell, 1 if mines else 0)
+
+    def components(self):
+        # 共用约束的格子分到同一块
+        seen = set()
+        for start in list(self.owners):
+            if start in seen:
+                continue
+            cells = []
+            constraints = set()
+            stack = [start]
+            seen.add(start)
+            while stack:
+                cell = stack.pop()
+                cells.append(cell)
+                for owner in self.owners[cell]:
+                    if owner in constraints:
+                        continue
+                    constraints.add(owner)
+                    for n in self.cells[owner]:
+                        if n not in seen:
+                            seen.add(n)
+                            stack.append(n)
+            yield cells, constraints
+
+    def enumerate(self, cells, constraints):
+        # 数一块里所有满足约束的放法。返回 {雷数: 放法数} 和
+        # {雷数: 每一格是雷的放法数}，格子顺序和cells一样
+        key = tuple(sorted((tuple(sorted(self.cells[c])), self.remaining[c])
+                           for c in constraints))
+        result = self.cache.get(key)
+        if result is not None:
+            self.cacheHits += 1
+            return result
+        self.enumerations += 1
+
+        # 格子按广度优先排，同一个约束的格子挨在一起，同时没数完的约束少
+        members = {}
+        for r, (group, need) in enumerate(key):
+            for cell in group:
+                members.setdefault(cell, []).append(r)
+        order = [key[0][0][0]]
+        index = {order[0]: 0}
+        for cell in order:
+            for r in members[cell]:
+                for n in key[r][0]:
+                    if n not in index:
+                        index[n] = len(order)
+                        order.append(n)
+        count = len(order)
+        ruleOf = [members[cell] for cell in order]
+        # 每个约束在第i格之后还有几格
+        last = {}
+        for i, rules in enumerate(ruleOf):
+            for r in rules:
+                last.setdefault(r, []).append(i)
+        after = [[len(last[r]) - last[r].index(i) - 1 for r in rules]
+                 for i, rules in enumerate(ruleOf)]
+
+        # 状态是每个约束还差几个雷。前面的格子怎么放不影响后面，只要状态
+        # 一样就合并：forward[i]是放完前i格时每个状态的 {雷数: 放法数}
+        start = tuple(need for group, need in key)
+        forward = [{start: {0: 1}}]
+        edges = []
+        for i in range(count):
+            layer = {}
+            moves = []
+            for state, ways in forward[i].items():
+                for value in (0, 1):
+                    needs = list(state)
+                    for r, left in zip(ruleOf[i], after[i]):
+                        needs[r] -= value
+                        if needs[r] < 0 or needs[r] > left:
+                            break
+                    else:
+                        needs = tuple(needs)
+                        moves.append((state, value, needs))
+                        target = layer.setdefault(needs, {})
+                        for k, w in ways.items():
+                            target[k + value] = target.get(k + value, 0) + w
+            forward.append(layer)
+            edges.append(moves)
+
+        # 从后往前：backward是从这个状态放完剩下的格子的 {雷数: 放法数}；
+        # 第i格是雷的放法数是前后两段相乘
+        backward = {state: {0: 1} for state in forward[count]}
+        rows = {}
+        for i in range(count - 1, -1, -1):
+            previous = {}
+            for state, value, needs in edges[i]:
+                tail = backward.get(needs)
+                if tail is None:
+                    continue
+                target = previous.setdefault(state, {})
+                for k, w in tail.items():
+                    target[k + value] = target.get(k + value, 0) + w
+                if value:
+                    for a, x in forward[i][state].items():
+                        for b, y in tail.items():
+                            row = rows.setdefault(a + b + 1, [0] * count)
+                            row[i] += x * y
+            backward = previous
+
+        counts = backward.get(start, {})
+        position = [index[cell] for cell in cells]
+        result = (counts, {k: [row[p] for p in position]
+                           for k, row in rows.items()})
+        if len(self.cache) >= Solver.CacheSize:
+            self.cache.clear()
+        self.cache[key] = result
+        return result
+
+    def probabilities(self):
+        # 返回 ({边界格子: 是雷的概率}, 其他不知道的格子是雷的概率)
+        if self.probs is not None:
+            return self.probs
+        field = self.field
+        blocks = []
+        frontier = 0
+        for cells, constraints in self.components():
+            counts, cellCounts = self.enumerate(cells, constraints)
+            blocks.append((cells, counts, cellCounts))
+            frontier += len(cells)
+
+        knownMines = sum(self.known.values())
+        minesLeft = field.numMines - knownMines
+        others = field.size - field.numRevealed - len(self.known) - frontier
+
+        # 每一块的雷数分布卷积起来，再乘上其他格子的放法数
+        def convolve(blocks):
+            total = {0: 1}
+            for cells, counts, cellCounts in blocks:
+                merged = {}
+                for a, x in total.items():
+                    for b, y in counts.items():
+                        merged[a + b] = merged.get(a + b, 0) + x * y
+                total = merged
+            return total
+
+        def weight(total, extra=0):
+            return {m: ways * choose(others, minesLeft - m - extra)
+                    for m, ways in total.items()}
+
+        everything = weight(convolve(blocks))
+        norm = sum(everything.values())
+        probs = {}
+        if not norm:
+            # 约束互相矛盾，比如插错了旗子；退回到平均的概率
+            self.probs = ({}, minesLeft / max(1, others + frontier))
+            return self.probs
+
+        for i, (cells, counts, cellCounts) in enumerate(blocks):
+            rest = convolve(blocks[:i] + blocks[i + 1:])
+            for k, row in cellCounts.items():
+                ways = sum(w for w in weight(rest, k).values())
+                if not ways:
+                    continue
+                for cell, count in zip(cells, row):
+                    probs[cell] = probs.get(cell, 0) + count * ways
+        for cell in probs:
+            probs[cell] /= norm
+        for cells, counts, cellCounts in blocks:
+            for cell in cells:
+                probs.setdefault(cell, 0.0)
+
+        if others:
+            expected = sum(w * (minesLeft - m) for m, w in everything.items())
+            otherProb = expected / norm / others
+        else:
+            otherProb = 0.0
+        self.probs = (probs, otherProb)
+        return self.probs
+
+    def bestMove(self):
+        # 返回要翻开的格子：先翻一定安全的，否则翻是雷的概率最小的
+        field = self.field
+        if field.isOver:
+            return None
+        if not field.isPlaced:
+            return field.size // 2 + field.width // 2
+        while self.safe:
+            cell = self.safe.pop()
+            if not field.revealed[cell]:
+                return cell
+
+        probs, otherProb = self.probabilities()
+        # 概率为0或1的格子直接记下来
+        for cell, p in probs.items():
+            if p == 0.0:
+                self.setKnown(cell, 0)
+            elif p == 1.0:
+                self.setKnown(cell, 1)
+        if self.safe:
+            self.propagate()
+            self.probs = None
+            return self.safe.pop()
+
+        self.guesses += 1
+        best = min(probs.items(), key=lambda item: item[1], default=None)
+        if best is not None and best[1] <= otherProb:
+            return best[0]
+        # 不在边界上的格子更安全时，优先选角上的，翻开后更容易连锁
+        cells = [cell for cell in range(field.size) if self.isUnknown(cell)
+                 and cell not in probs]
+        if not cells:
+            return best[0] if best else None
+        width = field.width
+        corners = [cell for cell in cells
+                   if cell % width in (0, width - 1) and
+                   cell // width in (0, field.height - 1)]
+        return (corners or cells)[0]
+
+    def step(self):
+        # 自动走一步，返回翻开的格子
+        cell = self.bestMove()
+        if cell is None:
+            return []
+        if self.field.flagged[cell]:
+            self.field.toggleFlag(cell)
+        changed = self.field.reveal(cell)
+        self.update(changed)
+        return changed
+
+
+def play(level, seed=None):
+    # 不显示，自动玩一局，返回 (是否赢了, 步数, 每步的秒数列表, 猜的次数)
+    width, height, mines = level
+    field = Field(width, height, mines, seed)
+    solver = Solver(field)
+    timings = []
+    while not field.isOver:
+        begin = time.perf_counter()
+        solver.step()
+        timings.append(time.perf_counter() - begin)
+    return field.isWon, len(timings), timings, solver.guesses
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Minesweeper solver')
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-l', '--level', default='expert',
+                        choices=sorted(Levels))
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    wins = 0
+    moves = 0
+    guesses = 0
+    timings = []
+    begin = time.perf_counter()
+    for i in range(args.games):
+        won, count, times, guessed = play(Levels[args.level],
+                                          rng.randrange(1 << 32))
+        wins += won
+        moves += count
+        guesses += guessed
+        timings.extend(times)
+    elapsed = time.perf_counter() - begin
+
+    timings.sort()
+    print('level:  %s %dx%d, %d mines' % ((args.level,) + Levels[args.level]))
+    print('games:  %d, won %d (%.1f%%) in %.1fs' % (
+        args.games, wins, 100.0 * wins / args.games, elapsed))
+    print('moves:  %d, %.1f guesses per game' % (
+        moves, guesses / args.games))
+    print('move time: mean %.3f ms, p99 %.2f ms, max %.2f ms' % (
+        1000 * sum(timings) / len(timings),
+        1000 * timings[int(len(timings) * 0.99)], 1000 * timings[-1]))
@@ -0,0 +1,317 @@
+import random
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+
+from minesweeper_engine import neighborCounts
+
+# 无限大的扫雷。棋盘分成 ChunkSize x ChunkSize 的区块，每个区块的雷只由种子
+# 和区块坐标决定，第一次看到或者翻开时才生成。内存里只留最近用过的区块，
+# 很久没用的区块直接丢掉，翻开、插过旗的区块丢掉前存到磁盘上，
+# 再用到时读回来。走多远内存都不会涨
+
+# 每个方向的八个邻居
+Around = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+# 存盘时每格一个字节：第0位是翻开，第1位是插旗
+_revealedTable = bytes([0, 1, 0, 1] + [0] * 252)
+_flaggedTable = bytes([0, 0, 1, 1] + [0] * 252)
+
+
+class Chunk(object):
+
+    def __init__(self, cx, cy, mines, counts):
+        self.cx = cx
+        self.cy = cy
+        self.mines = mines
+        self.counts = counts
+        self.revealed = bytearray(len(mines))
+        self.flagged = bytearray(len(mines))
+        # 翻开或者插过旗，换出内存时要存盘
+        self.touched = False
+
+    def state(self):
+        size = len(self.mines)
+        value = int.from_bytes(self.revealed, 'little') + \
+            (int.from_bytes(self.flagged, 'little') << 1)
+        return value.to_bytes(size, 'little')
+
+    def setState(self, state):
+        self.revealed = bytearray(state.translate(_revealedTable))
+        self.flagged = bytearray(state.translate(_flaggedTable))
+        self.touched = True
+
+
+class ChunkStore(object):
+    # 换出内存的区块状态，压缩后存在sqlite里。path为None时用临时文件，
+    # 关闭后自动删除
+
+    def __init__(self, path=None):
+        self.db = sqlite3.connect(path or '')
+        self.db.execute('CREATE TABLE IF NOT EXISTS chunks '
+                        '(cx INTEGER, cy INTEGER, state BLOB, '
+                        'PRIMARY KEY (cx, cy))')
+        self.bytes = 0
+
+    def load(self, cx, cy):
+        row = self.db.execute('SELECT state FROM chunks WHERE cx=? AND cy=?',
+                              (cx, cy)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def save(self, cx, cy, state):
+        blob = zlib.compress(state)
+        self.bytes += len(blob)
+        self.db.execute('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)',
+                        (cx, cy, blob))
+
+    def count(self):
+        return self.db.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+class EndlessField(object):
+    # Capacity是内存里最多的区块数；只有雷的区块算数字时要用到，单独缓存。
+    # 雷太少时连锁翻开可能停不下来，所以限制了密度和一次最多翻开的格子数，
+    # 没翻完的留在pending里，下次调用spread接着翻
+    ChunkSize = 32
+    Capacity = 256
+    MineCapacity = 1024
+    MinDensity = 0.15
+    MaxCascade = 200000
+
+    def __init__(self, seed=None, density=0.18, path=None):
+        if not EndlessField.MinDensity <= density < 1:
+            raise ValueError('density must be in [%.2f, 1)' %
+                             EndlessField.MinDensity)
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.density = density
+        self.store = ChunkStore(path)
+        self.chunks = OrderedDict()
+        self.mineCache = OrderedDict()
+        self.isOver = False
+        self.isWon = False
+        self.exploded = None
+        self.numRevealed = 0
+        self.numFlags = 0
+        # 连锁翻开还没处理的格子，翻开了的空格子的邻居都在这里面
+        self.pending = []
+
+        self.generated = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.restored = 0
+
+    def chunkMines(self, cx, cy):
+        # 同一个种子、同一个区块每次生成的雷都一样
+        key = (cx, cy)
+        mines = self.mineCache.get(key)
+        if mines is not None:
+            self.mineCache.move_to_end(key)
+            return mines
+
+        size = EndlessField.ChunkSize
+        rng = random.Random('%d:%d:%d' % (self.seed, cx, cy))
+        mines = bytearray(size * size)
+        for cell in rng.sample(range(size * size),
+                               int(round(self.density * size * size))):
+            mines[cell] = 1
+        # 起点 (0, 0) 和它周围一定没有雷
+        for x in (-1, 0, 1):
+            for y in (-1, 0, 1):
+                if x // size == cx and y // size == cy:
+                    mines[y % size * size + x % size] = 0
+
+        self.mineCache[key] = mines
+        if len(self.mineCache) > EndlessField.MineCapacity:
+            self.mineCache.popitem(last=False)
+        return mines
+
+    def chunkCounts(self, cx, cy):
+        # 区块外面加一圈邻居区块的雷，算出每格周围的雷数再去掉那一圈
+        size = EndlessField.ChunkSize
+        width = size + 2
+        padded = bytearray()
+        for y in range(-1, size + 1):
+            row = cy + y // size
+            start = y % size * size
+            padded.append(self.chunkMines(cx - 1, row)[start + size - 1])
+            padded += self.chunkMines(cx, row)[start:start + size]
+            padded.append(self.chunkMines(cx + 1, row)[start])
+        counts = neighborCounts(padded, width, width)
+        result = bytearray()
+        for y in range(1, size + 1):
+            result += counts[y * width + 1:y * width + 1 + size]
+        return result
+
+    def chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        chunk = Chunk(cx, cy, self.chunkMines(cx, cy),
+                      self.chunkCounts(cx, cy))
+        self.generated += 1
+        state = self.store.load(cx, cy)
+        if state is not None:
+            chunk.setState(state)
+            self.restored += 1
+        self.chunks[key] = chunk
+
+        # 最久没用的区块换出去，动过的先存盘
+        if len(self.chunks) > EndlessField.Capacity:
+            key, old = self.chunks.popitem(last=False)
+            self.evicted += 1
+            if old.touched:
+                self.store.save(old.cx, old.cy, old.state())
+                self.spilled += 1
+        return chunk
+
+    def locate(self, x, y):
+        # 返回格子所在的区块和在区块里的编号，负数坐标也可以
+        size = EndlessField.ChunkSize
+        return self.chunk(x // size, y // size), y % size * size + x % size
+
+    def reveal(self, x, y):
+        # 翻开一格，返回翻开了的格子 [(x, y), ...]
+        if self.isOver:
+            return []
+        chunk, i = self.locate(x, y)
+        if chunk.revealed[i] or chunk.flagged[i]:
+            return []
+        if chunk.mines[i]:
+            chunk.revealed[i] = 1
+            chunk.touched = True
+            self.exploded = (x, y)
+            self.isOver = True
+            return [(x, y)]
+        return self.flood(x, y)
+
+    def flood(self, x, y):
+        self.pending.append((x, y))
+        return self.spread()
+
+    def spread(self):
+        # 按全局坐标连锁翻开，可以跨过区块的边界。每次取到区块以后马上改，
+        # 取邻居时它可能已经被换出去了。一次最多翻开MaxCascade格
+        changed = []
+        stack = self.pending
+        while stack and len(changed) < EndlessField.MaxCascade:
+            x, y = stack.pop()
+            chunk, i = self.locate(x, y)
+            if chunk.revealed[i] or chunk.mines[i]:
+                continue
+            if chunk.flagged[i]:
+                # 空格子旁边不会有雷，插错的旗子拿掉
+                chunk.flagged[i] = 0
+                self.numFlags -= 1
+            chunk.revealed[i] = 1
+            chunk.touched = True
+            self.numRevealed += 1
+            changed.append((x, y))
+            if not chunk.counts[i]:
+                stack.extend((x + dx, y + dy) for dx, dy in Around)
+        return changed
+
+    def chord(self, x, y):
+        if self.isOver:
+            return []
+        chunk, i = self.locate(x, y)
+        count = chunk.counts[i]
+        if not chunk.revealed[i] or not count:
+            return []
+        flags = 0
+        for dx, dy in Around:
+            other, j = self.locate(x + dx, y + dy)
+            flags += other.flagged[j]
+        if flags != count:
+            return []
+        changed = []
+        for dx, dy in Around:
+            changed.extend(self.reveal(x + dx, y + dy))
+        return changed
+
+    def toggleFlag(self, x, y):
+        if self.isOver:
+            return []
+        chunk, i = self.locate(x, y)
+        if chunk.revealed[i]:
+            return []
+        chunk.flagged[i] ^= 1
+        chunk.touched = True
+        self.numFlags += 1 if chunk.flagged[i] else -1
+        return [(x, y)]
+
+    def stats(self):
+        size = EndlessField.ChunkSize * EndlessField.ChunkSize
+        return {
+            'loaded': len(self.chunks),
+            'generated': self.generated,
+            'evicted': self.evicted,
+            'spilled': self.spilled,
+            'restored': self.restored,
+            # 内存里的区块每格4个字节，只有雷的区块每格1个字节
+            'memory': len(self.chunks) * size * 4 +
+                len(self.mineCache) * size,
+            'diskBytes': self.store.bytes,
+        }
+
+    def summary(self):
+        return 'revealed=%d flags=%d %s' % (
+            self.numRevealed, self.numFlags,
+            'lost' if self.isOver else 'playing')
+
+    def close(self):
+        self.store.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Endless minesweeper walk')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--density', type=float, default=0.18)
+    parser.add_argument('--steps', type=int, default=2000,
+                        help='how many chunks to walk to the right')
+    args = parser.parse_args()
+
+    # 一直往右走，每走一个区块就在视野里翻开几个安全的格子，
+    # 看内存里的区块数是不是一直不变
+    field = EndlessField(args.seed, args.density)
+    rng = random.Random(args.seed)
+    size = EndlessField.ChunkSize
+    begin = time.perf_counter()
+    revealed = 0
+    for step in range(args.steps):
+        x0 = step * size
+        for cy in (-1, 0, 1):
+            field.chunk(step, cy)
+        for i in range(8):
+            x = x0 + rng.randrange(size)
+            y = rng.randrange(-size, size)
+            chunk, j = field.locate(x, y)
+            if not chunk.mines[j]:
+                revealed += len(field.reveal(x, y))
+                while field.pending:
+                    revealed += len(field.spread())
+            else:
+                field.toggleFlag(x, y)
+        if step % 500 == 0 or step == args.steps - 1:
+            stats = field.stats()
+            print('x=%8d loaded=%d memory=%.1f KB spilled=%d disk=%.1f KB' % (
+                x0, stats['loaded'], stats['memory'] / 1024.0,
+                stats['spilled'], stats['diskBytes'] / 1024.0))
+    elapsed = time.perf_counter() - begin
+
+    # 回到起点，翻开过的格子要从磁盘读回来
+    chunk = field.chunk(0, 0)
+    print('walked %d chunks in %.1fs, revealed %d cells' % (
+        args.steps, elapsed, revealed))
+    print('back at origin: restored=%d, revealed cells in chunk (0, 0): %d' % (
+        field.restored, sum(chunk.revealed)))
+    field.close()
@@ -0,0 +1,251 @@
+import random
+import time
+
+# 扫雷的规则，不依赖Qt。格子编号是 y * width + x，每种状态是一个bytearray
+# 平面，一格一个字节：mines是雷，counts是周围的雷数，revealed是翻开的，
+# flagged是插了旗的。雷在第一次翻开时才放，第一下和它周围一定没有雷
+
+# 预设的难度：(宽, 高, 雷数)
+Levels = {
+    'beginner': (8, 8, 10),
+    'intermediate': (16, 16, 40),
+    'expert': (30, 16, 99),
+}
+
+MaxSize = 1000
+
+
+def neighborCounts(mines, width, height):
+    # 把整个平面看成一个大整数，每格一个字节。左右、上下平移后加起来就是
+    # 周围的雷数，最多是8，不会进位到旁边的格子
+    size = width * height
+    plane = int.from_bytes(mines, 'little')
+    # 左右平移时去掉从上一行末尾移到下一行开头的格子
+    notFirst = int.from_bytes(bytes(([0] + [255] * (width - 1)) * height),
+                              'little')
+    notLast = int.from_bytes(bytes(([255] * (width - 1) + [0]) * height),
+                             'little')
+    row = plane + (plane << 8 & notFirst) + (plane >> 8 & notLast)
+    total = row + (row << 8 * width) + (row >> 8 * width) - plane
+    total &= (1 << 8 * size) - 1
+    return bytearray(total.to_bytes(size, 'little'))
+
+
+# 周围没有雷的空格子是1，其他是0
+_blankTable = bytes([1] + [0] * 255)
+
+
+class Field(object):
+
+    def __init__(self, width=8, height=8, numMines=10, seed=None):
+        if not 0 < numMines <= width * height - 9:
+            raise ValueError('too many mines for a %dx%d board' %
+                             (width, height))
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.numMines = numMines
+        self.random = random.Random(seed)
+        self.start()
+
+    def start(self):
+        size = self.size
+        self.mines = bytearray(size)
+        self.counts = bytearray(size)
+        self.revealed = bytearray(size)
+        self.flagged = bytearray(size)
+        # blank是周围没有雷的空格子；pending是还没有向四周翻开的空格子
+        self.blank = bytearray(size)
+        self.pending = bytearray(size)
+        self.isPlaced = False
+        self.isOver = False
+        self.isWon = False
+        # 踩到的雷
+        self.exploded = None
+        self.numRevealed = 0
+        self.numFlags = 0
+
+    def neighbors(self, cell):
+        width = self.width
+        x = cell % width
+        y = cell // width
+        for ny in range(max(0, y - 1), min(self.height, y + 2)):
+            for nx in range(max(0, x - 1), min(width, x + 2)):
+                if nx != x or ny != y:
+                    yield ny * width + nx
+
+    def placeMines(self, safe):
+        # safe和它周围的格子不放雷
+        excluded = set(self.neighbors(safe))
+        excluded.add(safe)
+        count = min(self.size, self.numMines + len(excluded))
+        cells = [cell for cell in self.random.sample(range(self.size), count)
+                 if cell not in excluded][:self.numMines]
+        self.setMines(cells)
+
+    def setMines(self, cells):
+        # 用给定的雷重新开始，测试和生成固定的局面时用
+        self.start()
+        for cell in cells:
+            self.mines[cell] = 1
+        self.numMines = len(cells)
+        self.counts = neighborCounts(self.mines, self.width, self.height)
+        # 雷的计数加上16，这样只有不是雷的0才会变成空格子
+        key = (int.from_bytes(self.counts, 'little') +
+               (int.from_bytes(self.mines, 'little') << 4))
+        self.blank = bytearray(key.to_bytes(self.size, 'little')
+                               .translate(_blankTable))
+        self.pending = bytearray(self.blank)
+        self.isPlaced = True
+
+    def reveal(self, cell):
+        # 翻开一格，返回翻开了的格子；踩到雷时游戏结束
+        if self.isOver or self.revealed[cell] or self.flagged[cell]:
+            return []
+        if not self.isPlaced:
+            self.placeMines(cell)
+
+        if self.mines[cell]:
+            self.revealed[cell] = 1
+            self.exploded = cell
+            self.isOver = True
+            return [cell]
+
+        if self.pending[cell]:
+            changed = self.flood(cell)
+        else:
+            self.revealed[cell] = 1
+            self.numRevealed += 1
+            changed = [cell]
+
+        if self.numRevealed == self.size - self.numMines:
+            self.isOver = True
+            self.isWon = True
+        return changed
+
+    def flood(self, seed):
+        # 从空格子开始按行连锁翻开，用栈代替递归。每次取一段连续的空格子，
+        # 这一段和上下两行挨着的格子都翻开，里面还没处理过的空格子再入栈。
+        # 整段用切片处理，大棋盘上一次翻开几十万格也很快
+        width = self.width
+        blank = self.blank
+        pending = self.pending
+        changed = []
+        stack = [seed]
+        while stack:
+            cell = stack.pop()
+            # 一段空格子总是整段处理，处理过的就跳过
+            if not pending[cell]:
+                continue
+            rowStart = cell - cell % width
+            rowEnd = rowStart + width
+            i = blank.rfind(0, rowStart, cell)
+            left = i + 1 if i >= 0 else rowStart
+            i = blank.find(0, cell, rowEnd)
+            right = i if i >= 0 else rowEnd
+            pending[left:right] = bytes(right - left)
+
+            left = max(rowStart, left - 1) - rowStart
+            right = min(rowEnd, right + 1) - rowStart
+            for row in (rowStart - width, rowStart, rowStart + width):
+                if 0 <= row < self.size:
+                    self.openSpan(row + left, row + right, stack, changed)
+        return changed
+
+    def openSpan(self, begin, end, stack, changed):
+        # 翻开 [begin, end) 的格子，还没处理过的空格子每段入栈一个
+        pending = self.pending
+        i = pending.find(1, begin, end)
+        while i >= 0:
+            stack.append(i)
+            i = pending.find(0, i, end)
+            if i < 0:
+                break
+            i = pending.find(1, i, end)
+
+        revealed = self.revealed
+        span = revealed[begin:end]
+        count = span.count(0)
+        if not count:
+            return
+        if count == end - begin:
+            changed.extend(range(begin, end))
+        else:
+            # 只取出还没翻开的几段
+            i = revealed.find(0, begin, end)
+            while i >= 0:
+                j = revealed.find(1, i, end)
+                if j < 0:
+                    j = end
+                changed.extend(range(i, j))
+                i = revealed.find(0, j, end)
+        revealed[begin:end] = b'\x01' * (end - begin)
+        self.numRevealed += count
+        # 空格子旁边不会有雷，插错的旗子拿掉
+        flags = self.flagged[begin:end].count(1)
+        if flags:
+            self.numFlags -= flags
+            self.flagged[begin:end] = bytes(end - begin)
+
+    def chord(self, cell):
+        # 翻开的数字周围插的旗子和数字一样多时，翻开周围其他的格子
+        if self.isOver or not self.revealed[cell] or not self.counts[cell]:
+            return []
+        around = list(self.neighbors(cell))
+        if sum(self.flagged[n] for n in around) != self.counts[cell]:
+            return []
+        changed = []
+        for n in around:
+            changed.extend(self.reveal(n))
+        return changed
+
+    def toggleFlag(self, cell):
+        if self.isOver or self.revealed[cell]:
+            return []
+        self.flagged[cell] ^= 1
+        self.numFlags += 1 if self.flagged[cell] else -1
+        return [cell]
+
+    def minesLeft(self):
+        return self.numMines - self.numFlags
+
+    def summary(self):
+        return 'revealed=%d/%d flags=%d %s' % (
+            self.numRevealed, self.size - self.numMines, self.numFlags,
+            'won' if self.isWon else 'lost' if self.isOver else 'playing')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Minesweeper cascade benchmark')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=MaxSize)
+    parser.add_argument('--height', type=int, default=MaxSize)
+    parser.add_argument('--mines', type=int, default=10000)
+    args = parser.parse_args()
+
+    field = Field(args.width, args.height, args.mines, args.seed)
+    begin = time.perf_counter()
+    changed = field.reveal(field.size // 2 + args.width // 2)
+    elapsed = time.perf_counter() - begin
+
+    print('board:   %dx%d, %d mines' % (args.width, args.height,
+                                        args.mines))
+    print('first reveal: %d cells in %.1f ms (mines placed on the click)' %
+          (len(changed), 1000 * elapsed))
+    # 接着随便点，统计每次翻开的时间
+    rng = random.Random(args.seed)
+    timings = []
+    while not field.isOver and len(timings) < 200:
+        cell = rng.randrange(field.size)
+        if field.mines[cell] or field.revealed[cell]:
+            continue
+        begin = time.perf_counter()
+        field.reveal(cell)
+        timings.append(time.perf_counter() - begin)
+    if timings:
+        print('later reveals: %d, mean %.3f ms, max %.1f ms' % (
+            len(timings), 1000 * sum(timings) / len(timings),
+            1000 * max(timings)))
+    print(field.summary())
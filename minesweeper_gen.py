@@ -0,0 +1,245 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from minesweeper_engine import Field, Levels
+
+# 不用猜的扫雷局面：随机放雷，从固定的起点开始让solver只用推理去解，
+# 解得出来才要。大棋盘要试很多次，所以放在后台进程里生成，每种大小预先
+# 准备几局，退出时存到文件里，下次启动直接用
+
+
+def startCell(width, height):
+    # 起点在中间，和Solver第一步点的格子一样
+    return height // 2 * width + width // 2
+
+
+def isNoGuess(field, first):
+    # 从first开始只用推理能不能翻开所有不是雷的格子。solver和进程池
+    # 用到时才导入，只读存档的时候不用等
+    import minesweeper_ai
+    solver = minesweeper_ai.Solver(field)
+    solver.update(field.reveal(first))
+    while not field.isOver:
+        guesses = solver.guesses
+        cell = solver.bestMove()
+        if solver.guesses != guesses or cell is None:
+            return False
+        solver.update(field.reveal(cell))
+    return field.isWon
+
+
+def generate(width, height, mines, seed=None, maxAttempts=0, timeout=None):
+    # 返回 (起点, 雷的格子, 试了几次)；maxAttempts次或者timeout秒内都不行
+    # 返回None。雷太密时可能永远生成不出来，不要两个都不给
+    rng = random.Random(seed)
+    first = startCell(width, height)
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    attempts = 0
+    while not maxAttempts or attempts < maxAttempts:
+        if deadline is not None and attempts and \
+                time.perf_counter() > deadline:
+            break
+        attempts += 1
+        field = Field(width, height, mines, rng.randrange(1 << 32))
+        field.placeMines(first)
+        layout = [cell for cell in range(field.size) if field.mines[cell]]
+        if isNoGuess(field, first):
+            return first, layout, attempts
+    return None
+
+
+def generateTask(task):
+    # 在进程池里运行，返回 (大小, 起点, 雷, 试了几次, 秒数)，
+    # 生成不出来时起点和雷都是None
+    key, seed, maxAttempts, timeout = task
+    begin = time.perf_counter()
+    board = generate(*key, seed=seed, maxAttempts=maxAttempts,
+                     timeout=timeout)
+    first, layout, attempts = board or (None, None, maxAttempts)
+    return key, first, layout, attempts, time.perf_counter() - begin
+
+
+class BoardPool(object):
+    # sizes里的每种大小保持Target个准备好的局面。take不会等，没有准备好
+    # 就返回None，同时在后台补上。别的大小不预先生成，第一次take以后在
+    # 后台准备CustomTarget个。存档在生成好的时候和close时写，take不写
+    Target = 3
+    CustomTarget = 1
+    # 再大的棋盘生成太慢，不预先生成
+    MaxCells = 100 * 100
+    # 后台生成一局最多试这么多次、这么多秒，不行就放弃，take返回None，
+    # 用随机的局面
+    MaxAttempts = 500
+    Timeout = 10.0
+    Version = 1
+
+    def __init__(self, path=None, processes=2, sizes=None):
+        self.path = path
+        self.processes = processes
+        self.pool = None
+        self.lock = threading.Lock()
+        self.saveLock = threading.Lock()
+        self.sizes = set(tuple(key) for key in sizes or ())
+        # (宽, 高, 雷数) -> deque([(起点, 雷), ...])
+        self.boards = {}
+        # 正在生成的个数
+        self.pending = {}
+        self.random = random.Random()
+        self.metrics = {}
+        self.load()
+        for key in self.sizes:
+            self.refill(key)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != BoardPool.Version:
+            return
+        for name, boards in data['boards'].items():
+            key = tuple(int(n) for n in name.split('x'))
+            self.boards[key] = deque((first, layout)
+                                     for first, layout in boards)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = {
+                'version': BoardPool.Version,
+                'boards': {'%dx%dx%d' % key: list(boards)
+                           for key, boards in self.boards.items()},
+            }
+        # 先写临时文件再改名，写到一半退出不会弄坏原来的文件。结果线程和
+        # close可能同时写，用另一把锁，写文件时take不用等
+        with self.saveLock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp = self.path + '.tmp'
+            with open(temp, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp, self.path)
+
+    def metric(self, key):
+        return self.metrics.setdefault(key, {
+            'boards': 0, 'attempts': 0, 'seconds': 0.0, 'maxSeconds': 0.0,
+            'hits': 0, 'misses': 0, 'failures': 0,
+        })
+
+    def take(self, key):
+        # 取一个准备好的局面 (起点, 雷)，没有就返回None
+        key = tuple(key)
+        with self.lock:
+            boards = self.boards.get(key)
+            board = boards.popleft() if boards else None
+            self.metric(key)['hits' if board else 'misses'] += 1
+        self.refill(key)
+        return board
+
+    def refill(self, key):
+        key = tuple(key)
+        width, height, mines = key
+        if width * height > BoardPool.MaxCells:
+            return
+        target = BoardPool.Target if key in self.sizes else \
+            BoardPool.CustomTarget
+        with self.lock:
+            ready = len(self.boards.get(key, ())) + self.pending.get(key, 0)
+            missing = target - ready
+            if missing <= 0:
+                return
+            self.pending[key] = self.pending.get(key, 0) + missing
+        if self.pool is None:
+            from multiprocessing import Pool
+            self.pool = Pool(self.processes)
+        for i in range(missing):
+            task = (key, self.random.randrange(1 << 32),
+                    BoardPool.MaxAttempts, BoardPool.Timeout)
+            self.pool.apply_async(
+                generateTask, (task,), callback=self.finished,
+                error_callback=lambda error, key=key: self.failed(key, error))
+
+    def finished(self, result):
+        # 在进程池的结果线程里调用，存档也在这里写，不占界面的时间
+        key, first, layout, attempts, seconds = result
+        with self.lock:
+            self.pending[key] -= 1
+            metric = self.metric(key)
+            if layout is None:
+                metric['failures'] += 1
+                return
+            self.boards.setdefault(key, deque()).append((first, layout))
+            self.record(metric, attempts, seconds)
+        self.save()
+
+    def failed(self, key, error):
+        # 进程里出了异常，不减掉pending的话这个大小再也不会补了
+        with self.lock:
+            self.pending[key] -= 1
+            self.metric(key)['failures'] += 1
+        print('generating a %dx%d/%d board failed: %r' % (key + (error,)),
+              file=sys.stderr)
+
+    def record(self, metric, attempts, seconds):
+        metric['boards'] += 1
+        metric['attempts'] += attempts
+        metric['seconds'] += seconds
+        metric['maxSeconds'] = max(metric['maxSeconds'], seconds)
+
+    def ready(self, key):
+        return len(self.boards.get(tuple(key), ()))
+
+    def report(self):
+        lines = []
+        for key, metric in sorted(self.metrics.items()):
+            boards = metric['boards']
+            lines.append(
+                '%dx%d/%d: ready=%d generated=%d attempts/board=%.1f '
+                'latency mean=%.2fs max=%.2fs taken=%d missed=%d '
+                'failed=%d' % (
+                    key + (self.ready(key), boards,
+                           metric['attempts'] / boards if boards else 0.0,
+                           metric['seconds'] / boards if boards else 0.0,
+                           metric['maxSeconds'], metric['hits'],
+                           metric['misses'], metric['failures'])))
+        return '\n'.join(lines)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        self.save()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='No-guess board generator')
+    parser.add_argument('-n', '--boards', type=int, default=10,
+                        help='boards per level')
+    parser.add_argument('-j', '--processes', type=int, default=4)
+    parser.add_argument('-l', '--level', default='all',
+                        choices=sorted(Levels) + ['all'])
+    parser.add_argument('-o', '--output', default=None,
+                        help='also save the boards to this pool file')
+    args = parser.parse_args()
+
+    names = sorted(Levels) if args.level == 'all' else [args.level]
+    BoardPool.Target = args.boards
+    begin = time.perf_counter()
+    pool = BoardPool(args.output, args.processes,
+                     sizes=[Levels[name] for name in names])
+    while any(pool.pending.get(Levels[name]) for name in names):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - begin
+    print(pool.report())
+    print('total: %.1fs with %d processes' % (elapsed, args.processes))
+    pool.close()
@@ -1,12 +1,18 @@
+import argparse
+import math
 import random
 import sys
-import random
+import time
 
-from PyQt5.QtCore import QBasicTimer, Qt, pyqtSignal
-from PyQt5.QtGui import QColor, QIcon, QPainter, QPen, QFont
+from PyQt5.QtCore import QBasicTimer, QRect, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QIcon, QPainter, QPen, QFont, QPixmap
 from PyQt5.QtWidgets import (QApplication, QDesktopWidget, QFrame, QHBoxLayout, QPushButton,
                              QLabel, QMainWindow, QVBoxLayout, QWidget, QGridLayout)
 
+import sprites
+from scheduler import Scheduler
+from engine_2048 import BitShape, Down, GridShape, Left, Right, Up
+
 
 class Game(QMainWindow):
 
@@ -20,6 +26,10 @@ class Game(QMainWindow):
         self.board = Board(self)
         self.header = QWidget(self)
         self.header.setStyleSheet("QWidget{background: 1px solid #ccc}")
+        # 显示提示和搜索的统计
+        self.status = QLabel(self.header)
+        self.status.setWordWrap(True)
+        QHBoxLayout(self.header).addWidget(self.status)
 
         self.vbox = QVBoxLayout(self.centralWidget)
         self.vbox.setContentsMargins(6, 6, 6, 6)
@@ -29,10 +39,21 @@ class Game(QMainWindow):
         self.vbox.setStretch(1, 4)
 
         self.setCentralWidget(self.centralWidget)
-        self.setFixedSize(400, 468)
+        # 4x4时每格100像素，大棋盘缩小格子
+        cell = min(100, Board.MaxSize // max(Board.BoardWidth,
+                                             Board.BoardHeight))
+        self.setFixedSize(cell * Board.BoardWidth,
+                          cell * Board.BoardHeight + 68)
         self.center()
         self.show()
 
+    def closeEvent(self, event):
+        self.board.scheduler.stop()
+        self.board.stopThinking()
+        # 关窗口时输出贴图缓存的命中次数，看缓存有没有起作用
+        print(sprites.cache.report())
+        super(Game, self).closeEvent(event)
+
     def center(self):
         screen = QDesktopWidget().screenGeometry()
         size = self.geometry()
@@ -43,6 +64,36 @@ class Game(QMainWindow):
 class Board(QFrame):
     BoardWidth = 4
     BoardHeight = 4
+    # 棋盘最多16x16，窗口里棋盘部分最大的像素数
+    MaxLength = 16
+    MaxSize = 800
+    colorTable = {
+        0: 0xcccccc,
+        2: 0xfccff0,
+        4: 0xCC6666,
+        8: 0x66CC66,
+        16: 0x06eC66,
+        32: 0xCCCC66,
+        64: 0xCC66CC,
+        128: 0x66CCCC,
+        256: 0xDAAA00,
+        512: 0x00CC66,
+        1024: 0x0000CC,
+        2048: 0x66CCCC,
+    }
+    keyMoves = {
+        Qt.Key_Left: Left,
+        Qt.Key_Right: Right,
+        Qt.Key_Up: Up,
+        Qt.Key_Down: Down,
+    }
+    # 自动玩和提示每一步最多想多少秒，以及多久检查一次是否想好了（毫秒）
+    ThinkTime = 0.1
+    PollInterval = 15
+    # 动画的帧率，滑动和新数字、合并弹出的时间（毫秒）
+    FrameRate = 60
+    SlideTime = 100
+    PopTime = 80
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -52,172 +103,349 @@ class Board(QFrame):
     def initBoard(self):
         self.setStyleSheet("QFrame{background: 1px solid #ecc}")
         self.setFocusPolicy(Qt.StrongFocus)
+        # H键提示，A键开关自动玩；solver在别的进程里搜索，界面不会卡住
+        self.solver = None
+        self.timer = QBasicTimer()
+        self.thinkingBoard = None
+        self.isAutoPlay = False
+        # 固定帧率的动画循环，只在有按键或者动画时运行。按键在下一帧处理，
+        # 动画没放完时来了新的一步就直接跳到这一步的动画，按键不会丢也不用等
+        self.scheduler = Scheduler(Board.FrameRate, self.frame, parent=self)
+        # (开始时间, 滑动的数字, 弹出的格子)，None表示没有动画
+        self.animation = None
+        # 空棋盘的贴图，每帧先贴上它，再画有数字的格子
+        self.background = None
+        self.benchMoves = 0
+        self.resetFrameStats()
         self.start()
 
     def start(self):
-        self.shape = Shape()
+        # 4x4的棋盘是一个64位整数，其他大小用GridShape，规则都在engine_2048里。
+        # 64位整数每格只有4位，4x4出现32768以后也换成GridShape
+        if (Board.BoardWidth, Board.BoardHeight) == (4, 4):
+            self.shape = BitShape()
+        else:
+            self.shape = GridShape(Board.BoardWidth, Board.BoardHeight)
+        self.animation = None
         self.newNumber()
+        self.update()
 
     def newNumber(self):
-        li = [(i, j) for j in range(4)
-              for i in range(4) if self.shape.coords[i][j] == 0]
-        if li:
-            num = random.choice(li)
-            self.shape.coords[num[0]][num[1]] = 2
-            return True
-        else:
-            return False
+        added = self.shape.newNumber(random)
+        if isinstance(self.shape, BitShape) and self.shape.isCapped():
+            self.shape = self.shape.toGrid()
+        return added
 
     def keyPressEvent(self, event):
 
         key = event.key()
 
-        self.shape.merged = False
-        self.shape.moveable = False
-
-        if key == Qt.Key_Left:
-            self.shape.moveLeft()
+        if key in Board.keyMoves:
+            self.scheduler.press(Board.keyMoves[key])
+            if not self.scheduler.isActive():
+                self.scheduler.start()
 
-        elif key == Qt.Key_Right:
-            self.shape.moveRight()
+        elif key == Qt.Key_H:
+            self.think()
 
-        elif key == Qt.Key_Up:
-            self.shape.moveUp()
+        elif key == Qt.Key_A:
+            self.isAutoPlay = not self.isAutoPlay
+            if self.isAutoPlay:
+                self.think()
 
-        elif key == Qt.Key_Down:
-            self.shape.moveDown()
+        elif key == Qt.Key_F:
+            self.showStatus(self.frameReport())
 
         else:
             super(Board, self).keyPressEvent(event)
 
-        def isGameOver():
-            for i in range(4):
-                if 0 in self.shape.coords[i]:
-                    return False
-            return True
+    def frame(self, inputs):
+        # 这一帧里的按键依次走完，只有最后一步放动画
+        for direct in inputs:
+            self.moveTiles(direct)
+        if self.animation is not None and self.animationTime() >= \
+                Board.SlideTime + Board.PopTime:
+            self.animation = None
+        if self.animation is None:
+            if self.benchMoves:
+                self.benchStep()
+            else:
+                self.scheduler.stop()
+        self.update()
+
+    def moveTiles(self, direct):
+        self.shape.merged = False
+        self.shape.moveable = False
+        coords = self.shape.coords
+        moves, merges = self.shape.slide(direct)
 
-        # 如果不能合并和移动，格子里没有0, 游戏结束
         if self.shape.merged or self.shape.moveable:
             self.newNumber()
+            # 滑动的是移动前的数字，之后合并出的格子和新数字弹出
+            tiles = [(fy, fx, ty, tx, coords[fy][fx])
+                     for fy, fx, ty, tx in moves]
+            pops = dict.fromkeys(merges, 'merge')
+            pops[self.shape.lastSpawn] = 'spawn'
+            self.animation = (time.monotonic(), tiles, pops)
+            self.lastPaint = None
+            if not self.scheduler.isActive():
+                self.scheduler.start()
             self.update()
 
-        elif isGameOver():
+        # 格子满了并且哪个方向都走不动，游戏结束
+        if self.shape.isGameOver():
             print('over')
 
+    def think(self):
+        # 搜索用64位整数的棋盘，只支持4x4、数字小于32768
+        if not isinstance(self.shape, BitShape):
+            self.isAutoPlay = False
+            self.showStatus('只有4x4并且数字小于32768的棋盘可以提示')
+            return
+        # 需要时才创建进程池
+        if self.solver is None:
+            import ai_2048
+            self.solver = ai_2048.Solver(Board.ThinkTime)
+        if self.thinkingBoard is not None:
+            return
+
+        self.thinkingBoard = self.shape.board
+        self.solver.searchAsync(self.shape.board)
+        self.timer.start(Board.PollInterval, self)
+
+    def stopThinking(self):
+        self.timer.stop()
+        self.isAutoPlay = False
+        if self.solver is not None:
+            self.solver.close()
+            self.solver = None
+        self.thinkingBoard = None
+
+    def timerEvent(self, event):
+        if event.timerId() != self.timer.timerId():
+            super(Board, self).timerEvent(event)
+            return
+        if not self.solver.ready():
+            return
+
+        self.timer.stop()
+        board = self.thinkingBoard
+        self.thinkingBoard = None
+        direct = self.solver.result()
+
+        # 想的时候玩家自己走了，结果作废
+        if not isinstance(self.shape, BitShape) or board != self.shape.board:
+            if self.isAutoPlay:
+                self.think()
+            return
+
+        if direct is None:
+            self.isAutoPlay = False
+            self.showStatus('没有可以走的方向')
+            return
+        self.showStatus('提示: %s  %s' % (
+            ('←', '→', '↑', '↓')[direct], self.solver.report()))
+        if self.isAutoPlay:
+            self.moveTiles(direct)
+            self.think()
+
+    def showStatus(self, text):
+        self.parent.status.setText(text)
+
     def squareWidth(self):
         return self.contentsRect().width() / Board.BoardWidth
 
     def squareHeight(self):
         return self.contentsRect().height() / Board.BoardHeight
 
+    def resizeEvent(self, event):
+        sprites.cache.invalidate('2048')
+        self.background = None
+        super(Board, self).resizeEvent(event)
+
+    def animationTime(self):
+        # 动画开始了多少毫秒
+        return 1000 * (time.monotonic() - self.animation[0])
+
     def paintEvent(self, event):
+        begin = time.perf_counter()
+        if self.background is None:
+            self.background = self.renderBackground()
 
         painter = QPainter(self)
-
+        painter.drawPixmap(0, 0, self.background)
+        width = self.squareWidth()
+        height = self.squareHeight()
+
+        elapsed = self.animationTime() if self.animation else Board.SlideTime
+        if elapsed < Board.SlideTime:
+            # 移动前的数字从原来的位置滑到新位置，先快后慢
+            t = 1 - (1 - elapsed / Board.SlideTime) ** 2
+            for fy, fx, ty, tx, shape in self.animation[1]:
+                self.drawSquare(painter, (fx + (tx - fx) * t) * width,
+                                (fy + (ty - fy) * t) * height, shape)
+        else:
+            pops = self.animation[2] if self.animation else {}
+            t = min(1.0, (elapsed - Board.SlideTime) / Board.PopTime)
+            coords = self.shape.coords
+            for i in range(Board.BoardHeight):
+                for j in range(Board.BoardWidth):
+                    shape = coords[i][j]
+                    if not shape:
+                        continue
+                    pop = pops.get((i, j))
+                    if pop is None:
+                        self.drawSquare(painter, j * width, i * height, shape)
+                        continue
+                    # 新数字从小变大，合并出的数字先变大一点再缩回去
+                    scale = t if pop == 'spawn' else \
+                        1 + 0.2 * math.sin(math.pi * t)
+                    self.drawSquare(painter, j * width, i * height, shape,
+                                    scale)
+        painter.end()
+
+        if self.animation is not None:
+            self.recordFrame(begin)
+
+    def renderBackground(self):
+        # 空格子只在大小改变时画一次
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        width = self.squareWidth()
+        height = self.squareHeight()
         for i in range(Board.BoardHeight):
             for j in range(Board.BoardWidth):
-                self.drawSquare(painter, j * self.squareWidth(),
-                                i * self.squareHeight(), self.shape.coords[i][j])
-
-    def drawSquare(self, painter, x, y, shape):
-        colorTable = {
-            0: 0xcccccc,
-            2: 0xfccff0,
-            4: 0xCC6666,
-            8: 0x66CC66,
-            16: 0x06eC66,
-            32: 0xCCCC66,
-            64: 0xCC66CC,
-            128: 0x66CCCC,
-            256: 0xDAAA00,
-            512: 0x00CC66,
-            1024: 0x0000CC,
-            2048: 0x66CCCC,
+                self.drawSquare(painter, j * width, i * height, 0)
+        painter.end()
+        return pixmap
+
+    def drawSquare(self, painter, x, y, shape, scale=1.0):
+        # 每种数字的格子只画一次，之后直接贴图；scale不是1时以格子中心缩放
+        sprite = sprites.cache.get('2048', shape, int(self.squareWidth()),
+                                   int(self.squareHeight()),
+                                   self.devicePixelRatioF(),
+                                   lambda painter, width, height:
+                                   self.renderSquare(painter, shape, width, height))
+        if scale == 1.0:
+            painter.drawPixmap(int(x), int(y), sprite)
+            return
+        width = self.squareWidth()
+        height = self.squareHeight()
+        painter.drawPixmap(QRect(int(x + width * (1 - scale) / 2),
+                                 int(y + height * (1 - scale) / 2),
+                                 int(width * scale), int(height * scale)),
+                           sprite)
+
+    def resetFrameStats(self):
+        self.frames = 0
+        self.paintTime = 0.0
+        self.maxPaint = 0.0
+        self.intervals = 0
+        self.intervalTime = 0.0
+        self.maxInterval = 0.0
+        # 两帧间隔超过1.5帧算掉帧
+        self.slowFrames = 0
+        self.lastPaint = None
+
+    def recordFrame(self, begin):
+        # 只统计动画期间的帧：每帧画了多久，以及和上一帧隔了多久
+        now = time.perf_counter()
+        paint = now - begin
+        self.frames += 1
+        self.paintTime += paint
+        self.maxPaint = max(self.maxPaint, paint)
+        if self.lastPaint is not None:
+            interval = begin - self.lastPaint
+            self.intervals += 1
+            self.intervalTime += interval
+            self.maxInterval = max(self.maxInterval, interval)
+            if interval > 1.5 / Board.FrameRate:
+                self.slowFrames += 1
+        self.lastPaint = begin
+
+    def frameStats(self):
+        # 时间都是毫秒
+        stats = self.scheduler.stats()
+        return {
+            'frames': self.frames,
+            'paintMean':
+                1000 * self.paintTime / self.frames if self.frames else 0.0,
+            'paintMax': 1000 * self.maxPaint,
+            'intervalMean': 1000 * self.intervalTime / self.intervals
+                if self.intervals else 0.0,
+            'intervalMax': 1000 * self.maxInterval,
+            'slowFrames': self.slowFrames,
+            'lateMax': stats['lateMax'],
+            'latencyMax': stats['latencyMax'],
         }
-        color = QColor(colorTable[shape])
+
+    def frameReport(self):
+        stats = self.frameStats()
+        return ('frames=%(frames)d paint mean=%(paintMean).2fms '
+                'max=%(paintMax).2fms interval mean=%(intervalMean).1fms '
+                'max=%(intervalMax).1fms slow=%(slowFrames)d '
+                'input latency max=%(latencyMax).1fms\n' % stats +
+                sprites.cache.report())
+
+    def benchmark(self, moves):
+        # 连续随机走moves步，每一步等动画放完，最后输出帧时间的统计
+        self.benchMoves = moves
+        self.resetFrameStats()
+        self.scheduler.start()
+
+    def benchStep(self):
+        if self.shape.isGameOver():
+            self.start()
+        self.moveTiles(random.randrange(4))
+        if self.animation is not None:
+            self.benchMoves -= 1
+            if not self.benchMoves:
+                print(self.frameReport())
+                QApplication.quit()
+
+    def renderSquare(self, painter, shape, width, height):
+        color = QColor(Board.colorTable[shape]) if shape in Board.colorTable \
+            else self.tileColor(shape)
 
         # 画出格子
-        painter.fillRect(x + 5, y + 5, self.squareWidth() - 10,
-                         self.squareHeight() - 10, color)
+        painter.fillRect(5, 5, width - 10, height - 10, color)
 
         # 画数字，0不用画
         if shape != 0:
             painter.setPen(color.lighter())
-            painter.setFont(QFont('Decorative', 20))
-            painter.drawText(x + 5, y-5,
-                             self.squareHeight(), self.squareWidth(), Qt.AlignCenter, str(shape))
+            # 数字位数多或者格子小时缩小字体
+            text = str(shape)
+            size = min(width, height) * 4 // (5 * max(4, len(text)))
+            painter.setFont(QFont('Decorative', max(6, min(20, size))))
+            painter.drawText(5, -5, height, width, Qt.AlignCenter, text)
 
-
-class Shape(object):
-
-    def __init__(self):
-        # i行j列，记录每个位置的数字
-        self.coords = [[0 for j in range(4)] for i in range(4)]
-        self.moveable = False
-        self.merged = False
-        self.score = 0
-
-    def moveLeft(self):
-        for i in range(len(self.coords)):
-            self.clearZero(i)
-            self.mergeLeft(i)
-            self.clearZero(i)
-
-    # 去除空的，后面加上零
-    def clearZero(self, x):
-        newList = [i for i in self.coords[x] if i != 0]
-        newList += [0 for i in range(4 - len(newList))]
-        if self.coords[x] != newList:
-            self.moveable = True  # 如果新的列表跟旧的不一样，那就是移动了
-        self.coords[x] = newList
-
-    def moveRight(self):
-        for i in range(len(self.coords)):
-            self.coords[i].reverse()
-            self.clearZero(i)
-            self.mergeLeft(i)
-            self.clearZero(i)  # 合并后会出现空元素，删除
-            self.coords[i].reverse()
-
-    def moveUp(self):
-        self.rotate()
-        for i in range(len(self.coords[0])):
-            self.clearZero(i)
-            self.mergeLeft(i)
-            self.clearZero(i)
-        self.rotate()
-
-    def moveDown(self):
-        self.rotate()
-        self.moveRight()
-        self.rotate()
-
-    def rotate(self):
-        # 反转矩阵
-        self.coords = [[self.coords[j][i] for j in range(
-            len(self.coords[0]))] for i in range(len(self.coords))]
-
-    def mergeLeft(self, x):
-        i = 0
-        j = 1
-        while i < len(self.coords[x]) and j < len(self.coords[x]):
-            if self.coords[x][i] != self.coords[x][j]:
-                i += 1
-                j += 1
-            elif not self.coords[x][i]:
-                break  # 等于零了就退出，不用合并了
-            else:
-                self.merged = True  # 有合并就标记，不生成新元素
-                self.coords[x][i] = self.coords[x][j] * 2
-                self.score += self.coords[x][i]
-                self.coords[x][j] = 0
-                i += 2
-                j += 2
+    def tileColor(self, shape):
+        # colorTable以外的数字按log2换色相
+        rank = shape.bit_length() - 1
+        return QColor.fromHsv(rank * 47 % 360, 160, 200)
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='2048')
+    parser.add_argument('--width', type=int, default=Board.BoardWidth)
+    parser.add_argument('--height', type=int, default=Board.BoardHeight)
+    parser.add_argument('--bench', type=int, default=0,
+                        help='play this many random animated moves, '
+                             'print frame stats and exit')
+    args = parser.parse_args()
+    if not 2 <= args.width <= Board.MaxLength or \
+            not 2 <= args.height <= Board.MaxLength:
+        parser.error('board size must be between 2 and %d' % Board.MaxLength)
+    Board.BoardWidth = args.width
+    Board.BoardHeight = args.height
+
     app = QApplication(sys.argv)
     app.setApplicationName('2048')
     game = Game()
+    if args.bench:
+        game.board.benchmark(args.bench)
     sys.exit(app.exec_())
@@ -0,0 +1,150 @@
+import struct
+import sys
+import time
+
+# 录像：记录随机种子和每一次操作发生在第几帧（tick），用来重现一局游戏
+#
+# 文件格式（小端）：
+#   头部  magic(4s) version(B) game(B) width(H) height(H) seed(Q) ticks(I) count(I)
+#   事件  tick增量(变长整数) + 操作(B)，重复count次
+
+Magic = b'RPLY'
+Version = 3
+Games = ('tetris', 'snake')
+Header = struct.Struct('<4sBBHHQII')
+
+
+class Replay(object):
+
+    def __init__(self, game, seed, width, height):
+        self.game = game
+        self.seed = seed
+        self.width = width
+        self.height = height
+        # 录像结束时的tick数
+        self.ticks = 0
+        self.events = []
+
+    def record(self, tick, key):
+        self.events.append((tick, key))
+
+    def finish(self, tick):
+        self.ticks = tick
+
+    def toBytes(self):
+        data = bytearray(Header.pack(Magic, Version, Games.index(self.game),
+                                     self.width, self.height, self.seed,
+                                     self.ticks, len(self.events)))
+        last = 0
+        for tick, key in self.events:
+            delta = tick - last
+            last = tick
+            # 变长整数，每个字节7位，最高位表示后面还有
+            while delta >= 0x80:
+                data.append(delta & 0x7F | 0x80)
+                delta >>= 7
+            data.append(delta)
+            data.append(key)
+        return bytes(data)
+
+    @staticmethod
+    def fromBytes(data):
+        magic, version, game, width, height, seed, ticks, count = \
+            Header.unpack_from(data)
+        if magic != Magic or version != Version:
+            raise ValueError('not a replay file')
+
+        replay = Replay(Games[game], seed, width, height)
+        replay.ticks = ticks
+
+        pos = Header.size
+        tick = 0
+        for i in range(count):
+            delta = 0
+            shift = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                delta |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            tick += delta
+            replay.events.append((tick, data[pos]))
+            pos += 1
+        return replay
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.toBytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return Replay.fromBytes(f.read())
+
+
+def newEngine(replay):
+    # 按录像里的游戏、大小和种子创建不依赖Qt的规则对象
+    if replay.game == 'tetris':
+        from tetris_engine import Engine
+    else:
+        from snake_engine import Engine
+    return Engine(replay.width, replay.height, replay.seed)
+
+
+def simulate(replay, engine=None):
+    # 不显示，全速重新运行一遍录像，返回结束时的engine
+    if engine is None:
+        engine = newEngine(replay)
+    engine.start()
+
+    events = replay.events
+    index = 0
+    for tick in range(replay.ticks + 1):
+        while index < len(events) and events[index][0] == tick:
+            engine.handleInput(events[index][1])
+            index += 1
+        if tick == replay.ticks or engine.isOver:
+            break
+        engine.step()
+    return engine
+
+
+def play(replay, rate=1.0):
+    # 用界面按指定倍速播放录像
+    if replay.game == 'tetris':
+        from tetris import Tetris as Window
+    else:
+        from snake import Snake as Window
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv)
+    window = Window()
+    window.tboard.startReplay(replay, rate)
+    return app.exec_()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay recorded games')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--play', action='store_true',
+                        help='render the first file instead of simulating')
+    parser.add_argument('--rate', type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.play:
+        sys.exit(play(Replay.load(args.files[0]), args.rate))
+
+    ticks = 0
+    begin = time.perf_counter()
+    for path in args.files:
+        replay = Replay.load(path)
+        engine = simulate(replay)
+        ticks += replay.ticks
+        print('%s: %s %s' % (path, replay.game, engine.summary()))
+    elapsed = time.perf_counter() - begin
+    print('%d replays, %d ticks in %.2fs (%.0f ticks/sec)' %
+          (len(args.files), ticks, elapsed, ticks / elapsed if elapsed else 0))
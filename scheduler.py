@@ -0,0 +1,166 @@
+import math
+import time
+
+from PyQt5.QtCore import QObject, Qt, QTimer
+
+# 固定步长的游戏循环：逻辑按固定的帧率运行，和重绘花多少时间无关。
+# 按键先放进缓冲区，在下一帧开始时统一处理；按住的键按DAS/ARR自动重复。
+
+
+class KeyRepeat(object):
+
+    def __init__(self, das, arr, keys):
+        # das: 按住多少帧后开始重复，arr: 之后每隔多少帧重复一次
+        self.das = das
+        self.arr = arr
+        self.keys = keys
+        self.held = {}
+
+    def press(self, key):
+        if key in self.keys:
+            self.held[key] = 0
+
+    def release(self, key):
+        self.held.pop(key, None)
+
+    def clear(self):
+        self.held.clear()
+
+    def poll(self):
+        # 每帧调用一次，返回这一帧应该重复的键
+        result = []
+        for key in self.held:
+            count = self.held[key] = self.held[key] + 1
+            if count < self.das:
+                continue
+            if self.arr <= 1 or (count - self.das) % self.arr == 0:
+                result.append(key)
+        return result
+
+
+class Scheduler(QObject):
+
+    # 落后太多时最多连续追赶的帧数，再多就放弃
+    MaxCatchUp = 5
+
+    def __init__(self, frameRate, callback, das=0, arr=0, repeatKeys=(),
+                 parent=None):
+        super(Scheduler, self).__init__(parent)
+        self.frameRate = frameRate
+        self.callback = callback
+        self.rate = 1.0
+        self.repeat = KeyRepeat(self.frames(das), self.frames(arr),
+                                frozenset(repeatKeys))
+        self.pending = []
+        self.running = False
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run)
+
+        self.resetStats()
+
+    def frames(self, ms):
+        return int(round(ms * self.frameRate / 1000.0))
+
+    def step(self):
+        # 每帧的实际时长，回放时按倍速缩短
+        return 1.0 / (self.frameRate * self.rate)
+
+    def setRate(self, rate):
+        self.rate = rate
+        if self.isActive():
+            self.start()
+
+    def start(self):
+        # 用绝对时间计算每一帧的截止时间，定时器的误差不会累积
+        self.base = time.monotonic()
+        self.count = 0
+        self.running = True
+        self.schedule()
+
+    def stop(self):
+        self.running = False
+        self.timer.stop()
+        self.pending = []
+        self.repeat.clear()
+
+    def isActive(self):
+        return self.running
+
+    def press(self, key):
+        self.pending.append((key, time.monotonic()))
+        self.repeat.press(key)
+
+    def release(self, key):
+        self.repeat.release(key)
+
+    def deadline(self):
+        return self.base + (self.count + 1) * self.step()
+
+    def schedule(self):
+        delay = self.deadline() - time.monotonic()
+        # 向上取整，宁可晚一点也不要提前醒来空转
+        self.timer.start(max(0, int(math.ceil(delay * 1000))))
+
+    def run(self):
+        now = time.monotonic()
+        ran = 0
+        while now >= self.deadline():
+            if ran == self.MaxCatchUp:
+                # 放弃追赶，从现在重新计时
+                self.skipped += 1
+                self.base = now
+                self.count = 0
+                break
+
+            self.late += now - self.deadline()
+            self.maxLate = max(self.maxLate, now - self.deadline())
+            self.count += 1
+            self.ticks += 1
+            ran += 1
+            self.tick(now)
+
+            # 回调里可能停止了游戏
+            if not self.running:
+                return
+            now = time.monotonic()
+
+        self.schedule()
+
+    def tick(self, now):
+        inputs = [key for key, pressed in self.pending]
+        for key, pressed in self.pending:
+            latency = now - pressed
+            self.latency += latency
+            self.maxLatency = max(self.maxLatency, latency)
+            self.inputs += 1
+        self.pending = []
+
+        inputs.extend(self.repeat.poll())
+        self.callback(inputs)
+
+    def resetStats(self):
+        self.base = None
+        self.count = 0
+        self.ticks = 0
+        self.skipped = 0
+        self.late = 0.0
+        self.maxLate = 0.0
+        self.inputs = 0
+        self.latency = 0.0
+        self.maxLatency = 0.0
+
+    def stats(self):
+        # 时间都是毫秒
+        return {
+            'ticks': self.ticks,
+            'skipped': self.skipped,
+            'lateMean': 1000 * self.late / self.ticks if self.ticks else 0.0,
+            'lateMax': 1000 * self.maxLate,
+            'inputs': self.inputs,
+            'latencyMean':
+                1000 * self.latency / self.inputs if self.inputs else 0.0,
+            'latencyMax': 1000 * self.maxLatency,
+        }
@@ -1,28 +1,33 @@
 from PyQt5.QtWidgets import (QMainWindow,QFrame, 
                              QDesktopWidget, QApplication)
-from PyQt5.QtCore import Qt, QBasicTimer
-from PyQt5.QtGui import QPainter, QColor
-from enum import Enum
-import sys, random
+from PyQt5.QtCore import Qt, QRect
+from PyQt5.QtGui import QPainter, QColor, QPixmap
+import argparse, os, sys, random, time
 
-class Direct(Enum):
-    Right = 1
-    Down = 2
-    Left = 3
-    Up = 4
+import sprites
+from replay import Replay
+from scheduler import Scheduler
+from snake_engine import Direct, Engine, FrameRate
 
 class Snake(QMainWindow):
 
-    def __init__(self):
+    def __init__(self, bots=0):
         super(Snake, self).__init__()
 
+        # bots大于0时是多条蛇的模式
+        self.bots = bots
         self.initUI()
 
 
     def initUI(self):
-        self.setFixedSize(400, 400)
+        # 棋盘放不下时窗口就是视野，可以随意调整大小
+        self.resize(400, 400)
 
-        self.tboard = Board(self)
+        if self.bots:
+            ArenaBoard.Bots = self.bots
+            self.tboard = ArenaBoard(self)
+        else:
+            self.tboard = Board(self)
 
         self.setCentralWidget(self.tboard)
 
@@ -31,6 +36,11 @@ class Snake(QMainWindow):
         self.show()
         self.tboard.start()
 
+    def closeEvent(self, event):
+        # 关窗口时输出贴图缓存的命中次数，看缓存有没有起作用
+        print(sprites.cache.report())
+        super(Snake, self).closeEvent(event)
+
 
     def center(self):
 
@@ -42,7 +52,21 @@ class Snake(QMainWindow):
 class Board(QFrame):
     BoardWidth = 20
     BoardHeight = 20
-    Speed = 350
+    # 格子最少的像素数，棋盘放不下时镜头跟着蛇头走；
+    # Margin是蛇头离视野边缘最近的格子数
+    MinCellSize = 12
+    Margin = 4
+    HeadColor = 0x33ff55
+    BodyColor = 0x336699
+    FoodColor = 0x001177
+    # 每条命结束后录像保存的目录，None表示不保存
+    ReplayDir = 'replays'
+    keyInputs = {
+        Qt.Key_Left: Direct.Left,
+        Qt.Key_Right: Direct.Right,
+        Qt.Key_Down: Direct.Down,
+        Qt.Key_Up: Direct.Up,
+    }
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -50,73 +74,128 @@ class Board(QFrame):
         self.initBoard()
 
     def initBoard(self):
-        self.timer = QBasicTimer()
+        # 固定帧率的游戏循环，按键在下一帧统一处理，速度在Engine.Speed里
+        self.scheduler = Scheduler(FrameRate, self.frame, parent=self)
         self.setFocusPolicy(Qt.StrongFocus)
+        # 游戏规则都在engine里，这里只负责定时、显示和按键
+        self.engine = Engine(Board.BoardWidth, Board.BoardHeight)
+        # 录像，ticks是运行过的帧数；replaying不为None时正在回放
+        self.replay = None
+        self.replaying = None
+        self.replayIndex = 0
+        self.ticks = 0
+        # 自动驾驶，按A键开关
+        self.isAutoPilot = False
+        self.pilot = None
+        # 视野的缓存：camera是视野左上角的格子，每走一步只重画变化的格子，
+        # 重画的时间和蛇的长度无关。canvas为None时整个视野重画
+        self.canvas = None
+        self.camera = (0, 0)
+        self.cell = 1
+        self.view = (1, 1)
+
+    @property
+    def board(self):
+        return self.engine.board
+
+    @property
+    def direct(self):
+        return self.engine.direct
+
+    @property
+    def food(self):
+        return self.engine.food
 
     def start(self):
-        self.board = [(Board.BoardWidth // 2, Board.BoardHeight // 2)]
-        self.direct = Direct.Left
+        # 每条命用新的种子，单独录像
+        if self.replaying is None:
+            seed = random.randrange(1 << 32)
+            self.engine = self.newEngine(seed)
+            self.replay = Replay('snake', seed, Board.BoardWidth,
+                                 Board.BoardHeight)
+        self.ticks = 0
         self.isPaused = False
-        self.timer.start(Board.Speed, self)
-        self.newFood()
-    
+        self.pilot = None
+        self.engine.start()
+        self.canvas = None
+        self.update()
+        self.scheduler.start()
+
+    def newEngine(self, seed):
+        return Engine(Board.BoardWidth, Board.BoardHeight, seed)
+
     def pause(self):
         self.isPaused = not self.isPaused
         if self.isPaused:
-            self.timer.stop()
+            self.scheduler.stop()
         else:
-            self.timer.start(Board.Speed, self)
+            self.scheduler.start()
         self.update()
 
     def tryMove(self):
-        if self.direct == Direct.Right:
-            x=self.board[0][0]+1
-            y=self.board[0][1]
-        
-        elif self.direct == Direct.Left:
-            x=self.board[0][0]-1
-            y=self.board[0][1]
-
-        elif self.direct == Direct.Down:
-            x=self.board[0][0]
-            y=self.board[0][1]+1
-
-        elif self.direct == Direct.Up:
-            x=self.board[0][0]
-            y=self.board[0][1]-1
-
-        if x < 0 or x >= self.BoardWidth or y < 0 or y >= self.BoardHeight:
-            self.timer.stop()
-            self.start()
+        # 转向和走一步都在engine.move里，每一步最多转一次向
+        head = self.board[0]
+        tail = self.board[-1]
+        food = self.food
+        if not self.engine.move():
+            self.gameOver()
             return False
 
-        if (x, y) in self.board:
-            self.timer.stop()
-            self.start()
-            return False
-
-        self.board.insert(0, (x,y))
-        
-        if not self.eatFood(x, y):
-            self.board.pop()
-        
-        self.update()
+        self.moved([head, tail, food, self.board[0], self.food])
 
         return True
 
-    def eatFood(self, x, y):
-        if self.food == (x, y):
-            self.newFood()
-            return True
-        else:
-            return False
+    def gameOver(self):
+        self.scheduler.stop()
+        if self.replaying is not None:
+            return
 
-    def newFood(self):
-        self.food = (random.randint(0, Board.BoardWidth-1),
-                     random.randint(0, Board.BoardHeight-1))
-        
-        if self.food in self.board:
-            self.newFood()
+        self.saveReplay()
+        self.start()
+
+    def handleInput(self, direct):
+        # 所有的操作都经过这里，方便录像
+        if self.isPaused:
+            return
+
+        if self.replaying is None:
+            self.replay.record(self.ticks, direct.value)
+
+        self.engine.handleInput(direct.value)
+
+    def saveReplay(self):
+        if Board.ReplayDir is None:
+            return
+
+        self.replay.finish(self.ticks)
+        os.makedirs(Board.ReplayDir, exist_ok=True)
+        name = 'snake-%s-%d.rpl' % (time.strftime('%Y%m%d-%H%M%S'),
+                                    self.replay.seed)
+        self.replay.save(os.path.join(Board.ReplayDir, name))
+
+    def startReplay(self, replay, rate=1.0):
+        # 用录像的种子重新开始，按录像里的操作代替键盘
+        self.scheduler.stop()
+        self.engine = Engine(replay.width, replay.height, replay.seed)
+        self.replaying = replay
+        self.replayIndex = 0
+        self.isAutoPilot = False
+        self.scheduler.setRate(rate)
+        self.start()
+
+    def feedReplay(self):
+        # 执行这个tick里录下的操作，录像放完返回False
+        events = self.replaying.events
+        while (not self.engine.isOver and
+               self.replayIndex < len(events) and
+               events[self.replayIndex][0] == self.ticks):
+            self.handleInput(Direct(events[self.replayIndex][1]))
+            self.replayIndex += 1
+
+        if self.engine.isOver or self.ticks >= self.replaying.ticks:
+            self.scheduler.stop()
+            return False
+        return True
 
     def keyPressEvent(self, event):
         key = event.key()
@@ -124,80 +203,278 @@ class Board(QFrame):
         if key == Qt.Key_P:
             self.pause()
 
-        elif key == Qt.Key_Left:
-            if self.direct != Direct.Left and self.direct != Direct.Right:
-                self.direct = Direct.Left
-                self.tryMove()
-
-        elif key == Qt.Key_Right:
-            if self.direct != Direct.Right and self.direct != Direct.Left:
-                self.direct = Direct.Right
-                self.tryMove()
+        elif self.replaying is not None:
+            # 回放时不响应其它按键
+            super(Board, self).keyPressEvent(event)
 
-        elif key == Qt.Key_Down:
-            if self.direct != Direct.Down and self.direct != Direct.Up:
-                self.direct = Direct.Down
-                self.tryMove()
+        elif key in Board.keyInputs:
+            if not event.isAutoRepeat():
+                self.scheduler.press(Board.keyInputs[key])
 
-        elif key == Qt.Key_Up:
-            if self.direct != Direct.Up and self.direct != Direct.Down:
-                self.direct = Direct.Up
-                self.tryMove()
+        elif key == Qt.Key_A:
+            self.isAutoPilot = not self.isAutoPilot
 
         else:
             super(Board, self).keyPressEvent(event)
 
+    def resizeEvent(self, event):
+        sprites.cache.invalidate('snake')
+        self.canvas = None
+        super(Board, self).resizeEvent(event)
+
     def paintEvent(self, event):
 
-        painter = QPainter(self)
+        if self.canvas is None:
+            self.resetView()
 
-        for i in range(len(self.board)):
-            x = self.board[i][0]
-            y = self.board[i][1]
-            if i == 0:
-                self.drawEllipse(painter,
-                            x * self.squareWidth(),
-                            y * self.squareHeight(),
-                            0x33ff55)
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.canvas)
+
+    def resetView(self):
+        # 大小或者游戏变了，重新计算格子大小和视野，画出整个视野
+        rect = self.contentsRect()
+        self.cell = max(Board.MinCellSize,
+                        min(rect.width() // self.engine.width,
+                            rect.height() // self.engine.height))
+        self.view = (min(self.engine.width, -(-rect.width() // self.cell)),
+                     min(self.engine.height, -(-rect.height() // self.cell)))
+        self.camera = self.follow((0, 0))
+
+        ratio = self.devicePixelRatioF()
+        width, height = self.view
+        self.canvas = QPixmap(int(width * self.cell * ratio),
+                              int(height * self.cell * ratio))
+        self.canvas.setDevicePixelRatio(ratio)
+        self.canvas.fill(Qt.transparent)
+        painter = QPainter(self.canvas)
+        self.drawCells(painter, 0, 0, width, height)
+        painter.end()
+
+    def follow(self, camera):
+        # 蛇头离视野边缘太近时移动镜头，不能移出棋盘
+        x, y = camera
+        hx, hy = self.board[0]
+        width, height = self.view
+        margin = min(Board.Margin, (width - 1) // 2)
+        x = min(max(x, hx + margin - width + 1), hx - margin)
+        x = min(max(x, 0), self.engine.width - width)
+        margin = min(Board.Margin, (height - 1) // 2)
+        y = min(max(y, hy + margin - height + 1), hy - margin)
+        y = min(max(y, 0), self.engine.height - height)
+        return x, y
+
+    def moved(self, cells):
+        # 走了一步，只重画变化过的格子：旧的和新的蛇头、尾巴、食物
+        if self.canvas is None:
+            self.update()
+            return
+
+        painter = QPainter(self.canvas)
+        scrolled = self.scroll(painter, self.follow(self.camera))
+        rects = []
+        for cell in cells:
+            if cell is None:
                 continue
-            self.drawSquare(painter,
-                            x * self.squareWidth(),
-                            y * self.squareHeight(),
-                            0x336699)
+            rect = self.drawCell(painter, cell)
+            if rect is not None:
+                rects.append(rect)
+        painter.end()
+
+        if scrolled:
+            self.update()
+            return
+        for rect in rects:
+            self.update(rect)
+
+    def scroll(self, painter, camera):
+        # 移动镜头：把已经画好的部分挪过去，只画新露出来的几行几列
+        dx = camera[0] - self.camera[0]
+        dy = camera[1] - self.camera[1]
+        if not dx and not dy:
+            return False
 
-        self.drawSquare(painter, 
-                        self.food[0] * self.squareWidth(),
-                        self.food[1] * self.squareHeight(),
-                        0x001177)
+        self.camera = camera
+        width, height = self.view
+        if abs(dx) >= width or abs(dy) >= height:
+            self.drawCells(painter, 0, 0, width, height)
+            return True
 
-    def timerEvent(self, event):
-        '''handles timer event'''
+        ratio = self.canvas.devicePixelRatio()
+        size = self.cell * ratio
+        self.canvas.scroll(int(-dx * size), int(-dy * size),
+                           self.canvas.rect())
+        if dx > 0:
+            self.drawCells(painter, width - dx, 0, width, height)
+        elif dx < 0:
+            self.drawCells(painter, 0, 0, -dx, height)
+        if dy > 0:
+            self.drawCells(painter, 0, height - dy, width, height)
+        elif dy < 0:
+            self.drawCells(painter, 0, 0, width, -dy)
+        return True
 
-        if event.timerId() == self.timer.timerId():
-            self.tryMove()
+    def drawCells(self, painter, left, top, right, bottom):
+        # 画视野里的一块，只检查这一块里的格子，和蛇的长度无关
+        cell = self.cell
+        cx, cy = self.camera
+
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(left * cell, top * cell, (right - left) * cell,
+                         (bottom - top) * cell, Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+
+        for y in range(top, bottom):
+            for x in range(left, right):
+                kind = self.cellKind((cx + x, cy + y))
+                if kind is not None:
+                    self.drawKind(painter, x * cell, y * cell, kind)
+
+    def cellKind(self, cell):
+        # 格子上画什么，和sprite的kind一样是 (形状, 颜色)，空格子返回None
+        x, y = cell
+        if self.engine.free.index[y * self.engine.width + x] < 0:
+            if cell == self.board[0]:
+                return 'ellipse', Board.HeadColor
+            return 'square', Board.BodyColor
+        if cell == self.food:
+            return 'square', Board.FoodColor
+        return None
+
+    def cellRect(self, cell):
+        # 格子在视野里的位置，不在视野里返回None
+        x = cell[0] - self.camera[0]
+        y = cell[1] - self.camera[1]
+        width, height = self.view
+        if x < 0 or x >= width or y < 0 or y >= height:
+            return None
+        return QRect(x * self.cell, y * self.cell, self.cell, self.cell)
+
+    def drawCell(self, painter, cell):
+        # 按格子现在的状态重画，不在视野里返回None
+        rect = self.cellRect(cell)
+        if rect is None:
+            return None
+
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(rect, Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        kind = self.cellKind(cell)
+        if kind is not None:
+            self.drawKind(painter, rect.x(), rect.y(), kind)
+        return rect
+
+    def drawKind(self, painter, x, y, kind):
+        if kind[0] == 'ellipse':
+            self.drawEllipse(painter, x, y, kind[1])
         else:
-            super(Board, self).timerEvent(event)
+            self.drawSquare(painter, x, y, kind[1])
+
+    def frame(self, inputs):
+        '''runs one fixed-length logic frame'''
 
-    def squareWidth(self):
-        return self.contentsRect().width() / Board.BoardWidth
+        if self.replaying is not None:
+            if not self.feedReplay():
+                return
+        elif self.isAutoPilot:
+            if self.engine.moveDue() and not self.engine.turns:
+                self.autoMove()
+        else:
+            for direct in inputs:
+                self.handleInput(direct)
 
+        self.ticks += 1
+        if self.engine.tick():
+            self.tryMove()
 
-    def squareHeight(self):
-        return self.contentsRect().height() / Board.BoardHeight
+    def autoMove(self):
+        # 和玩家一样通过转向操作，也会被录像记录下来
+        if self.pilot is None:
+            from snake_ai import AutoPilot
+            self.pilot = AutoPilot(self.engine.width, self.engine.height)
+        direct = self.pilot.nextDirect(self.engine)
+        if direct != self.direct:
+            self.handleInput(direct)
 
     def drawEllipse(self, painter, x, y, color):
+        painter.drawPixmap(int(x), int(y),
+                           self.sprite(('ellipse', color), self.renderEllipse))
+
+    def drawSquare(self, painter, x, y, color):
+        painter.drawPixmap(int(x), int(y),
+                           self.sprite(('square', color), self.renderSquare))
+
+    def sprite(self, kind, render):
+        # 同样颜色和大小的格子只画一次
+        return sprites.cache.get('snake', kind, self.cell, self.cell,
+                                 self.devicePixelRatioF(),
+                                 lambda painter, width, height:
+                                 render(painter, kind[1], width, height))
+
+    def renderEllipse(self, painter, color, width, height):
         color = QColor(color)
         painter.setBrush(color)
         painter.setPen(color)
-        painter.drawEllipse(x, y, self.squareWidth(), self.squareHeight())
+        painter.drawEllipse(0, 0, width - 1, height - 1)
 
-    def drawSquare(self, painter, x, y, color):
-        color = QColor(color)
-        painter.fillRect(x + 1, y + 1, self.squareWidth() - 2, 
-            self.squareHeight() - 2, color)
+    def renderSquare(self, painter, color, width, height):
+        painter.fillRect(1, 1, width - 2, height - 2, QColor(color))
+
+class ArenaBoard(Board):
+    # 多条蛇的模式：玩家和Bots条电脑控制的蛇在同一个棋盘上
+    Bots = 100
+    BotHeadColor = 0xffaa33
+    BotColor = 0x996633
+
+    def newEngine(self, seed):
+        from snake_arena import Arena
+        return Arena(Board.BoardWidth, Board.BoardHeight, ArenaBoard.Bots,
+                     seed=seed)
+
+    def tryMove(self):
+        # 所有蛇一起走一步，engine记下了变化过的格子
+        if not self.engine.move():
+            self.gameOver()
+            return False
+
+        self.moved(self.engine.changed)
+
+        return True
+
+    def saveReplay(self):
+        # 录像头里没有电脑蛇的数量，多条蛇的模式不保存录像
+        pass
+
+    def autoMove(self):
+        # 自动驾驶时玩家和电脑控制的蛇用一样的策略
+        self.engine.steer(self.engine.player)
+
+    def cellKind(self, cell):
+        x, y = cell
+        index = y * self.engine.width + x
+        owner = self.engine.owners[index]
+        if owner:
+            snake = self.engine.snakes[owner - 1]
+            isPlayer = snake is self.engine.player
+            if cell == snake.body[0]:
+                return 'ellipse', Board.HeadColor if isPlayer \
+                    else ArenaBoard.BotHeadColor
+            return 'square', Board.BodyColor if isPlayer \
+                else ArenaBoard.BotColor
+        if index in self.engine.foods:
+            return 'square', Board.FoodColor
+        return None
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Snake')
+    parser.add_argument('--width', type=int, default=Board.BoardWidth)
+    parser.add_argument('--height', type=int, default=Board.BoardHeight)
+    parser.add_argument('--bots', type=int, default=0,
+                        help='number of computer-controlled snakes')
+    args = parser.parse_args()
+    Board.BoardWidth = args.width
+    Board.BoardHeight = args.height
+
     app = QApplication([])
-    tetris = Snake()    
+    tetris = Snake(args.bots)    
     sys.exit(app.exec_())
@@ -0,0 +1,304 @@
+import time
+
+from snake_engine import Direct, Engine
+
+# 贪吃蛇自动驾驶：沿着一条哈密顿回路走，保证一定能把棋盘填满；
+# 在不会追上尾巴的前提下抄近路，近路按到食物的最短距离选择。
+
+Steps = (
+    (Direct.Right, 1, 0),
+    (Direct.Down, 0, 1),
+    (Direct.Left, -1, 0),
+    (Direct.Up, 0, -1),
+)
+
+_cycles = {}
+
+
+def hamiltonianCycle(width, height):
+    # 返回 (回路上依次经过的格子, 每个格子在回路上的序号)，按大小缓存。
+    # 格子编号是 y * width + x，不在回路上的格子序号为-1。
+    key = (width, height)
+    if key in _cycles:
+        return _cycles[key]
+
+    # 行数是偶数时才能构造，否则转置；两边都是奇数时没有哈密顿回路，
+    # 只能放弃最后一行
+    transpose = height % 2 == 1 and width % 2 == 0
+    w, h = (height, width) if transpose else (width, height)
+    if h % 2 == 1:
+        h -= 1
+
+    # 第0行从左往右，然后在第1列到最后一列之间蛇形往下，最后沿第0列回到起点
+    cells = [(x, 0) for x in range(w)]
+    for y in range(1, h):
+        xs = range(w - 1, 0, -1) if y % 2 == 1 else range(1, w)
+        cells.extend((x, y) for x in xs)
+    cells.extend((0, y) for y in range(h - 1, 0, -1))
+
+    if transpose:
+        cells = [(y, x) for x, y in cells]
+
+    cycle = [y * width + x for x, y in cells]
+    order = [-1] * (width * height)
+    for i, cell in enumerate(cycle):
+        order[cell] = i
+
+    _cycles[key] = (cycle, order)
+    return cycle, order
+
+
+class AutoPilot(object):
+    # 抄近路后和尾巴之间至少留出的格子，给吃到食物后变长留余地
+    Buffer = 4
+    # 每一步最多展开的格子数。大棋盘上的搜索分到很多步里做，
+    # 没搜到蛇头之前只沿着回路走
+    MaxNodes = 256
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cycle, self.order = hamiltonianCycle(width, height)
+        self.neighbors = [
+            tuple((y + dy) * width + x + dx for direct, dx, dy in Steps
+                  if 0 <= x + dx < width and 0 <= y + dy < height)
+            for y in range(height) for x in range(width)]
+        # 两边都是奇数时最后一行不在回路上，倒数第二行从右往左走，
+        # 食物在最后一行时从上面绕下去：下、左、上，正好回到回路的下一格
+        self.lastRow = height - 1 if width % 2 == 1 and height % 2 == 1 \
+            else None
+        # 到食物的距离，只在食物变化时重新计算；搜不到蛇头时等蛇走过
+        # 一个身长再搜。layer和nextLayer是还没搜完的两层。
+        # 距离存在预先分配的表里，stamps等于generation的格子才是这次搜到的，
+        # 重新搜索时不用清空，大棋盘上也不会有分配和释放大字典的停顿
+        self.food = None
+        self.distances = [0] * (width * height)
+        self.stamps = [0] * (width * height)
+        self.generation = 0
+        self.layer = []
+        self.nextLayer = []
+        self.dist = 0
+        self.isSearching = False
+        self.retry = 0
+        self.searches = 0
+        # 上次变长时走过的步数，太久没吃到食物说明绕不过去了
+        self.length = 0
+        self.lastMeal = 0
+
+    def startSearch(self, engine):
+        self.searches += 1
+        food = engine.food[1] * self.width + engine.food[0]
+        self.food = engine.food
+        self.generation += 1
+        self.stamps[food] = self.generation
+        self.distances[food] = 0
+        self.layer = [food]
+        self.nextLayer = []
+        self.dist = 0
+        self.isSearching = True
+        self.retry = 0
+
+    def search(self, engine, budget):
+        # 从食物开始一层一层地广度优先搜索，搜到蛇头就停下。最多展开budget
+        # 个格子，没搜完下一步接着搜；格子是否被占据按展开时的蛇判断
+        width = self.width
+        neighbors = self.neighbors
+        # 空格子表，小于0的格子被蛇占据
+        index = engine.free.index
+        head = engine.board[0]
+        head = head[1] * width + head[0]
+        distances = self.distances
+        stamps = self.stamps
+        generation = self.generation
+        layer = self.layer
+        nextLayer = self.nextLayer
+        dist = self.dist + 1
+        found = stamps[head] == generation
+        while layer and not found and budget > 0:
+            budget -= 1
+            for nextCell in neighbors[layer.pop()]:
+                if stamps[nextCell] == generation:
+                    continue
+                if nextCell == head:
+                    stamps[head] = generation
+                    distances[head] = dist
+                    found = True
+                elif index[nextCell] >= 0:
+                    stamps[nextCell] = generation
+                    distances[nextCell] = dist
+                    nextLayer.append(nextCell)
+            if not layer:
+                layer, nextLayer = nextLayer, []
+                dist += 1
+
+        self.layer = layer
+        self.nextLayer = nextLayer
+        self.dist = dist - 1
+        if found or not layer:
+            self.isSearching = False
+            self.retry = 0 if found else engine.numMoves + len(engine.board)
+
+    def headDistance(self, engine):
+        # 蛇头到食物的最短距离，没有路或者还没搜到时返回None。蛇头走出
+        # 搜过的范围时不重新搜，只沿着回路走，回来以后距离还能接着用
+        if engine.food is None:
+            return None
+        if engine.food != self.food or \
+                (self.retry and engine.numMoves >= self.retry):
+            self.startSearch(engine)
+        if self.isSearching:
+            self.search(engine, AutoPilot.MaxNodes)
+        hx, hy = engine.board[0]
+        return self.distance(hy * self.width + hx)
+
+    def distance(self, cell):
+        # 这次搜索里cell到食物的距离，没搜到时返回None
+        if self.stamps[cell] == self.generation:
+            return self.distances[cell]
+        return None
+
+    def nextDirect(self, engine):
+        width = self.width
+        size = len(self.cycle)
+        length = len(engine.board)
+        hx, hy = engine.board[0]
+        tx, ty = engine.board[-1]
+        headDist = self.headDistance(engine)
+
+        if length != self.length:
+            self.length = length
+            self.lastMeal = engine.numMoves
+        if length >= size or engine.numMoves - self.lastMeal > 2 * size:
+            # 只有两边都是奇数时才会比回路还长，或者最后一行的食物一直绕不下去，
+            # 这时回路已经走不通了，只能直接朝食物走，走到哪算哪
+            return self.choose(engine, None, 0, headDist)
+
+        if hy == self.lastRow:
+            # 正在最后一行绕路
+            return Direct.Left if engine.direct == Direct.Down else Direct.Up
+        # 蛇身在最后一行的每一格都让尾巴在回路上晚走一步
+        lag = 0
+        if self.lastRow is not None:
+            row = self.lastRow * width
+            lag = sum(1 for x in range(width) if row + x not in engine.free)
+        if ty == self.lastRow:
+            # 尾巴还在最后一行，按它上面那一格算
+            ty -= 1
+
+        headOrder = self.order[hy * width + hx]
+        tailOrder = self.order[ty * width + tx]
+
+        # 回路上从头往前到尾巴之间的格子都是空的，只要不越过尾巴就一定安全
+        tailDist = ((tailOrder - headOrder) % size or size) - lag
+        # 棋盘过半以后只沿着回路走
+        if length < size // 2:
+            limit = tailDist - AutoPilot.Buffer
+        else:
+            limit = 1
+
+        if engine.food is not None:
+            fx, fy = engine.food
+            if fy == self.lastRow:
+                # 食物在最后一行，先走到能绕下去的那一格
+                fx = min(fx + 1, width - 1)
+                fy -= 1
+                if (hx, hy) == (fx, fy) and self.canDetour(engine, tailDist):
+                    return Direct.Down
+            # 抄近路也不能越过食物，否则要绕一整圈才能回来
+            limit = min(limit, (self.order[fy * width + fx] - headOrder) % size)
+
+        return self.choose(engine, headOrder, limit, headDist)
+
+    def canDetour(self, engine, tailDist):
+        # 绕路经过的三个格子都要是空的
+        hx, hy = engine.board[0]
+        width = self.width
+        free = engine.free
+        return tailDist > 2 and \
+            (hy + 1) * width + hx in free and \
+            (hy + 1) * width + hx - 1 in free and \
+            hy * width + hx - 1 in free
+
+    def choose(self, engine, headOrder, limit, headDist):
+        # 在不越过尾巴和食物的格子里，优先走最短路上的下一格，
+        # 其次选回路上前进最多的；headOrder为None时不管回路
+        width = self.width
+        size = len(self.cycle)
+        hx, hy = engine.board[0]
+        best = None
+        for direct, dx, dy in Steps:
+            # 只有一节时掉头会被忽略
+            if direct != engine.direct and \
+                    direct.value % 2 == engine.direct.value % 2:
+                continue
+            x = hx + dx
+            y = hy + dy
+            if x < 0 or x >= width or y < 0 or y >= self.height:
+                continue
+            cell = y * width + x
+            if cell not in engine.free:
+                continue
+            if headOrder is None:
+                dist = 0
+            else:
+                if self.order[cell] < 0:
+                    continue
+                dist = (self.order[cell] - headOrder) % size
+                if dist != 1 and dist > limit:
+                    continue
+            if headDist is None:
+                closer = False
+            else:
+                foodDist = self.distance(cell)
+                closer = foodDist is not None and foodDist < headDist
+            key = (closer, dist)
+            if best is None or key > best[0]:
+                best = (key, direct)
+
+        if best is None:
+            return engine.direct
+        return best[1]
+
+
+def play(engine, pilot=None, maxMoves=0):
+    # 不显示，让自动驾驶一直玩到结束，返回每一步规划的耗时（秒）
+    pilot = pilot or AutoPilot(engine.width, engine.height)
+    timings = []
+    while not engine.isOver and engine.food is not None:
+        if maxMoves and engine.numMoves >= maxMoves:
+            break
+        begin = time.perf_counter()
+        direct = pilot.nextDirect(engine)
+        timings.append(time.perf_counter() - begin)
+        engine.turn(direct)
+        engine.tryMove()
+    return timings
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Snake autopilot benchmark')
+    parser.add_argument('--width', type=int, default=20)
+    parser.add_argument('--height', type=int, default=20)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--max-moves', type=int, default=0)
+    args = parser.parse_args()
+
+    engine = Engine(args.width, args.height, args.seed)
+    engine.start()
+    pilot = AutoPilot(args.width, args.height)
+    begin = time.perf_counter()
+    timings = play(engine, pilot, args.max_moves)
+    elapsed = time.perf_counter() - begin
+
+    timings.sort()
+    print('board:       %dx%d' % (args.width, args.height))
+    print('length:      %d / %d' % (len(engine.board),
+                                    args.width * args.height))
+    print('moves:       %d (%.0f moves/sec)' % (engine.numMoves,
+                                                engine.numMoves / elapsed))
+    print('searches:    %d' % pilot.searches)
+    print('plan mean:   %.3f ms' % (1000 * sum(timings) / len(timings)))
+    print('plan p99:    %.3f ms' % (1000 * timings[int(len(timings) * 0.99)]))
+    print('plan max:    %.3f ms' % (1000 * timings[-1]))
@@ -0,0 +1,299 @@
+import random
+import time
+from collections import deque
+
+from snake_engine import Direct, Engine, FrameRate
+
+# 多条蛇同时在一个棋盘上：玩家一条，其余是电脑控制的蛇。
+# 所有蛇共用一张占用表owners，碰撞只查表，每走一步的开销只和蛇的数量有关
+
+Steps = {
+    Direct.Right: (1, 0),
+    Direct.Down: (0, 1),
+    Direct.Left: (-1, 0),
+    Direct.Up: (0, -1),
+}
+
+
+class Rival(object):
+    # 场上的一条蛇，玩家也是一条Rival
+
+    def __init__(self, id):
+        self.id = id
+        # 蛇身，第一个是头
+        self.body = deque()
+        self.direct = Direct.Left
+        self.turns = deque()
+        self.isAlive = False
+        # 电脑控制的蛇正在去吃的食物
+        self.target = None
+
+
+class Arena(object):
+    # Speed和MaxTurns和单人游戏一样；Wander是电脑随机转向的概率
+    Speed = Engine.Speed
+    MaxTurns = Engine.MaxTurns
+    Wander = 0.05
+
+    def __init__(self, width=200, height=200, bots=100, foods=None,
+                 seed=None):
+        self.width = width
+        self.height = height
+        self.random = random.Random(seed)
+        self.numBots = bots
+        # 默认每条蛇一个食物
+        self.numFoods = foods or bots + 1
+        # 每个格子被哪条蛇占据，0表示空，否则是蛇的id + 1
+        self.owners = []
+        # 食物的格子列表和它们在列表里的位置，增删和随机取一个都是O(1)
+        self.foodCells = []
+        self.foods = {}
+        self.snakes = []
+        self.player = None
+        self.isOver = False
+        self.numMoves = 0
+        self.deaths = 0
+        self.speed = Arena.Speed
+        self.frames = 0
+        # 上一步变化过的格子，界面只重画这些
+        self.changed = []
+
+    @property
+    def board(self):
+        return self.player.body
+
+    @property
+    def direct(self):
+        return self.player.direct
+
+    @property
+    def turns(self):
+        return self.player.turns
+
+    def start(self):
+        self.owners = [0] * (self.width * self.height)
+        self.foodCells = []
+        self.foods = {}
+        self.snakes = [Rival(i) for i in range(self.numBots + 1)]
+        self.player = self.snakes[0]
+        self.isOver = False
+        self.numMoves = 0
+        self.deaths = 0
+        self.frames = 0
+        self.changed = []
+
+        # 玩家和单人游戏一样从中间出发
+        self.spawn(self.player, (self.width // 2, self.height // 2),
+                   Direct.Left)
+        for snake in self.snakes[1:]:
+            self.spawn(snake)
+        for i in range(self.numFoods):
+            self.newFood()
+
+    def randomCell(self):
+        # 随机取一个空格子，棋盘很空时几次就能取到；取不到返回None
+        for i in range(64):
+            x = self.random.randrange(self.width)
+            y = self.random.randrange(self.height)
+            cell = y * self.width + x
+            if not self.owners[cell] and cell not in self.foods:
+                return x, y
+        return None
+
+    def spawn(self, snake, head=None, direct=None):
+        head = head or self.randomCell()
+        if head is None:
+            return
+        snake.body = deque([head])
+        snake.direct = direct or self.random.choice(list(Direct))
+        snake.turns.clear()
+        snake.isAlive = True
+        snake.target = None
+        self.owners[head[1] * self.width + head[0]] = snake.id + 1
+        self.changed.append(head)
+
+    def newFood(self):
+        food = self.randomCell()
+        if food is None:
+            return
+        cell = food[1] * self.width + food[0]
+        self.foods[cell] = len(self.foodCells)
+        self.foodCells.append(cell)
+        self.changed.append(food)
+
+    def eatFood(self, cell):
+        # 用最后一个食物填到被吃掉的位置
+        i = self.foods.pop(cell)
+        last = self.foodCells.pop()
+        if last != cell:
+            self.foodCells[i] = last
+            self.foods[last] = i
+
+    def steer(self, snake):
+        # 电脑控制：在不会马上撞死的方向里选离目标食物更近的，偶尔随机转向
+        hx, hy = snake.body[0]
+        if snake.target not in self.foods and self.foodCells:
+            # 随便看几个食物，去最近的那个
+            snake.target = min(
+                (self.random.choice(self.foodCells) for i in range(4)),
+                key=lambda cell: abs(cell % self.width - hx) +
+                abs(cell // self.width - hy))
+        if snake.target is not None:
+            tx = snake.target % self.width
+            ty = snake.target // self.width
+        else:
+            tx, ty = hx, hy
+        wander = self.random.random() < Arena.Wander
+
+        best = None
+        for direct, (dx, dy) in Steps.items():
+            if direct.value % 2 == snake.direct.value % 2 and \
+                    direct != snake.direct:
+                continue
+            x = hx + dx
+            y = hy + dy
+            if x < 0 or x >= self.width or y < 0 or y >= self.height or \
+                    self.owners[y * self.width + x]:
+                continue
+            key = self.random.random() if wander else \
+                abs(tx - x) + abs(ty - y)
+            if best is None or key < best[0]:
+                best = (key, direct)
+        if best is not None:
+            snake.direct = best[1]
+
+    def tryMove(self):
+        # 所有的蛇同时走一步：撞墙、撞到任何蛇的身子（包括还没移走的尾巴）
+        # 或者两个蛇头撞在同一格都会死。玩家死了返回False
+        width = self.width
+        owners = self.owners
+        self.changed = []
+
+        heads = {}
+        dead = []
+        for snake in self.snakes:
+            if not snake.isAlive:
+                continue
+            if snake is not self.player:
+                self.steer(snake)
+            dx, dy = Steps[snake.direct]
+            x = snake.body[0][0] + dx
+            y = snake.body[0][1] + dy
+            if x < 0 or x >= width or y < 0 or y >= self.height or \
+                    owners[y * width + x]:
+                dead.append(snake)
+                continue
+            # 这一步的蛇头放进散列表，同一格有两个蛇头就是撞上了
+            heads.setdefault((x, y), []).append(snake)
+
+        moving = []
+        for head, group in heads.items():
+            if len(group) > 1:
+                dead.extend(group)
+            else:
+                moving.append((group[0], head))
+
+        for snake, (x, y) in moving:
+            cell = y * width + x
+            snake.body.appendleft((x, y))
+            owners[cell] = snake.id + 1
+            self.changed.append(snake.body[1])
+            self.changed.append((x, y))
+            if cell in self.foods:
+                self.eatFood(cell)
+                self.newFood()
+            else:
+                tx, ty = snake.body.pop()
+                owners[ty * width + tx] = 0
+                self.changed.append((tx, ty))
+
+        # 死掉的蛇从棋盘上拿走，电脑控制的蛇换个地方重新出生
+        for snake in dead:
+            snake.isAlive = False
+            for x, y in snake.body:
+                owners[y * width + x] = 0
+            self.changed.extend(snake.body)
+            self.deaths += 1
+        for snake in dead:
+            if snake is self.player:
+                self.isOver = True
+            else:
+                self.spawn(snake)
+
+        self.numMoves += 1
+        return not self.isOver
+
+    def turn(self, direct):
+        # 只能向左右转，不能掉头
+        if direct.value % 2 == self.player.direct.value % 2:
+            return False
+        self.player.direct = direct
+        return True
+
+    def move(self):
+        # 先用掉玩家一个缓存的转向，再让所有的蛇走一步
+        while self.player.turns:
+            if self.turn(self.player.turns.popleft()):
+                break
+        return self.tryMove()
+
+    def framesPerMove(self):
+        return max(1, int(round(self.speed * FrameRate / 1000.0)))
+
+    def moveDue(self):
+        # 下一帧蛇是否会走一步
+        return self.frames + 1 >= self.framesPerMove()
+
+    def tick(self):
+        # 走一帧，返回这一帧蛇是否应该走一步
+        self.frames += 1
+        if self.frames < self.framesPerMove():
+            return False
+        self.frames = 0
+        return True
+
+    def step(self):
+        if self.tick():
+            self.move()
+
+    def handleInput(self, key):
+        if len(self.player.turns) < Arena.MaxTurns:
+            self.player.turns.append(Direct(key))
+
+    def summary(self):
+        return 'length=%d moves=%d bots=%d deaths=%d' % (
+            len(self.player.body), self.numMoves, self.numBots, self.deaths)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Snake arena benchmark')
+    parser.add_argument('-b', '--bots', type=int, default=500)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--moves', type=int, default=2000)
+    parser.add_argument('--width', type=int, default=400)
+    parser.add_argument('--height', type=int, default=400)
+    args = parser.parse_args()
+
+    arena = Arena(args.width, args.height, args.bots, seed=args.seed)
+    arena.start()
+    # 玩家也交给电脑控制，死了就换下一局
+    timings = []
+    for i in range(args.moves):
+        begin = time.perf_counter()
+        arena.steer(arena.player)
+        if not arena.tryMove():
+            arena.start()
+        timings.append(time.perf_counter() - begin)
+
+    timings.sort()
+    length = sum(len(snake.body) for snake in arena.snakes)
+    print('board:       %dx%d, %d bots' % (args.width, args.height,
+                                           args.bots))
+    print('moves:       %d (%.0f moves/sec)' % (args.moves,
+                                                len(timings) / sum(timings)))
+    print('total body:  %d cells, %d deaths' % (length, arena.deaths))
+    print('move mean:   %.3f ms' % (1000 * sum(timings) / len(timings)))
+    print('move max:    %.3f ms (budget %d ms)' % (1000 * timings[-1],
+                                                   Arena.Speed))
@@ -0,0 +1,162 @@
+import time
+
+import numpy as np
+
+from snake_engine import Direct
+
+# 同时运行很多局贪吃蛇，规则和snake_engine.Engine一样，但所有局的每一步
+# 都用NumPy一次算完，用来训练和评估自动玩的程序
+
+# 每个方向的 (dx, dy)，下标是Direct的值，0表示不转向
+Deltas = np.array([(0, 0), (1, 0), (0, 1), (-1, 0), (0, -1)])
+
+# 观察里每个格子的值
+Empty = 0
+Body = 1
+Head = 2
+Food = 3
+
+# 从来没有被蛇头经过的格子
+Never = np.iinfo(np.int32).min // 2
+
+
+class BatchEngine(object):
+    # 蛇身不用列表保存：stamps记录每个格子最后一次被蛇头经过时是第几步，
+    # moves - stamps < lengths 的格子就是蛇身，尾巴不用一格一格地删
+
+    def __init__(self, games, width=20, height=20, seed=None, maxMoves=0):
+        self.games = games
+        self.width = width
+        self.height = height
+        self.size = width * height
+        # 超过这么多步还没结束的局算结束，0表示不限制
+        self.maxMoves = maxMoves
+        self.random = np.random.default_rng(seed)
+
+        self.index = np.arange(games)
+        self.stamps = np.empty((games, self.size), dtype=np.int32)
+        self.heads = np.empty(games, dtype=np.int64)
+        self.directs = np.empty(games, dtype=np.int64)
+        self.lengths = np.empty(games, dtype=np.int32)
+        self.moves = np.empty(games, dtype=np.int32)
+        # 格子编号是 y * width + x，-1表示棋盘满了没有食物
+        self.foods = np.empty(games, dtype=np.int64)
+        # 每一局上一次结束时的长度
+        self.finalLengths = np.zeros(games, dtype=np.int32)
+
+        self.reset()
+
+    def reset(self, games=None):
+        # 重新开始指定的局，默认全部
+        if games is None:
+            games = self.index
+        head = self.height // 2 * self.width + self.width // 2
+        self.stamps[games] = Never
+        self.stamps[games, head] = 0
+        self.heads[games] = head
+        self.directs[games] = Direct.Left.value
+        self.lengths[games] = 1
+        self.moves[games] = 0
+        self.newFood(games)
+        return self.observe()
+
+    def occupied(self, games, cells):
+        return self.moves[games] - self.stamps[games, cells] < \
+            self.lengths[games]
+
+    def newFood(self, games):
+        # 先随机取格子，取到蛇身的再取一次；快满的局很难随机到空格子，
+        # 几次以后直接从空格子里取
+        for i in range(4):
+            if not len(games):
+                return
+            cells = self.random.integers(0, self.size, len(games))
+            free = ~self.occupied(games, cells)
+            self.foods[games[free]] = cells[free]
+            games = games[~free]
+
+        for game in games:
+            free = np.flatnonzero(self.moves[game] - self.stamps[game] >=
+                                  self.lengths[game])
+            self.foods[game] = self.random.choice(free) if len(free) else -1
+
+    def step(self, actions):
+        # actions是每一局的Direct值，0表示不转向；不能掉头，掉头会被忽略。
+        # 返回 (观察, 奖励, 是否结束)，结束的局已经重新开始
+        actions = np.asarray(actions)
+        turn = (actions != 0) & (actions % 2 != self.directs % 2)
+        self.directs = np.where(turn, actions, self.directs)
+
+        width = self.width
+        delta = Deltas[self.directs]
+        x = self.heads % width + delta[:, 0]
+        y = self.heads // width + delta[:, 1]
+        wall = (x < 0) | (x >= width) | (y < 0) | (y >= self.height)
+        cells = np.where(wall, 0, y * width + x)
+
+        # 尾巴还没有移走，撞到尾巴也算撞到自己
+        over = wall | self.occupied(self.index, cells)
+        alive = ~over
+        ate = alive & (cells == self.foods)
+
+        games = self.index[alive]
+        cells = cells[alive]
+        self.moves[games] += 1
+        self.stamps[games, cells] = self.moves[games]
+        self.heads[games] = cells
+        self.lengths += ate
+
+        rewards = ate.astype(np.float32) - over
+        # 填满棋盘也算结束
+        full = self.lengths == self.size
+        dones = over | full
+        if self.maxMoves:
+            dones |= self.moves >= self.maxMoves
+        self.newFood(self.index[ate & ~full])
+
+        finished = self.index[dones]
+        self.finalLengths[finished] = self.lengths[finished]
+        self.reset(finished)
+        return self.observe(), rewards, dones
+
+    def observe(self):
+        # (局数, 高, 宽) 的int8数组，值是Empty、Body、Head、Food
+        grids = (self.moves[:, None] - self.stamps <
+                 self.lengths[:, None]).astype(np.int8)
+        grids[self.index, self.heads] = Head
+        games = self.index[self.foods >= 0]
+        grids[games, self.foods[games]] = Food
+        return grids.reshape(self.games, self.height, self.width)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Batched snake benchmark')
+    parser.add_argument('-n', '--games', type=int, default=4096)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--width', type=int, default=20)
+    parser.add_argument('--height', type=int, default=20)
+    parser.add_argument('--max-moves', type=int, default=0)
+    args = parser.parse_args()
+
+    engine = BatchEngine(args.games, args.width, args.height, args.seed,
+                         args.max_moves)
+    random = np.random.default_rng(args.seed)
+    finished = 0
+    lengths = 0
+    begin = time.perf_counter()
+    for i in range(args.steps):
+        # 随机转向，0表示直走
+        actions = random.integers(0, 5, args.games)
+        observations, rewards, dones = engine.step(actions)
+        finished += dones.sum()
+        lengths += engine.finalLengths[dones].sum()
+    elapsed = time.perf_counter() - begin
+
+    steps = args.games * args.steps
+    print('%d games x %d steps in %.2fs (%.0f steps/sec)' %
+          (args.games, args.steps, elapsed, steps / elapsed))
+    print('%d games finished, mean length %.2f' %
+          (finished, lengths / finished if finished else 0))
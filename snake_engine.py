@@ -0,0 +1,174 @@
+import random
+from collections import deque
+from enum import Enum
+
+# 贪吃蛇的规则，不依赖Qt
+
+# 逻辑每秒运行的帧数，录像里的tick就是帧
+FrameRate = 60
+
+
+class Direct(Enum):
+    Right = 1
+    Down = 2
+    Left = 3
+    Up = 4
+
+
+class FreeCells(object):
+    # 没有被蛇占据的格子，增删和随机取一个都是O(1)
+    # index同时是占用表：index[cell] < 0 表示格子被占据
+
+    def __init__(self, size):
+        self.cells = list(range(size))
+        self.index = list(range(size))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return self.index[cell] >= 0
+
+    def remove(self, cell):
+        # 用最后一个格子填到被删除的位置
+        i = self.index[cell]
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[i] = last
+            self.index[last] = i
+        self.index[cell] = -1
+
+    def add(self, cell):
+        self.index[cell] = len(self.cells)
+        self.cells.append(cell)
+
+    def choice(self, random):
+        return self.cells[random.randrange(len(self.cells))]
+
+
+class Engine(object):
+    # Speed是蛇每走一步的毫秒数，MaxTurns是最多缓存的转向次数
+    Speed = 350
+    MaxTurns = 3
+
+    def __init__(self, width=20, height=20, seed=None):
+        self.width = width
+        self.height = height
+        # 每局游戏有自己的随机数生成器，相同的种子得到相同的食物位置
+        self.random = random.Random(seed)
+        # 蛇身，第一个是头
+        self.board = deque()
+        self.free = FreeCells(width * height)
+        self.direct = Direct.Left
+        self.food = None
+        self.isOver = False
+        self.numMoves = 0
+        self.speed = Engine.Speed
+        self.frames = 0
+        # 还没执行的转向，每走一步用掉一个，快速按键不会多走
+        self.turns = deque()
+
+    def start(self):
+        head = (self.width // 2, self.height // 2)
+        self.board = deque([head])
+        self.free = FreeCells(self.width * self.height)
+        self.free.remove(head[1] * self.width + head[0])
+        self.direct = Direct.Left
+        self.isOver = False
+        self.numMoves = 0
+        self.frames = 0
+        self.turns.clear()
+        self.newFood()
+
+    def tryMove(self):
+        # 撞墙或者撞到自己返回False，游戏结束
+        if self.direct == Direct.Right:
+            x = self.board[0][0] + 1
+            y = self.board[0][1]
+
+        elif self.direct == Direct.Left:
+            x = self.board[0][0] - 1
+            y = self.board[0][1]
+
+        elif self.direct == Direct.Down:
+            x = self.board[0][0]
+            y = self.board[0][1] + 1
+
+        elif self.direct == Direct.Up:
+            x = self.board[0][0]
+            y = self.board[0][1] - 1
+
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            self.isOver = True
+            return False
+
+        # 尾巴还没有移走，撞到尾巴也算撞到自己
+        cell = y * self.width + x
+        if cell not in self.free:
+            self.isOver = True
+            return False
+
+        self.board.appendleft((x, y))
+        self.free.remove(cell)
+
+        if not self.eatFood(x, y):
+            x, y = self.board.pop()
+            self.free.add(y * self.width + x)
+
+        self.numMoves += 1
+        return True
+
+    def turn(self, direct):
+        # 只能向左右转，不能掉头
+        if direct.value % 2 == self.direct.value % 2:
+            return False
+        self.direct = direct
+        return True
+
+    def move(self):
+        # 先用掉一个缓存的转向，再走一步
+        while self.turns:
+            if self.turn(self.turns.popleft()):
+                break
+        return self.tryMove()
+
+    def eatFood(self, x, y):
+        if self.food == (x, y):
+            self.newFood()
+            return True
+        else:
+            return False
+
+    def newFood(self):
+        # 直接从空格子里随机取，蛇再长也不会变慢；没有空格子时没有食物
+        if not self.free:
+            self.food = None
+            return
+        cell = self.free.choice(self.random)
+        self.food = (cell % self.width, cell // self.width)
+
+    def framesPerMove(self):
+        return max(1, int(round(self.speed * FrameRate / 1000.0)))
+
+    def moveDue(self):
+        # 下一帧蛇是否会走一步
+        return self.frames + 1 >= self.framesPerMove()
+
+    def tick(self):
+        # 走一帧，返回这一帧蛇是否应该走一步
+        self.frames += 1
+        if self.frames < self.framesPerMove():
+            return False
+        self.frames = 0
+        return True
+
+    def step(self):
+        if self.tick():
+            self.move()
+
+    def handleInput(self, key):
+        if len(self.turns) < Engine.MaxTurns:
+            self.turns.append(Direct(key))
+
+    def summary(self):
+        return 'length=%d moves=%d' % (len(self.board), self.numMoves)
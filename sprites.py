@@ -0,0 +1,55 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPainter, QPixmap
+
+# 格子贴图缓存：每种(游戏, 格子类型, 大小, 设备像素比)只画一次，
+# 之后每个格子只需要一次drawPixmap。窗口大小改变时清掉对应游戏的缓存。
+
+
+class SpriteCache(object):
+
+    def __init__(self):
+        self.sprites = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, game, kind, width, height, ratio, render):
+        # render(painter, width, height) 负责画出一个格子
+        key = (game, kind, width, height, ratio)
+        pixmap = self.sprites.get(key)
+        if pixmap is not None:
+            self.hits += 1
+            return pixmap
+
+        self.misses += 1
+        pixmap = QPixmap(max(1, int(width * ratio)), max(1, int(height * ratio)))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        render(painter, width, height)
+        painter.end()
+
+        self.sprites[key] = pixmap
+        return pixmap
+
+    def invalidate(self, game):
+        for key in [key for key in self.sprites if key[0] == game]:
+            del self.sprites[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'sprites': len(self.sprites),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / total if total else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return 'sprites=%d hits=%d misses=%d hitRate=%.1f%%' % (
+            stats['sprites'], stats['hits'], stats['misses'],
+            100 * stats['hitRate'])
+
+
+# 所有游戏共用一个缓存
+cache = SpriteCache()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 游戏模块都在仓库根目录；界面测试不需要显示器
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
@@ -0,0 +1,25 @@
+import random
+import time
+
+from ai_2048 import Solver
+from engine_2048 import addTile, move
+
+
+def test_zero_budget_still_moves():
+    # 第一层也没搜完时按直接估值给出能走的方向
+    rng = random.Random(0)
+    board = addTile(addTile(0, rng), rng)
+    solver = Solver(0.0, processes=0)
+    begin = time.perf_counter()
+    direct = solver.bestMove(board)
+    assert time.perf_counter() - begin < 0.05
+    assert move(board, direct)[2]
+    assert solver.depth <= 1
+
+
+def test_deeper_with_more_time():
+    rng = random.Random(1)
+    board = addTile(addTile(0, rng), rng)
+    solver = Solver(1.0, processes=0)
+    assert move(board, solver.bestMove(board))[2]
+    assert solver.depth >= 2
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from engine_2048 import (BitShape, Down, GridShape, Left, Right, Shape, Up,
+                         fromCoords, move)
+
+
+def randomCoords(rng, width, height, maxRank=11):
+    # 一半是空格子，其余是2到2**maxRank，相邻的经常相同
+    return [[0 if rng.random() < 0.5 else 1 << rng.randint(1, maxRank)
+             for j in range(width)] for i in range(height)]
+
+
+def reference(coords, direct):
+    shape = Shape(len(coords[0]), len(coords))
+    shape.coords = [list(row) for row in coords]
+    (shape.moveLeft, shape.moveRight, shape.moveUp, shape.moveDown)[direct]()
+    return shape.coords, shape.score, shape.merged, shape.moveable
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_bitboard_matches_list_shape(seed):
+    rng = random.Random(seed)
+    for n in range(500):
+        coords = randomCoords(rng, 4, 4, rng.choice((3, 11, 14)))
+        direct = rng.randrange(4)
+        expected = reference(coords, direct)
+
+        bits = BitShape(fromCoords(coords))
+        bits.move(direct)
+        assert (bits.coords, bits.score, bits.merged, bits.moveable) == \
+            expected
+
+        board, score, flags = move(fromCoords(coords), direct)
+        assert board == bits.board and score == expected[1]
+        assert bool(flags) == (expected[2] or expected[3])
+
+
+@pytest.mark.parametrize('width, height', [(4, 4), (3, 5), (7, 6)])
+def test_grid_matches_list_shape(width, height):
+    rng = random.Random(width * height)
+    for n in range(500):
+        # GridShape的数字没有上限
+        coords = randomCoords(rng, width, height, rng.choice((3, 11, 20)))
+        direct = rng.randrange(4)
+        grid = GridShape(width, height)
+        grid.coords = coords
+        grid.move(direct)
+        assert (grid.coords, grid.score, grid.merged, grid.moveable) == \
+            reference(coords, direct)
+        assert grid.empty == sum(row.count(0) for row in grid.rows)
+
+
+def test_grid_spawns_on_empty_cells():
+    # 左右、上下移动以后放新数字都落在空格子上，lineEmpty一直对得上
+    rng = random.Random(5)
+    grid = GridShape(5, 3)
+    while grid.newNumber(rng):
+        i, j = grid.lastSpawn
+        assert grid.rows[i][j] == 1
+        grid.move(rng.choice((Left, Right, Up, Down)))
+        lines = zip(*grid.rows) if grid.byColumn else grid.rows
+        assert grid.lineEmpty == [line.count(0) for line in lines]
+    assert grid.isFull()
+
+
+def test_switch_to_grid_past_max_rank():
+    # 两个32768在64位整数里合并不了，换成GridShape以后可以
+    bits = BitShape(fromCoords([[32768, 32768, 0, 0]] + [[0] * 4] * 3))
+    bits.score = 100
+    assert bits.isCapped()
+    assert not BitShape(fromCoords([[16384] * 4] * 4)).isCapped()
+    grid = bits.toGrid()
+    grid.move(Left)
+    assert grid.coords[0] == [65536, 0, 0, 0]
+    assert grid.score == 100 + 65536
+
+
+def test_gui_switches_to_grid(monkeypatch):
+    # 界面上4x4合出32768以后换成GridShape，提示不再用64位整数
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtWidgets import QApplication
+    import pyqt_2048
+
+    monkeypatch.setattr(pyqt_2048.Game, 'center', lambda self: None)
+    app = QApplication.instance() or QApplication([])
+    window = pyqt_2048.Game()
+    board = window.findChild(pyqt_2048.Board)
+    board.shape = BitShape(fromCoords([[16384, 16384, 0, 0]] + [[0] * 4] * 3))
+    board.moveTiles(Left)
+    assert isinstance(board.shape, GridShape)
+    assert board.shape.coords[0][0] == 32768
+    board.think()
+    assert board.solver is None
+    window.close()
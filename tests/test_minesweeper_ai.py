@@ -0,0 +1,58 @@
+import itertools
+import random
+
+import pytest
+
+from minesweeper_ai import Solver
+from minesweeper_engine import Field
+
+
+def bruteForce(field):
+    # 枚举所有和翻开的数字一致的放法，返回每个没翻开的格子是雷的概率
+    hidden = [cell for cell in range(field.size) if not field.revealed[cell]]
+    numbers = [(cell, list(field.neighbors(cell))) for cell in range(field.size)
+               if field.revealed[cell]]
+    totals = dict.fromkeys(hidden, 0)
+    layouts = 0
+    for mines in itertools.combinations(hidden, field.numMines):
+        mines = set(mines)
+        if all(sum(n in mines for n in around) == field.counts[cell]
+               for cell, around in numbers):
+            layouts += 1
+            for cell in mines:
+                totals[cell] += 1
+    return {cell: count / layouts for cell, count in totals.items()}
+
+
+def solverProbabilities(solver):
+    probs, otherProb = solver.probabilities()
+    field = solver.field
+    result = {}
+    for cell in range(field.size):
+        if field.revealed[cell]:
+            continue
+        if cell in solver.known:
+            result[cell] = float(solver.known[cell])
+        else:
+            result[cell] = probs.get(cell, otherProb)
+    return result
+
+
+@pytest.mark.parametrize('width, height, mines', [(5, 4, 4), (6, 4, 5),
+                                                  (4, 4, 3), (7, 3, 6)])
+def test_probabilities_match_brute_force(width, height, mines):
+    # 每翻开一格都和暴力枚举比一次，直到赢
+    for seed in range(6):
+        rng = random.Random(seed)
+        field = Field(width, height, mines, seed)
+        solver = Solver(field)
+        solver.update(field.reveal(rng.randrange(field.size)))
+        while not field.isOver:
+            expected = bruteForce(field)
+            actual = solverProbabilities(solver)
+            assert actual.keys() == expected.keys()
+            for cell in expected:
+                assert actual[cell] == pytest.approx(expected[cell]), cell
+            safe = [cell for cell in expected if not field.mines[cell]]
+            solver.update(field.reveal(rng.choice(safe)))
+        assert field.isWon
@@ -0,0 +1,27 @@
+from minesweeper_endless import Around, EndlessField
+
+
+def test_cascade_resumes_where_it_stopped(monkeypatch):
+    # 一次翻不完的连锁翻开留在pending里，接着翻完和一次翻完的结果一样
+    whole = EndlessField(seed=3, density=0.15)
+    expected = set(whole.reveal(0, 0))
+    assert len(expected) > 40
+
+    monkeypatch.setattr(EndlessField, 'MaxCascade', 16)
+    field = EndlessField(seed=3, density=0.15)
+    cells = set(field.reveal(0, 0))
+    assert len(cells) == 16 and field.pending
+    while field.pending:
+        cells.update(field.spread())
+    assert cells == expected
+    assert field.numRevealed == len(expected)
+
+    # 翻完以后翻开的空格子周围都翻开了
+    for x, y in cells:
+        chunk, i = field.locate(x, y)
+        if not chunk.counts[i]:
+            for dx, dy in Around:
+                other, j = field.locate(x + dx, y + dy)
+                assert other.revealed[j]
+    whole.close()
+    field.close()
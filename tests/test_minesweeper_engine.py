@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from minesweeper_engine import Field
+
+
+def around(field, cell):
+    width = field.width
+    x = cell % width
+    y = cell // width
+    return [ny * width + nx
+            for ny in range(y - 1, y + 2) for nx in range(x - 1, x + 2)
+            if (nx, ny) != (x, y) and 0 <= nx < width and
+            0 <= ny < field.height]
+
+
+def expectedFlood(field, cell):
+    # 一格一格的广度优先：空格子把周围都翻开
+    seen = {cell}
+    queue = [cell]
+    for cell in queue:
+        if field.counts[cell]:
+            continue
+        for n in around(field, cell):
+            if n not in seen and not field.revealed[n]:
+                seen.add(n)
+                queue.append(n)
+    return seen
+
+
+def randomField(rng, width, height):
+    field = Field(width, height, rng.randint(1, width * height // 4))
+    cells = rng.sample(range(field.size), field.numMines)
+    field.setMines(cells)
+    return field
+
+
+@pytest.mark.parametrize('width, height', [(8, 8), (1, 12), (13, 1),
+                                           (30, 16), (7, 11)])
+def test_planes(width, height):
+    # 按字节平移算出来的雷数和空格子，和一格一格数的一样；
+    # 行首行尾不能串到旁边一行
+    rng = random.Random(width * 100 + height)
+    for n in range(20):
+        field = randomField(rng, width, height)
+        for cell in range(field.size):
+            count = sum(field.mines[i] for i in around(field, cell))
+            assert field.counts[cell] == count
+            assert field.blank[cell] == (not field.mines[cell] and not count)
+        assert field.pending == field.blank
+
+
+@pytest.mark.parametrize('width, height', [(8, 8), (1, 12), (30, 16),
+                                           (40, 25)])
+def test_flood_matches_bfs(width, height):
+    rng = random.Random(width * height)
+    for n in range(20):
+        field = randomField(rng, width, height)
+        # 插错的旗子会被连锁翻开拿掉
+        safe = [cell for cell in range(field.size) if not field.mines[cell]]
+        for cell in rng.sample(safe, min(3, len(safe))):
+            field.toggleFlag(cell)
+        while not field.isOver:
+            hidden = [cell for cell in safe if not field.revealed[cell]
+                      and not field.flagged[cell]]
+            if not hidden:
+                break
+            cell = rng.choice(hidden)
+            expected = expectedFlood(field, cell)
+            changed = field.reveal(cell)
+            assert sorted(changed) == sorted(expected)
+            assert field.numRevealed == sum(field.revealed)
+            assert field.numFlags == sum(field.flagged)
+            # 翻开了的空格子不会再留在pending里
+            assert all(field.pending[i] == (field.blank[i] and
+                                            not field.revealed[i])
+                       for i in range(field.size))
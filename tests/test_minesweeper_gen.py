@@ -0,0 +1,50 @@
+import time
+
+from minesweeper_engine import Field
+from minesweeper_gen import BoardPool, generate, isNoGuess
+
+
+def test_generate_is_no_guess():
+    first, layout, attempts = generate(9, 9, 10, seed=1)
+    field = Field(9, 9, 10)
+    field.setMines(layout)
+    assert isNoGuess(field, first)
+
+
+def test_generate_gives_up():
+    # 这么密的雷基本不可能不用猜，要在上限内返回
+    assert generate(9, 9, 45, seed=1, maxAttempts=20) is None
+    assert generate(9, 9, 45, seed=1, timeout=0.05) is None
+
+
+def test_take_never_generates_on_the_spot(tmp_path):
+    # 没准备好的大小马上返回None，在后台准备一局；存档不在take里写
+    path = str(tmp_path / 'boards.json')
+    pool = BoardPool(path)
+    begin = time.perf_counter()
+    assert pool.take((9, 9, 10)) is None
+    assert time.perf_counter() - begin < 0.1
+    assert pool.pending[(9, 9, 10)] == BoardPool.CustomTarget
+    deadline = time.perf_counter() + 30
+    while not pool.ready((9, 9, 10)) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert pool.take((9, 9, 10)) is not None
+    pool.close()
+
+    # close时存档，下次读回来的和关掉时一样
+    left = pool.ready((9, 9, 10))
+    pool = BoardPool(path)
+    assert pool.ready((9, 9, 10)) == left
+    pool.close()
+
+
+def test_worker_error_releases_pending():
+    # 雷太多Field会在进程里抛异常，pending要减回去，不然再也不会补
+    key = (8, 8, 60)
+    pool = BoardPool(sizes=[key])
+    deadline = time.perf_counter() + 30
+    while pool.pending[key] and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert pool.pending[key] == 0
+    assert pool.metrics[key]['failures'] == BoardPool.Target
+    pool.close()
@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from replay import Replay, simulate
+from snake_engine import Direct
+from tetris_engine import Input
+
+
+def cells(engine):
+    return [engine.shapeAt(j, i) for i in range(engine.height)
+            for j in range(engine.width)]
+
+
+def record(game, seed, keys, ticks, every=3):
+    # 每隔几帧随机按一个键
+    rng = random.Random(seed)
+    replay = Replay(game, seed, 10, 22)
+    for tick in range(0, ticks, every):
+        replay.record(tick, rng.choice(keys))
+    replay.finish(ticks)
+    return replay
+
+
+def test_round_trip():
+    replay = record('tetris', 7, list(range(5)), 5000)
+    # 间隔很大的事件要用多个字节的变长整数
+    replay.record(300000, 1)
+    replay.finish(300000)
+    loaded = Replay.fromBytes(replay.toBytes())
+    assert (loaded.game, loaded.seed, loaded.width, loaded.height,
+            loaded.ticks) == ('tetris', 7, 10, 22, 300000)
+    assert loaded.events == replay.events
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        Replay.fromBytes(b'XXXX' + bytes(40))
+
+
+@pytest.mark.parametrize('game, keys', [
+    ('tetris', [Input.Left, Input.Right, Input.Rotate, Input.Down,
+                Input.Drop]),
+    ('snake', [direct.value for direct in Direct]),
+])
+def test_simulate_is_deterministic(game, keys):
+    replay = record(game, 11, keys, 3000)
+    first = simulate(Replay.fromBytes(replay.toBytes()))
+    second = simulate(replay)
+    assert first.summary() == second.summary()
+    if game == 'tetris':
+        assert cells(first) == cells(second)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_gui_game_over_on_hard_drop_matches_simulate(monkeypatch, seed):
+    # 硬降让游戏结束的那一帧不能再下落，否则界面和录像重跑的结果不一样
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtWidgets import QApplication
+    import tetris
+
+    monkeypatch.setattr(tetris.Tetris, 'center', lambda self: None)
+    monkeypatch.setattr(tetris.Board, 'ReplayDir', None)
+    app = QApplication.instance() or QApplication([])
+    random.seed(seed)
+    window = tetris.Tetris()
+    board = window.tboard
+    board.scheduler.stop()
+    engine = board.engine
+    while board.isStarted:
+        # 只在这一帧本来就要下落时硬降
+        due = engine.frames + 1 >= engine.framesPerRow()
+        board.frame([Input.Drop] if due else [])
+    board.replay.finish(board.ticks)
+
+    replayed = simulate(Replay.fromBytes(board.replay.toBytes()))
+    assert replayed.isOver
+    assert replayed.numPieces == engine.numPieces
+    assert cells(replayed) == cells(engine)
+    window.close()
+
+
+@pytest.mark.parametrize('game', ['tetris', 'snake'])
+def test_replay_size_stays_on_its_board(monkeypatch, game):
+    # 回放别的大小的录像不能改掉Board类上的大小，之后新开的棋盘不受影响
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtWidgets import QApplication
+    module = __import__(game)
+    Window = module.Tetris if game == 'tetris' else module.Snake
+
+    monkeypatch.setattr(Window, 'center', lambda self: None)
+    monkeypatch.setattr(module.Board, 'ReplayDir', None)
+    app = QApplication.instance() or QApplication([])
+    size = (module.Board.BoardWidth, module.Board.BoardHeight)
+    window = Window()
+    replay = Replay(game, 5, 12, 30)
+    replay.finish(100)
+    window.tboard.startReplay(replay)
+    window.tboard.repaint()
+    engine = window.tboard.engine
+    assert (engine.width, engine.height) == (12, 30)
+    assert (module.Board.BoardWidth, module.Board.BoardHeight) == size
+    window.close()
+
+    other = Window()
+    engine = other.tboard.engine
+    assert (engine.width, engine.height) == size
+    other.close()
@@ -0,0 +1,32 @@
+import pytest
+
+from snake_ai import AutoPilot, play
+from snake_engine import Engine
+
+
+@pytest.mark.parametrize('width, height', [(8, 8), (6, 9), (10, 6)])
+def test_fills_the_board(width, height):
+    # 至少有一边是偶数时一定能填满
+    engine = Engine(width, height, 1)
+    engine.start()
+    play(engine)
+    assert not engine.isOver
+    assert len(engine.board) == width * height
+
+
+def test_search_is_spread_over_moves():
+    # 大棋盘上一步只展开MaxNodes个格子，搜到以后的距离和一次搜完的一样
+    engine = Engine(300, 300, 2)
+    engine.start()
+    pilot = AutoPilot(300, 300)
+    pilot.startSearch(engine)
+    pilot.search(engine, AutoPilot.MaxNodes)
+    assert pilot.isSearching
+    steps = 1
+    while pilot.isSearching:
+        pilot.search(engine, AutoPilot.MaxNodes)
+        steps += 1
+    hx, hy = engine.board[0]
+    fx, fy = engine.food
+    assert steps > 1
+    assert pilot.distance(hy * 300 + hx) == abs(hx - fx) + abs(hy - fy)
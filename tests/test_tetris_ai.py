@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+import tetris_ai
+from tetris_engine import Engine, Shape, Tetrominoe
+
+
+def walled(shape):
+    # 第2列一直堆到顶，左边两列很深但是方块过不去
+    engine = Engine(10, 22, 0)
+    engine.start()
+    for y in range(22):
+        engine.board.setShapeAt(2, y, Tetrominoe.ZShape)
+    for y in range(6, 22):
+        for x in range(3, 9):
+            engine.board.setShapeAt(x, y, Tetrominoe.SShape)
+    engine.curPiece = Shape.of(shape)
+    engine.curX = 5
+    engine.curY = -engine.curPiece.minY()
+    return engine
+
+
+@pytest.mark.parametrize('shape', range(1, 8))
+def test_only_reachable_placements(shape):
+    engine = walled(shape)
+    rotation, x = tetris_ai.bestMove(engine.board, shape,
+                                     start=tetris_ai.current(engine))
+    assert x > 2
+    tetris_ai.playMove(engine, rotation, x)
+    assert (engine.curPiece.rotation, engine.curX) == (rotation, x)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_autoplay_reaches_every_planned_move(seed):
+    engine = Engine(10, 22, seed)
+    engine.start()
+    for i in range(200):
+        if engine.isOver:
+            break
+        move = tetris_ai.bestMove(engine.board, engine.curPiece.pieceShape,
+                                  engine.nextShape, tetris_ai.current(engine))
+        if move is None:
+            break
+        tetris_ai.playMove(engine, *move)
+        assert (engine.curPiece.rotation, engine.curX) == move
+        engine.hardDrop()
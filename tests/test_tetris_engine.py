@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from tetris_engine import Engine, Input, Shape, Tetrominoe
+
+
+def fits(grid, piece, x, y):
+    height = len(grid)
+    width = len(grid[0])
+    return all(0 <= x + dx < width and 0 <= y + dy < height and
+               not grid[y + dy][x + dx] for dx, dy in piece.coords)
+
+
+def place(grid, piece, x, y):
+    # 用列表实现的落下和消行，和原来的tetris.Board一样
+    grid = [list(row) for row in grid]
+    for dx, dy in piece.coords:
+        grid[y + dy][x + dx] = piece.pieceShape
+    rows = [row for row in grid if not all(row)]
+    return [[0] * len(grid[0]) for i in range(len(grid) - len(rows))] + rows
+
+
+def colorGrid(engine):
+    return [[engine.shapeAt(j, i) for j in range(engine.width)]
+            for i in range(engine.height)]
+
+
+def test_rotations_match_the_original_formula():
+    for shape, coords in enumerate(Shape.coordsTable):
+        rotated = tuple(coords)
+        for rotation in range(4):
+            piece = Shape.of(shape, rotation)
+            assert piece.coords == rotated
+            xs = [x for x, y in rotated]
+            ys = [y for x, y in rotated]
+            assert (piece.minX(), piece.maxX(), piece.minY(),
+                    piece.maxY()) == (min(xs), max(xs), min(ys), max(ys))
+            assert piece.rotateRight() is Shape.of(shape, rotation + 1)
+            if shape != Tetrominoe.SquareShape:
+                rotated = tuple((-y, x) for x, y in rotated)
+
+
+def test_wall_kick():
+    # 竖着的长条贴着左墙，转成横的要向右踢两格
+    engine = Engine(10, 22, 0)
+    engine.start()
+    engine.curPiece = Shape.of(Tetrominoe.LineShape, 0)
+    engine.curX = 0
+    engine.curY = 5
+    assert engine.rotate()
+    assert (engine.curX, engine.curY) == (2, 5)
+    assert engine.curPiece.rotation == 1
+
+
+def test_ceiling_kick():
+    # 横着的长条在顶上，转成向上伸的竖条时左右踢都不行，只能下移一格
+    engine = Engine(10, 22, 0)
+    engine.start()
+    engine.curPiece = Shape.of(Tetrominoe.LineShape, 1)
+    engine.curX = 5
+    engine.curY = 1
+    assert engine.rotate()
+    assert (engine.curX, engine.curY) == (5, 2)
+    assert engine.curPiece.rotation == 2
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_engine_matches_list_board(seed):
+    rng = random.Random(seed)
+    engine = Engine(10, 22, seed)
+    engine.start()
+    grid = colorGrid(engine)
+    keys = [Input.Left, Input.Right, Input.Rotate, Input.Down, Input.Drop]
+    for i in range(3000):
+        if engine.isOver:
+            break
+        piece, x, y = engine.curPiece, engine.curX, engine.curY
+        pieces = engine.numPieces
+        landing = y
+        while fits(grid, piece, x, landing + 1):
+            landing += 1
+        assert engine.dropY() == landing
+
+        if rng.random() < 0.3:
+            engine.handleInput(rng.choice(keys))
+        else:
+            engine.step()
+
+        if engine.numPieces != pieces or engine.isOver:
+            # 方块落下了：落在直接往下掉的位置，再消掉满行
+            grid = place(grid, piece, x, landing)
+        assert colorGrid(engine) == grid
+
+        board = engine.board
+        for row, cells in zip(board.rows, grid):
+            assert row == sum(1 << j for j, shape in enumerate(cells) if shape)
+        assert board.tops == [
+            next((i for i in range(engine.height) if grid[i][j]),
+                 engine.height) for j in range(engine.width)]
+    assert engine.numPieces > 10
+
+
+def test_hard_drop_clears_lines():
+    # 下面两行只空着第0列，竖着的长条放进去消掉两行
+    engine = Engine(10, 22, 3)
+    engine.start()
+    for i in (19, 20, 21):
+        for j in range(1, 10):
+            engine.setShapeAt(j, i, Tetrominoe.ZShape)
+    engine.setShapeAt(0, 19, 0)
+    engine.setShapeAt(5, 19, 0)
+    grid = colorGrid(engine)
+    engine.curPiece = Shape.of(Tetrominoe.LineShape, 0)
+    engine.curX = 0
+    engine.curY = 1
+    assert engine.hardDrop() == 2
+    assert engine.numLinesRemoved == 2
+    assert colorGrid(engine) == place(grid, Shape.of(Tetrominoe.LineShape, 0),
+                                      0, 19)
+    assert engine.board.rows[21] == sum(1 << j for j in range(10) if j != 5)
@@ -1,11 +1,18 @@
+import os
 import random
 import sys
+import time
 
-from PyQt5.QtCore import QBasicTimer, Qt, pyqtSignal
-from PyQt5.QtGui import QColor, QIcon, QPainter
+from PyQt5.QtCore import QRect, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QIcon, QPainter, QPixmap
 from PyQt5.QtWidgets import (QApplication, QDesktopWidget, QFrame, QHBoxLayout,
                              QLabel, QMainWindow, QVBoxLayout, QWidget)
 
+import sprites
+from replay import Replay
+from scheduler import Scheduler
+from tetris_engine import Engine, FrameRate, Input, Shape, Tetrominoe
+
 
 class Tetris(QMainWindow):
 
@@ -38,6 +45,11 @@ class Tetris(QMainWindow):
 
         self.tboard.start()
 
+    def closeEvent(self, event):
+        # 关窗口时输出贴图缓存的命中次数，看缓存有没有起作用
+        print(sprites.cache.report())
+        super(Tetris, self).closeEvent(event)
+
     def center(self):
         screen = QDesktopWidget().screenGeometry()
         size = self.geometry()
@@ -47,10 +59,25 @@ class Tetris(QMainWindow):
 
 class Board(QFrame):
     # 这些是Board类的变量。BoardWidth和BoardHeight分别是board的宽度和高度。
-    # Speed是游戏的速度，每300ms出现一个新的方块。
+    # 下落速度在Engine.Speed里。按住左、右、下键DAS毫秒后开始自动重复，每ARR毫秒一次。
     BoardWidth = 10
     BoardHeight = 22
-    Speed = 300
+    DAS = 170
+    ARR = 50
+    # 每局结束后录像保存的目录，None表示不保存
+    ReplayDir = 'replays'
+    keyInputs = {
+        Qt.Key_Left: Input.Left,
+        Qt.Key_Right: Input.Right,
+        Qt.Key_Up: Input.Rotate,
+        Qt.Key_Down: Input.Down,
+        Qt.Key_Space: Input.Drop,
+    }
+    # 每种形状的颜色以及亮、暗边框颜色，只创建一次
+    colorTable = [(color, color.lighter(), color.darker())
+                  for color in map(QColor, [0x000000, 0xCC6666, 0x66CC66,
+                                            0x6666CC, 0xCCCC66, 0xCC66CC,
+                                            0x66CCCC, 0xDAAA00])]
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -58,27 +85,64 @@ class Board(QFrame):
         self.parent = parent
 
     def initBoard(self):
-        self.timer = QBasicTimer()
+        # 固定帧率的游戏循环，按键在下一帧统一处理
+        self.scheduler = Scheduler(FrameRate, self.frame, Board.DAS, Board.ARR,
+                                   (Input.Left, Input.Right, Input.Down), self)
         self.setStyleSheet("QFrame{border: 1px solid #ccc}")
         # 获得焦点，才能响应事件
         self.setFocusPolicy(Qt.StrongFocus)
-        self.board = [[0 for j in range(Board.BoardWidth)]
-                      for i in range(Board.BoardHeight)]
+        # 游戏规则都在engine里，这里只负责定时、显示和按键
+        seed = random.randrange(1 << 32)
+        self.engine = Engine(Board.BoardWidth, Board.BoardHeight, seed)
         self.isPaused = False
-        self.nextShape = random.randint(1, 7)
+        # 录像，ticks是运行过的帧数；replaying不为None时正在回放
+        self.replay = Replay('tetris', seed, Board.BoardWidth, Board.BoardHeight)
+        self.replaying = None
+        self.replayIndex = 0
+        self.ticks = 0
+        # 已经落下的方块画在缓存里，只有落下或消行时才重画
+        self.settled = None
+        # 自动玩，按A键开关，plannedPiece记录已经安排过的方块
+        self.isAutoPlay = False
+        self.plannedPiece = 0
+
+    @property
+    def board(self):
+        return self.engine.board
+
+    @property
+    def curPiece(self):
+        return self.engine.curPiece
+
+    @property
+    def curX(self):
+        return self.engine.curX
+
+    @property
+    def curY(self):
+        return self.engine.curY
+
+    @property
+    def nextShape(self):
+        return self.engine.nextShape
+
+    @property
+    def isStarted(self):
+        return self.engine.isStarted
+
+    @property
+    def numLinesRemoved(self):
+        return self.engine.numLinesRemoved
 
     def start(self):
         if self.isPaused:
             return
 
-        self.isStarted = True
-
-        self.numLinesRemoved = 0
-
         self.parent.slide.sinStatu.emit('游戏中...')
 
-        self.newPiece()
-        self.timer.start(Board.Speed, self)
+        self.engine.start()
+        self.pieceCreated()
+        self.scheduler.start()
 
     def pause(self):
 
@@ -88,167 +152,286 @@ class Board(QFrame):
         self.isPaused = not self.isPaused
 
         if self.isPaused:
-            self.timer.stop()
+            self.scheduler.stop()
             self.parent.slide.sinStatu.emit('暂停')
 
         else:
-            self.timer.start(Board.Speed, self)
+            self.scheduler.start()
             self.parent.slide.sinStatu.emit('游戏中...')
 
         self.update()
 
     def newPiece(self):
+        self.engine.newPiece()
+        self.pieceCreated()
 
-        self.curPiece = Shape()
-        self.curPiece.setShape(self.nextShape)
+    def pieceCreated(self):
 
-        # 生成下一个方块
-        self.nextShape = random.randint(1, 7)
+        # 已经落下的方块有变化，下次绘制时重建缓存
+        self.settled = None
 
         # 下一个方块在显示侧边栏
         self.parent.slide.sinShape.emit(self.nextShape)
 
-        # 设置方块的中心点位置
-        self.curX = Board.BoardWidth // 2
-        self.curY = 0 - self.curPiece.minY()
-
         # 如果不能生成新方块，游戏结束
-        if not self.tryMove(self.curPiece, self.curX, self.curY):
-
-            self.curPiece.setShape(Tetrominoe.NoShape)
-            self.timer.stop()
-            self.isStarted = False
+        if not self.isStarted:
+            self.scheduler.stop()
             self.parent.slide.sinStatu.emit('游戏结束')
+            self.saveReplay()
 
-    def tryMove(self, newPiece, newX, newY):
-        for i in range(4):
-            x = newX + newPiece.x(i)
-            y = newY + newPiece.y(i)
-            # 检测是否超出边界
-            if x < 0 or x >= Board.BoardWidth or y < 0 or y >= Board.BoardHeight:
-                return False
-            # 如果该位置有方块，不移动
-            if self.shapeAt(x, y) != Tetrominoe.NoShape:
-                return False
-
-        self.curPiece = newPiece
-        self.curX = newX
-        self.curY = newY
         self.update()
+
+    def tryMove(self, newPiece, newX, newY):
+        oldRect = self.pieceRect()
+        if not self.engine.tryMove(newPiece, newX, newY):
+            return False
+
+        self.updatePiece(oldRect)
+        return True
+
+    def rotate(self):
+        oldRect = self.pieceRect()
+        if not self.engine.rotate():
+            return False
+
+        self.updatePiece(oldRect)
         return True
 
+    def pieceRect(self):
+        # 正在下落的方块和它的影子占据的矩形区域
+        piece = self.curPiece
+        width = self.squareWidth()
+        height = self.squareHeight()
+        left = int((self.curX + piece.minX()) * width)
+        top = int((self.curY + piece.minY()) * height)
+        right = int((self.curX + piece.maxX() + 1) * width)
+        bottom = int((self.engine.dropY() + piece.maxY() + 1) * height)
+        # drawSquare会向右下多画一个像素
+        return QRect(left, top, right - left + 2, bottom - top + 2)
+
+    def updatePiece(self, oldRect):
+        # 只重画方块移动前后的位置
+        self.update(oldRect)
+        self.update(self.pieceRect())
+
+    def hardDrop(self):
+        if not self.isStarted or self.isPaused:
+            return
+
+        self.engine.tryMove(self.curPiece, self.curX, self.engine.dropY())
+        self.pieceDropped()
+
     def oneLineDown(self):
         if not self.tryMove(self.curPiece, self.curX, self.curY + 1):
             self.pieceDropped()
 
-    def timerEvent(self, event):
-        if event.timerId() == self.timer.timerId():
-            self.oneLineDown()
+    def frame(self, inputs):
+        # 每一帧先处理这一帧的按键，再按下落速度决定是否下落
+        if self.replaying is not None:
+            if not self.feedReplay():
+                return
         else:
-            super(Board, self).timerEvent(event)
+            if self.isAutoPlay and self.plannedPiece != self.engine.numPieces:
+                self.autoMove()
+            for key in inputs:
+                self.handleInput(key)
 
-    def pieceDropped(self):
-        # 将正在下落的加到已经落下的里
-        for i in range(4):
-            x = self.curX + self.curPiece.x(i)
-            y = self.curY + self.curPiece.y(i)
-            self.setShapeAt(x, y, self.curPiece.pieceShape)
-
-        self.removeFullLines()
+        # 硬降可能让游戏结束，这时不能再下落，和replay.simulate一样停在这一帧
+        if not self.isStarted:
+            return
 
-        self.newPiece()
+        self.ticks += 1
+        if self.engine.tick():
+            self.oneLineDown()
 
-    def removeFullLines(self):
+    def autoMove(self):
+        # 需要NumPy，只在自动玩时才导入
+        import tetris_ai
 
-        numFullLines = 0
-        rowsToRemove = []
-        for i in range(Board.BoardHeight):
-            isFullLine = True
-            for j in range(Board.BoardWidth):
-                if self.board[i][j] == Tetrominoe.NoShape:
-                    isFullLine = False
-            if isFullLine:
-                rowsToRemove.append(i)
+        self.plannedPiece = self.engine.numPieces
+        move = tetris_ai.bestMove(self.board, self.curPiece.pieceShape,
+                                  self.nextShape,
+                                  tetris_ai.current(self.engine))
+        if move is None:
+            return
 
-        # 删除满行的并将上面的下移
-        for row in rowsToRemove:
-            for i in range(row, 0, -1):
-                for j in range(Board.BoardWidth):
-                    self.setShapeAt(j, i, self.shapeAt(j, i-1))
-                # 使用这行代码会出现问题， 列表是引用类型
-                # self.board[i] = self.board[i-1]
+        # 和玩家一样通过旋转、平移移到目标位置，也会被录像记录下来
+        rotation, x = move
+        for i in range(4):
+            if (self.curPiece.rotation == rotation or
+                    not self.handleInput(Input.Rotate)):
+                break
+        key = Input.Right if x > self.curX else Input.Left
+        while self.curX != x:
+            if not self.handleInput(key):
+                break
 
-        numFullLines = numFullLines + len(rowsToRemove)
+    def pieceDropped(self):
+        # 落下、消行并生成新方块
+        numFullLines = self.engine.pieceDropped()
 
         if numFullLines > 0:
 
-            # 每消除20行下落速度加快50ms
-            if self.numLinesRemoved != 0 and self.numLinesRemoved % 20 == 0:
-                Board.Speed -= 50
-                self.timer.stop()
-                self.timer.start(Board.Speed, self)
-
-            self.numLinesRemoved = self.numLinesRemoved + numFullLines
-
             # 在侧边栏显示分数
             self.parent.slide.sinScore.emit(self.numLinesRemoved)
 
-            self.curPiece.setShape(Tetrominoe.NoShape)
-
-            self.update()
+        self.pieceCreated()
 
     def shapeAt(self, j, i):
-        return self.board[i][j]
+        return self.engine.shapeAt(j, i)
 
     def setShapeAt(self, j, i, shape):
-        self.board[i][j] = shape
+        self.engine.setShapeAt(j, i, shape)
+
+    def resizeEvent(self, event):
+        self.settled = None
+        sprites.cache.invalidate('tetris')
+        super(Board, self).resizeEvent(event)
 
     def paintEvent(self, event):
 
+        if self.settled is None:
+            self.settled = self.drawSettled()
+
         painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.settled)
 
-        # 画出已经落下的方块
-        for i in range(Board.BoardHeight):
-            for j in range(Board.BoardWidth):
-                if self.board[i][j] != Tetrominoe.NoShape:
-                    self.drawSquare(painter,
-                                    j * self.squareWidth(),
-                                    i * self.squareHeight(),
-                                    self.board[i][j])
         # 画出正在下落的
         if self.curPiece.pieceShape != Tetrominoe.NoShape:
-            for i in range(4):
-                self.drawSquare(
-                    painter,
-                    (self.curX +
-                     self.curPiece.coords[i][0]) * self.squareWidth(),
-                    (self.curY +
-                     self.curPiece.coords[i][1]) * self.squareHeight(),
-                    self.curPiece.pieceShape)
-
-    def drawSquare(self, painter, x, y, shape):
-        colorTable = [0x000000, 0xCC6666, 0x66CC66, 0x6666CC,
-                      0xCCCC66, 0xCC66CC, 0x66CCCC, 0xDAAA00]
-
-        color = QColor(colorTable[shape])
-        painter.fillRect(x + 1, y + 1, self.squareWidth(),
-                         self.squareHeight(), color)
-
-        painter.setPen(color.lighter())
-        painter.drawLine(x, y + self.squareHeight() - 1, x, y)
-        painter.drawLine(x, y, x + self.squareWidth() - 1, y)
-
-        painter.setPen(color.darker())
-        painter.drawLine(x + 1, y + self.squareHeight() - 1,
-                         x + self.squareWidth() - 1, y + self.squareHeight() - 1)
-        painter.drawLine(x + self.squareWidth() - 1,
-                         y + self.squareHeight() - 1, x + self.squareWidth() - 1, y + 1)
+            width = self.squareWidth()
+            height = self.squareHeight()
+
+            # 影子，表示方块落地的位置
+            ghostY = self.engine.dropY()
+            if ghostY != self.curY:
+                painter.setPen(Board.colorTable[self.curPiece.pieceShape][0])
+                for x, y in self.curPiece.coords:
+                    painter.drawRect(int((self.curX + x) * width) + 1,
+                                     int((ghostY + y) * height) + 1,
+                                     int(width) - 2, int(height) - 2)
+
+            for x, y in self.curPiece.coords:
+                self.drawSquare(painter,
+                                (self.curX + x) * width,
+                                (self.curY + y) * height,
+                                self.curPiece.pieceShape,
+                                width, height)
+
+    def drawSettled(self):
+        # 把已经落下的方块画到离屏缓存里
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+
+        painter = QPainter(pixmap)
+        width = self.squareWidth()
+        height = self.squareHeight()
+        rows = self.board.rows
+        for i in range(self.engine.height):
+            # 空行直接跳过
+            if not rows[i]:
+                continue
+            for j in range(self.engine.width):
+                if rows[i] >> j & 1:
+                    self.drawSquare(painter, j * width, i * height,
+                                    self.shapeAt(j, i), width, height)
+        painter.end()
+        return pixmap
+
+    def drawSquare(self, painter, x, y, shape, width=None, height=None):
+        if width is None:
+            width = self.squareWidth()
+            height = self.squareHeight()
+
+        width = int(width)
+        height = int(height)
+
+        # 方块会向右下多画一个像素
+        sprite = sprites.cache.get(
+            'tetris', shape, width + 1, height + 1, self.devicePixelRatioF(),
+            lambda painter, w, h: self.renderSquare(painter, shape, width, height))
+        painter.drawPixmap(int(x), int(y), sprite)
+
+    def renderSquare(self, painter, shape, width, height):
+        color, lighter, darker = Board.colorTable[shape]
+        painter.fillRect(1, 1, width, height, color)
+
+        painter.setPen(lighter)
+        painter.drawLine(0, height - 1, 0, 0)
+        painter.drawLine(0, 0, width - 1, 0)
+
+        painter.setPen(darker)
+        painter.drawLine(1, height - 1, width - 1, height - 1)
+        painter.drawLine(width - 1, height - 1, width - 1, 1)
 
     def squareWidth(self):
-        return self.contentsRect().width() / Board.BoardWidth
+        return self.contentsRect().width() / self.engine.width
 
     def squareHeight(self):
-        return self.contentsRect().height() / Board.BoardHeight
+        return self.contentsRect().height() / self.engine.height
+
+    def handleInput(self, key):
+        # 所有的操作都经过这里，方便录像
+        if self.isPaused:
+            return False
+
+        if self.replaying is None:
+            self.replay.record(self.ticks, key)
+
+        if key == Input.Left:
+            return self.tryMove(self.curPiece, self.curX - 1, self.curY)
+
+        elif key == Input.Right:
+            return self.tryMove(self.curPiece, self.curX + 1, self.curY)
+
+        elif key == Input.Rotate:
+            return self.rotate()
+
+        elif key == Input.Down:
+            return self.tryMove(self.curPiece, self.curX, self.curY + 1)
+
+        elif key == Input.Drop:
+            self.hardDrop()
+            return True
+
+        return False
+
+    def saveReplay(self):
+        if self.replaying is not None or Board.ReplayDir is None:
+            return
+
+        self.replay.finish(self.ticks)
+        os.makedirs(Board.ReplayDir, exist_ok=True)
+        name = 'tetris-%s-%d.rpl' % (time.strftime('%Y%m%d-%H%M%S'),
+                                     self.replay.seed)
+        self.replay.save(os.path.join(Board.ReplayDir, name))
+
+    def startReplay(self, replay, rate=1.0):
+        # 用录像的种子重新开始，按录像里的操作代替键盘
+        self.scheduler.stop()
+        self.engine = Engine(replay.width, replay.height, replay.seed)
+        self.replaying = replay
+        self.replayIndex = 0
+        self.ticks = 0
+        self.scheduler.setRate(rate)
+        self.isPaused = False
+        self.isAutoPlay = False
+        self.start()
+
+    def feedReplay(self):
+        # 执行这个tick里录下的操作，录像放完返回False
+        events = self.replaying.events
+        while (self.replayIndex < len(events) and
+               events[self.replayIndex][0] == self.ticks):
+            self.handleInput(events[self.replayIndex][1])
+            self.replayIndex += 1
+
+        if self.ticks >= self.replaying.ticks:
+            self.scheduler.stop()
+            self.parent.slide.sinStatu.emit('回放结束')
+            return False
+        return True
 
     def keyPressEvent(self, event):
 
@@ -257,21 +440,28 @@ class Board(QFrame):
         if key == Qt.Key_P:
             self.pause()
 
-        elif key == Qt.Key_Left:
-            self.tryMove(self.curPiece, self.curX - 1, self.curY)
-
-        elif key == Qt.Key_Right:
-            self.tryMove(self.curPiece, self.curX + 1, self.curY)
+        elif self.replaying is not None:
+            # 回放时不响应其它按键
+            super(Board, self).keyPressEvent(event)
 
-        elif key == Qt.Key_Up:
-            self.tryMove(self.curPiece.rotateRight(), self.curX, self.curY)
+        elif key in Board.keyInputs:
+            # 自动重复由scheduler按DAS/ARR处理，忽略系统的重复
+            if not event.isAutoRepeat():
+                self.scheduler.press(Board.keyInputs[key])
 
-        elif key == Qt.Key_Down:
-            self.tryMove(self.curPiece, self.curX, self.curY + 1)
+        elif key == Qt.Key_A:
+            self.isAutoPlay = not self.isAutoPlay
 
         else:
             super(Board, self).keyPressEvent(event)
 
+    def keyReleaseEvent(self, event):
+        key = event.key()
+        if key in Board.keyInputs and not event.isAutoRepeat():
+            self.scheduler.release(Board.keyInputs[key])
+        else:
+            super(Board, self).keyReleaseEvent(event)
+
 # 侧边栏
 
 
@@ -304,8 +494,7 @@ class Slide(QFrame):
         self.vbox.setStretch(2, 1)
 
     def setShape(self, shape):
-        self.shape = Shape()
-        self.shape.setShape(shape)
+        self.shape = Shape.of(shape)
         self.left = self.contentsRect().width() / self.parent.tboard.squareWidth() // 2
         self.top = 2
         self.update()
@@ -318,96 +507,15 @@ class Slide(QFrame):
 
     def paintEvent(self, event):
         painter = QPainter(self)
+        tboard = self.parent.tboard
+        width = tboard.squareWidth()
+        height = tboard.squareHeight()
         # 右边画出下一个落下的方块
-        for i in range(4):
-            self.parent.tboard.drawSquare(
-                painter,
-                (self.left + self.shape.coords[i][0]) *
-                self.parent.tboard.squareWidth(),
-                (self.top + self.shape.coords[i][1]) *
-                self.parent.tboard.squareHeight(),
-                self.shape.pieceShape)
-
-# 表示形状
-
-
-class Tetrominoe(object):
-
-    NoShape = 0
-    ZShape = 1
-    SShape = 2
-    LineShape = 3
-    TShape = 4
-    SquareShape = 5
-    LShape = 6
-    MirroredLShape = 7
-
-
-class Shape(object):
-    # 对应八种形状，第一个全部0表示无
-    coordsTable = (
-        ((0, 0),     (0, 0),     (0, 0),     (0, 0)),
-        ((0, -1),    (0, 0),     (-1, 0),    (-1, 1)),
-        ((0, -1),    (0, 0),     (1, 0),     (1, 1)),
-        ((0, -1),    (0, 0),     (0, 1),     (0, 2)),
-        ((-1, 0),    (0, 0),     (1, 0),     (0, 1)),
-        ((0, 0),     (1, 0),     (0, 1),     (1, 1)),
-        ((-1, -1),   (0, -1),    (0, 0),     (0, 1)),
-        ((1, -1),    (0, -1),    (0, 0),     (0, 1))
-    )
-
-    def __init__(self):
-        # 每个形状有四个方块,[x,y]记录坐标
-        self.coords = [[0, 0] for i in range(4)]
-        self.pieceShape = Tetrominoe.NoShape
-
-        self.setShape(Tetrominoe.NoShape)
-
-    def rotateRight(self):
-        # 如果是正方形旋转后还是它自己
-        if self.pieceShape == Tetrominoe.SquareShape:
-            return self
-
-        result = Shape()
-        result.pieceShape = self.pieceShape
-
-        for i in range(4):
-
-            result.setX(i, -self.y(i))
-            result.setY(i, self.x(i))
-
-        return result
-
-    def setX(self, index, x):
-        self.coords[index][0] = x
-
-    def setY(self, index, y):
-        self.coords[index][1] = y
-
-    def x(self, index):
-        return self.coords[index][0]
-
-    def y(self, index):
-        return self.coords[index][1]
-
-    def shape(self):
-        return self.pieceShape
-
-    def setShape(self, shape):
-        table = Shape.coordsTable[shape]
-
-        for i in range(4):
-            for j in range(2):
-                self.coords[i][j] = table[i][j]
-
-        self.pieceShape = shape
-
-    def minY(self):
-        result = self.coords[0][0]
-        for i in range(4):
-            result = min(result, self.coords[i][1])
-        return result
-
+        for x, y in self.shape.coords:
+            tboard.drawSquare(painter,
+                              (self.left + x) * width,
+                              (self.top + y) * height,
+                              self.shape.pieceShape, width, height)
 
 if __name__ == '__main__':
 
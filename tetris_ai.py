@@ -0,0 +1,190 @@
+import numpy as np
+
+from tetris_engine import Shape, Tetrominoe
+
+# 自动玩俄罗斯方块：枚举所有旋转和落点，用NumPy一次性计算所有候选的得分
+
+# 高度、消行、空洞、凹凸度的权重
+Weights = (-0.510066, 0.760666, -0.35663, -0.184483)
+
+# 往前看一步时只展开这一步得分最高的若干个候选
+Beam = 16
+
+_candidateCache = {}
+
+
+def candidates(shape, width):
+    # 返回 (旋转, x, 各方块的列, 各方块的行偏移)，按板宽缓存
+    key = (shape, width)
+    if key in _candidateCache:
+        return _candidateCache[key]
+
+    rotations = []
+    xs = []
+    cellsX = []
+    cellsY = []
+    seen = set()
+    for rotation in range(4):
+        coords = Shape.rotationTable[shape][rotation]
+        # 正方形四个方向都一样，只算一次
+        if coords in seen:
+            continue
+        seen.add(coords)
+        minX, maxX, minY, maxY = Shape.boundsTable[shape][rotation]
+        for x in range(-minX, width - maxX):
+            rotations.append(rotation)
+            xs.append(x)
+            cellsX.append([x + dx for dx, dy in coords])
+            cellsY.append([dy for dx, dy in coords])
+
+    result = (np.array(rotations), np.array(xs),
+              np.array(cellsX), np.array(cellsY))
+    _candidateCache[key] = result
+    return result
+
+
+def reachable(board, shape, start):
+    # 方块从start = (旋转, x, y) 出发，和playMove一样先转再平移，返回能到的
+    # {(旋转, x)}。只留下从这一行直着落下、落点和place算的一样的位置，
+    # 钻到悬空方块下面的不算，这样选中的候选引擎一定走得到
+    rotation, x, y = start
+    tops = board.tops
+    result = set()
+    for target in range(4):
+        piece = Shape.pieces[shape][rotation]
+        px, py = x, y
+        # 旋转时和Engine.rotate一样靠墙平移
+        for i in range(4):
+            if piece.rotation == target:
+                break
+            turned = piece.rotateRight()
+            for dx, dy in Shape.kickTable:
+                if not board.collides(turned, px + dx, py + dy):
+                    piece, px, py = turned, px + dx, py + dy
+                    break
+            else:
+                break
+        if piece.rotation != target:
+            continue
+        for step in (-1, 1):
+            nx = px
+            while not board.collides(piece, nx, py):
+                land = min(tops[nx + dx] - 1 - dy for dx, dy in piece.coords)
+                if land >= py:
+                    result.add((target, nx))
+                nx += step
+    return result
+
+
+def tops(grids):
+    # 每一列最上面方块的行号，空列为板高
+    height = grids.shape[1]
+    return np.where(grids.any(axis=1), grids.argmax(axis=1), height)
+
+
+def place(grids, cellsX, cellsY):
+    # grids: (B, H, W)，每个盘面放下K种候选，得到 (B*K, H, W) 和能否放下
+    count, height, width = grids.shape
+    k = len(cellsX)
+
+    # 从顶上直接落下，碰到每列最高的方块就停住
+    landY = (tops(grids)[:, cellsX] - 1 - cellsY).min(axis=2)
+    rows = (landY[:, :, None] + cellsY).reshape(count * k, 4)
+    cols = np.broadcast_to(cellsX, (count, k, 4)).reshape(count * k, 4)
+    valid = rows.min(axis=1) >= 0
+
+    boards = np.repeat(grids, k, axis=0)
+    index = np.arange(count * k)[:, None]
+    boards[index, np.clip(rows, 0, height - 1), cols] = True
+    return boards, valid
+
+
+def clearLines(boards):
+    # 满行移到顶部并清空，其余行保持顺序
+    full = boards.all(axis=2)
+    lines = full.sum(axis=1)
+
+    # 大多数候选不消行，只处理有满行的盘面
+    cleared = np.flatnonzero(lines)
+    if len(cleared):
+        order = np.argsort(~full[cleared], axis=1, kind='stable')
+        sub = np.take_along_axis(boards[cleared], order[:, :, None], axis=1)
+        sub[np.arange(boards.shape[1])[None, :] < lines[cleared, None]] = False
+        boards[cleared] = sub
+    return boards, lines
+
+
+def evaluate(boards, lines):
+    height = boards.shape[1]
+    first = tops(boards)
+    heights = height - first
+    holes = heights.sum(axis=1) - boards.sum(axis=(1, 2))
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    return (Weights[0] * heights.sum(axis=1) + Weights[1] * lines +
+            Weights[2] * holes + Weights[3] * bumpiness)
+
+
+def bestMove(board, shape, nextShape=Tetrominoe.NoShape, start=None):
+    # board是BitBoard，返回 (旋转, x)，没有地方可放时返回None。
+    # start是当前方块的 (旋转, x, y)，给了就只选从那里走得到的位置
+    if shape == Tetrominoe.NoShape:
+        return None
+
+    grid = np.frombuffer(bytes(board.colors), dtype=np.uint8)
+    grid = grid.reshape(1, board.height, board.width) != 0
+
+    rotations, xs, cellsX, cellsY = candidates(shape, board.width)
+    boards, valid = place(grid, cellsX, cellsY)
+    if start is not None:
+        ok = reachable(board, shape, start)
+        valid &= np.array([(rotation, x) in ok
+                           for rotation, x in zip(rotations.tolist(),
+                                                  xs.tolist())])
+    boards, lines = clearLines(boards)
+    if not valid.any():
+        return None
+
+    scores = np.where(valid, evaluate(boards, lines), -np.inf)
+
+    # 用下一个方块往前看一步
+    if nextShape != Tetrominoe.NoShape:
+        beam = np.argsort(-scores, kind='stable')[:Beam]
+        beam = beam[valid[beam]]
+        nextCellsX, nextCellsY = candidates(nextShape, board.width)[2:]
+        k = len(nextCellsX)
+        nextBoards, nextValid = place(boards[beam], nextCellsX, nextCellsY)
+        nextBoards, nextLines = clearLines(nextBoards)
+        nextScores = evaluate(nextBoards, np.repeat(lines[beam], k) + nextLines)
+        nextScores = np.where(nextValid, nextScores, -np.inf).reshape(-1, k)
+        lookahead = nextScores.max(axis=1)
+        # 下一个方块无处可放时只看这一步
+        scores = scores[beam]
+        scores = np.where(np.isfinite(lookahead), lookahead, scores - 1e6)
+        best = int(beam[scores.argmax()])
+    else:
+        best = int(scores.argmax())
+
+    return int(rotations[best]), int(xs[best])
+
+
+def playMove(engine, rotation, x):
+    # 和玩家一样通过旋转、平移把方块移到目标位置
+    for i in range(4):
+        if engine.curPiece.rotation == rotation or not engine.rotate():
+            break
+    step = 1 if x > engine.curX else -1
+    while engine.curX != x:
+        if not engine.tryMove(engine.curPiece, engine.curX + step, engine.curY):
+            break
+
+
+def current(engine):
+    # 当前方块的 (旋转, x, y)，bestMove用来排除走不到的位置
+    return engine.curPiece.rotation, engine.curX, engine.curY
+
+
+def aiPolicy(engine):
+    move = bestMove(engine.board, engine.curPiece.pieceShape, engine.nextShape,
+                    current(engine))
+    if move is not None:
+        playMove(engine, *move)
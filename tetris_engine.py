@@ -0,0 +1,441 @@
+import random
+import time
+
+# 俄罗斯方块的规则，不依赖Qt，可以在没有显示器的情况下全速运行
+
+# 逻辑每秒运行的帧数，录像里的tick就是帧
+FrameRate = 60
+
+
+class Input(object):
+    # 玩家的操作，录像里保存的就是这些值
+    Left = 1
+    Right = 2
+    Rotate = 3
+    Down = 4
+    Drop = 5
+
+
+class Engine(object):
+    # Speed是方块每下落一格的毫秒数，每消除20行加快50ms，最快MinSpeed
+    Speed = 300
+    MinSpeed = 50
+
+    def __init__(self, width=10, height=22, seed=None):
+        self.width = width
+        self.height = height
+        # 每局游戏有自己的随机数生成器，相同的种子得到相同的方块序列
+        self.random = random.Random(seed)
+        self.board = BitBoard(width, height)
+        self.curPiece = Shape.of(Tetrominoe.NoShape)
+        self.curX = 0
+        self.curY = 0
+        self.isStarted = False
+        self.isOver = False
+        self.numLinesRemoved = 0
+        self.numPieces = 0
+        self.speed = Engine.Speed
+        self.frames = 0
+        self.nextShape = self.random.randint(1, 7)
+
+    def start(self):
+        self.isStarted = True
+        self.isOver = False
+        self.numLinesRemoved = 0
+        self.numPieces = 0
+        self.speed = Engine.Speed
+        self.frames = 0
+        self.newPiece()
+
+    def newPiece(self):
+
+        self.curPiece = Shape.of(self.nextShape)
+
+        # 生成下一个方块
+        self.nextShape = self.random.randint(1, 7)
+
+        # 设置方块的中心点位置
+        self.curX = self.width // 2
+        self.curY = 0 - self.curPiece.minY()
+
+        # 如果不能生成新方块，游戏结束
+        if not self.tryMove(self.curPiece, self.curX, self.curY):
+            self.curPiece = Shape.of(Tetrominoe.NoShape)
+            self.isStarted = False
+            self.isOver = True
+            return False
+
+        self.numPieces += 1
+        return True
+
+    def tryMove(self, newPiece, newX, newY):
+        # 超出边界或者与已有方块重叠，不移动
+        if self.board.collides(newPiece, newX, newY):
+            return False
+
+        self.curPiece = newPiece
+        self.curX = newX
+        self.curY = newY
+        return True
+
+    def rotate(self):
+        # 顺时针旋转，靠墙时尝试左右平移
+        piece = self.curPiece.rotateRight()
+        for dx, dy in Shape.kickTable:
+            if self.tryMove(piece, self.curX + dx, self.curY + dy):
+                return True
+        return False
+
+    def dropY(self):
+        return self.board.dropY(self.curPiece, self.curX, self.curY)
+
+    def hardDrop(self):
+        # 直接落到底，返回消除的行数
+        if self.curPiece.pieceShape == Tetrominoe.NoShape:
+            return 0
+        self.curY = self.dropY()
+        return self.pieceDropped()
+
+    def oneLineDown(self):
+        # 返回False表示方块已经落到底
+        if self.tryMove(self.curPiece, self.curX, self.curY + 1):
+            return True
+        self.pieceDropped()
+        return False
+
+    def pieceDropped(self):
+        # 将正在下落的加到已经落下的里，返回消除的行数
+        for x, y in self.curPiece.coords:
+            self.board.setShapeAt(self.curX + x, self.curY + y,
+                                  self.curPiece.pieceShape)
+
+        numFullLines = self.removeFullLines()
+
+        self.newPiece()
+
+        return numFullLines
+
+    def removeFullLines(self):
+        # 只需要检查刚落下的方块所在的行
+        rows = set(self.curY + y for x, y in self.curPiece.coords)
+        numFullLines = len(self.board.removeFullLines(rows))
+
+        if numFullLines > 0:
+            # 每消除20行下落速度加快50ms
+            if self.numLinesRemoved != 0 and self.numLinesRemoved % 20 == 0:
+                self.speed = max(Engine.MinSpeed, self.speed - 50)
+
+            self.curPiece = Shape.of(Tetrominoe.NoShape)
+
+        self.numLinesRemoved += numFullLines
+
+        return numFullLines
+
+    def framesPerRow(self):
+        return max(1, int(round(self.speed * FrameRate / 1000.0)))
+
+    def tick(self):
+        # 走一帧，返回这一帧方块是否应该下落一格
+        self.frames += 1
+        if self.frames < self.framesPerRow():
+            return False
+        self.frames = 0
+        return True
+
+    def step(self):
+        if self.tick():
+            self.oneLineDown()
+
+    def handleInput(self, key):
+        if key == Input.Left:
+            self.tryMove(self.curPiece, self.curX - 1, self.curY)
+        elif key == Input.Right:
+            self.tryMove(self.curPiece, self.curX + 1, self.curY)
+        elif key == Input.Rotate:
+            self.rotate()
+        elif key == Input.Down:
+            self.tryMove(self.curPiece, self.curX, self.curY + 1)
+        elif key == Input.Drop:
+            self.hardDrop()
+
+    def summary(self):
+        return 'lines=%d pieces=%d' % (self.numLinesRemoved, self.numPieces)
+
+    def shapeAt(self, j, i):
+        return self.board.shapeAt(j, i)
+
+    def setShapeAt(self, j, i, shape):
+        self.board.setShapeAt(j, i, shape)
+
+# 用位图表示已经落下的方块
+
+
+class BitBoard(object):
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # 每一行是一个整数，第j位为1表示第j列有方块，宽度不受限制
+        self.fullRow = (1 << width) - 1
+        self.rows = [0] * height
+        # 颜色平面，每个格子一个字节，记录方块的形状
+        self.colors = bytearray(width * height)
+        # 每一列最上面方块的行号，空列为height
+        self.tops = [height] * width
+
+    def shapeAt(self, j, i):
+        return self.colors[i * self.width + j]
+
+    def setShapeAt(self, j, i, shape):
+        if shape == Tetrominoe.NoShape:
+            self.rows[i] &= ~(1 << j)
+            # 去掉的是最上面的方块，往下找新的顶
+            if self.tops[j] == i:
+                top = i + 1
+                while top < self.height and not self.rows[top] >> j & 1:
+                    top += 1
+                self.tops[j] = top
+        else:
+            self.rows[i] |= 1 << j
+            if i < self.tops[j]:
+                self.tops[j] = i
+        self.colors[i * self.width + j] = shape
+
+    def updateTops(self):
+        # 从上往下扫描，每一列第一次出现方块的行就是顶
+        tops = [self.height] * self.width
+        seen = 0
+        for i, row in enumerate(self.rows):
+            new = row & ~seen
+            while new:
+                low = new & -new
+                tops[low.bit_length() - 1] = i
+                new ^= low
+            seen |= row
+            if seen == self.fullRow:
+                break
+        self.tops = tops
+
+    def dropY(self, piece, x, y):
+        # 方块在x列从y行开始下落，返回落地时的行
+        land = min(self.tops[x + dx] - 1 - dy for dx, dy in piece.coords)
+        if land >= y:
+            return land
+
+        # 方块已经在某列的顶下面（钻到了悬空的方块下），只能一格一格往下找
+        while not self.collides(piece, x, y + 1):
+            y += 1
+        return y
+
+    def collides(self, piece, newX, newY):
+        rows = self.rows
+        for x, y in piece.coords:
+            x += newX
+            y += newY
+            if x < 0 or x >= self.width or y < 0 or y >= self.height:
+                return True
+            if rows[y] >> x & 1:
+                return True
+        return False
+
+    def removeFullLines(self, rows):
+        # 只检查给定的行，返回被删除的行号
+        fullLines = sorted(i for i in rows if self.rows[i] == self.fullRow)
+        if not fullLines:
+            return fullLines
+
+        # 从下往上删除，上面的行号不会受影响
+        width = self.width
+        for i in reversed(fullLines):
+            del self.rows[i]
+            del self.colors[i * width:(i + 1) * width]
+
+        # 顶部补上空行
+        count = len(fullLines)
+        self.rows[0:0] = [0] * count
+        self.colors[0:0] = bytes(count * width)
+        self.updateTops()
+        return fullLines
+
+# 表示形状
+
+
+class Tetrominoe(object):
+
+    NoShape = 0
+    ZShape = 1
+    SShape = 2
+    LineShape = 3
+    TShape = 4
+    SquareShape = 5
+    LShape = 6
+    MirroredLShape = 7
+
+
+class Shape(object):
+    # 对应八种形状，第一个全部0表示无
+    coordsTable = (
+        ((0, 0),     (0, 0),     (0, 0),     (0, 0)),
+        ((0, -1),    (0, 0),     (-1, 0),    (-1, 1)),
+        ((0, -1),    (0, 0),     (1, 0),     (1, 1)),
+        ((0, -1),    (0, 0),     (0, 1),     (0, 2)),
+        ((-1, 0),    (0, 0),     (1, 0),     (0, 1)),
+        ((0, 0),     (1, 0),     (0, 1),     (1, 1)),
+        ((-1, -1),   (0, -1),    (0, 0),     (0, 1)),
+        ((1, -1),    (0, -1),    (0, 0),     (0, 1))
+    )
+
+    # 旋转时如果原位置放不下，依次尝试这些偏移（踢墙），最后尝试下移一格（踢顶）
+    kickTable = ((0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0), (0, 1))
+
+    def __init__(self, shape=Tetrominoe.NoShape, rotation=0):
+        self.setShape(shape, rotation)
+
+    @staticmethod
+    def of(shape, rotation=0):
+        # 预先生成的不可变方块，直接查表，不会创建新对象
+        return Shape.pieces[shape][rotation & 3]
+
+    def rotateRight(self):
+        return Shape.pieces[self.pieceShape][(self.rotation + 1) & 3]
+
+    def x(self, index):
+        return self.coords[index][0]
+
+    def y(self, index):
+        return self.coords[index][1]
+
+    def shape(self):
+        return self.pieceShape
+
+    def setShape(self, shape, rotation=0):
+        # 每个形状有四个方块，coords是(x, y)坐标组成的元组
+        self.pieceShape = shape
+        self.rotation = rotation & 3
+        self.coords = Shape.rotationTable[shape][self.rotation]
+        self.bounds = Shape.boundsTable[shape][self.rotation]
+
+    def minX(self):
+        return self.bounds[0]
+
+    def maxX(self):
+        return self.bounds[1]
+
+    def minY(self):
+        return self.bounds[2]
+
+    def maxY(self):
+        return self.bounds[3]
+
+
+def _rotations(coords, shape):
+    # 顺时针旋转: (x, y) -> (-y, x)，正方形旋转后还是它自己
+    result = [tuple(coords)]
+    for i in range(3):
+        if shape == Tetrominoe.SquareShape:
+            result.append(result[-1])
+        else:
+            result.append(tuple((-y, x) for x, y in result[-1]))
+    return tuple(result)
+
+
+def _bounds(coords):
+    xs = [x for x, y in coords]
+    ys = [y for x, y in coords]
+    return (min(xs), max(xs), min(ys), max(ys))
+
+
+# 导入时计算所有形状四个方向的坐标和边界
+Shape.rotationTable = tuple(_rotations(coords, shape)
+                            for shape, coords in enumerate(Shape.coordsTable))
+Shape.boundsTable = tuple(tuple(_bounds(coords) for coords in rotations)
+                          for rotations in Shape.rotationTable)
+Shape.pieces = tuple(tuple(Shape(shape, rotation) for rotation in range(4))
+                     for shape in range(len(Shape.coordsTable)))
+
+# 批量自我对弈
+
+
+def randomPolicy(engine):
+    # 随机选择旋转次数和目标列
+    piece = Shape.of(engine.curPiece.pieceShape, engine.random.randint(0, 3))
+    engine.tryMove(piece, engine.curX, engine.curY)
+
+    target = engine.random.randint(0, engine.width - 1)
+    step = 1 if target > engine.curX else -1
+    while engine.curX != target:
+        if not engine.tryMove(engine.curPiece, engine.curX + step, engine.curY):
+            break
+
+
+def playGame(seed, width=10, height=22, maxPieces=0, policy=randomPolicy):
+    # 返回 (消除的行数, 方块数)
+    engine = Engine(width, height, seed)
+    engine.start()
+    while engine.isStarted:
+        if maxPieces and engine.numPieces > maxPieces:
+            break
+        policy(engine)
+        engine.hardDrop()
+    return engine.numLinesRemoved, engine.numPieces
+
+
+def _playGame(args):
+    return playGame(*args)
+
+
+def runBatch(games, seed=0, width=10, height=22, maxPieces=0, processes=None,
+             policy=randomPolicy):
+    # 只有批量对弈用到进程池，导入规则时不加载multiprocessing
+    from multiprocessing import Pool, cpu_count
+    processes = processes or cpu_count()
+    jobs = [(seed + i, width, height, maxPieces, policy) for i in range(games)]
+    # 每个进程一次拿一批，减少进程间通信
+    chunksize = max(1, games // (processes * 8))
+
+    numLines = 0
+    numPieces = 0
+    begin = time.perf_counter()
+    with Pool(processes) as pool:
+        for lines, pieces in pool.imap_unordered(_playGame, jobs, chunksize):
+            numLines += lines
+            numPieces += pieces
+    elapsed = time.perf_counter() - begin
+
+    return {
+        'games': games,
+        'processes': processes,
+        'seconds': elapsed,
+        'gamesPerSec': games / elapsed if elapsed else 0.0,
+        'piecesPerSec': numPieces / elapsed if elapsed else 0.0,
+        'lines': numLines,
+        'pieces': numPieces,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tetris batch self-play')
+    parser.add_argument('-n', '--games', type=int, default=1000)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-j', '--processes', type=int, default=None)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=22)
+    parser.add_argument('--max-pieces', type=int, default=0)
+    parser.add_argument('--ai', action='store_true',
+                        help='use tetris_ai instead of random moves (needs NumPy)')
+    args = parser.parse_args()
+
+    policy = randomPolicy
+    if args.ai:
+        from tetris_ai import aiPolicy as policy
+
+    stats = runBatch(args.games, args.seed, args.width, args.height,
+                     args.max_pieces, args.processes, policy)
+    print('games:        %d (%d processes)' % (stats['games'], stats['processes']))
+    print('time:         %.2fs' % stats['seconds'])
+    print('games/sec:    %.1f' % stats['gamesPerSec'])
+    print('pieces/sec:   %.1f' % stats['piecesPerSec'])
+    print('lines:        %d' % stats['lines'])
+    print('pieces:       %d' % stats['pieces'])